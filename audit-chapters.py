@@ -0,0 +1,7 @@
+# check the chapter tags across a library of MP3s without changing anything
+# runs the installed tool from a checkout; see chaptermaker/audit_chapters.py
+
+from chaptermaker.audit_chapters import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+# reproducible benchmarks for the parse -> compute -> tag pipeline.
+# all inputs are synthetic and generated offline into a work directory (reused between runs);
+# every measurement runs in a fresh child process so peak RSS belongs to that benchmark alone.
+#
+#   python benchmarks/bench.py -o results.json                 # quick sizes
+#   python benchmarks/bench.py --full -o results.json          # 100k-track sheets, 2 GB MP3
+#   python benchmarks/bench.py --compare old.json new.json     # show regressions
+#   python benchmarks/bench.py -k startup                      # import-time budget only
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x44'  # MPEG1 layer III, 128 kbps, 44.1 kHz, joint stereo
+MP3_FRAME_SIZE = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+REGRESSION_THRESHOLD = 1.10  # flag anything more than 10% slower or bigger
+
+# per-invocation startup: importing a tool's module and printing --help must stay within the budget
+# and must not pull in the heavy optional dependencies, which belong on the paths that use them
+# (tests/test_startup.py fails the suite on a heavy import; the budget is checked here, where the
+# fastest of --repeat runs counts)
+STARTUP_TOOLS = ['chapter_maker', 'audio_lengths_to_cue', 'time_calc_cmd', 'silence_to_cue',
+                 'snap_to_silence', 'join_mp3_parts', 'split_mp3', 'audit_chapters',
+                 'export_chapters']
+STARTUP_BUDGET_S = 0.05
+HEAVY_MODULES = ['mutagen', 'regex', 'numpy', 'PIL', 'concurrent.futures.process']
+
+
+def load_tool(name: str):
+    return importlib.import_module('chaptermaker.' + name)
+
+
+# synthetic inputs
+
+def write_mp3(path: str, seconds: float):
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - 4)
+    frames = int(seconds / MP3_FRAME_SECONDS)
+    chunk = frame * 2048
+    with open(path, 'wb') as f:
+        for _ in range(frames // 2048):
+            f.write(chunk)
+        f.write(frame * (frames % 2048))
+
+
+def write_cue(path: str, tracks: int, audio_name: str = "book.mp3"):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'TITLE "Benchmark Book"\nPERFORMER "Bench Author"\nFILE "{audio_name}" MP3\n')
+        for i in range(tracks):
+            seconds = i * 30
+            color = "blue" if i % 10 == 0 else "red"
+            f.write(f'  TRACK {i + 1:02} AUDIO\n    TITLE "Chapter {i + 1}"\n'
+                    f'    INDEX 01 {seconds // 60:02}:{seconds % 60:02}:00\n    REM COLOR {color}\n')
+
+
+def write_chapter_list(path: str, lines: int):
+    rng = random.Random(lines)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            f.write(f'Chapter {i + 1}|{rng.randrange(2)}:{rng.randrange(60):02}:{rng.randrange(60):02}\n')
+
+
+def write_cover(path: str, size: int):
+    rng = random.Random(size)
+    with open(path, 'wb') as f:
+        f.write(b'\xff\xd8\xff\xe0')  # looks like a JPEG, which is all the tagger checks
+        f.write(rng.getrandbits(8 * (size - 6)).to_bytes(size - 6, 'little'))  # randbytes() is 3.9+
+        f.write(b'\xff\xd9')
+
+
+def prepare(workdir: str, full: bool) -> list:
+    # builds any missing inputs and returns the benchmark list: (name, kind, params)
+    os.makedirs(workdir, exist_ok=True)
+    cue_sizes = [10, 1000, 100000] if full else [10, 1000, 10000]
+    part_count = 300 if full else 100
+    big_mp3_seconds = 2 * 1024 ** 3 / (MP3_FRAME_SIZE / MP3_FRAME_SECONDS) if full else 3600
+    cover_size = 20 * 1024 * 1024 if full else 2 * 1024 * 1024
+    list_sizes = [1000, 100000] if full else [1000, 10000]
+
+    benchmarks = [(f'startup[{tool}]', 'startup', {'tool': tool}) for tool in STARTUP_TOOLS]
+    for tracks in cue_sizes:
+        cue = os.path.join(workdir, f'sheet-{tracks}.cue')
+        if not os.path.exists(cue):
+            write_cue(cue, tracks)
+        benchmarks.append((f'process_cuefile[{tracks}]', 'process_cuefile', {'cue': cue}))
+        benchmarks.append((f'determine_durations[{tracks}]', 'determine_durations', {'cue': cue}))
+
+    parts = os.path.join(workdir, f'parts-{part_count}')
+    if not os.path.isdir(parts):
+        os.makedirs(parts)
+        for i in range(part_count):
+            write_mp3(os.path.join(parts, f'part-{i:04}.mp3'), 20 + i % 7)
+    benchmarks.append((f'generate_cue_tracks[{part_count}]', 'generate_cue_tracks', {'directory': parts}))
+
+    for lines in list_sizes:
+        chapter_list = os.path.join(workdir, f'chapters-{lines}.txt')
+        if not os.path.exists(chapter_list):
+            write_chapter_list(chapter_list, lines)
+        benchmarks.append((f'time_calc[{lines}]', 'time_calc', {'input': chapter_list}))
+
+    book = os.path.join(workdir, 'book.mp3')
+    if not os.path.exists(book) or abs(os.path.getsize(book) - int(big_mp3_seconds / MP3_FRAME_SECONDS) * MP3_FRAME_SIZE) > MP3_FRAME_SIZE:
+        write_mp3(book, big_mp3_seconds)
+    book_cue = os.path.join(workdir, 'book.cue')
+    if not os.path.exists(book_cue):
+        write_cue(book_cue, 60)
+    cover = os.path.join(workdir, f'cover-{cover_size}.jpg')
+    if not os.path.exists(cover):
+        write_cover(cover, cover_size)
+    size_mb = os.path.getsize(book) // (1024 * 1024)
+    params = {'book': book, 'cue': book_cue, 'cover': cover}
+    benchmarks.append((f'tag_save_first[{size_mb}MB]', 'tag_save_first', params))
+    benchmarks.append((f'tag_save_repeat[{size_mb}MB]', 'tag_save_repeat', params))
+    benchmarks.append((f'tag_unchanged[{size_mb}MB]', 'tag_unchanged', params))
+    return benchmarks
+
+
+# measurements, run inside the child process
+
+def read_proc_io() -> dict:
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+
+def run_startup(tool: str) -> dict:
+    # runs before anything else is imported in the child, so the time is the tool's own
+    import contextlib
+    import io
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    module = load_tool(tool)
+    sys.argv = [tool, '--help']
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):
+        module.main()
+    result = {'wall_s': time.perf_counter() - wall, 'cpu_s': time.process_time() - cpu,
+              'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)}
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    result['heavy'] = heavy
+    if heavy:
+        result['error'] = 'imported at startup: ' + ', '.join(heavy)
+    elif result['wall_s'] > STARTUP_BUDGET_S:
+        result['error'] = f'startup {result["wall_s"]:.3f}s is over the {STARTUP_BUDGET_S}s budget'
+    return result
+
+
+def run_one(kind: str, params: dict, workdir: str) -> dict:
+    import contextlib
+    import io
+    from chaptermaker import cuetools
+
+    scratch = os.path.join(workdir, 'scratch')
+    os.makedirs(scratch, exist_ok=True)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    # setup (not timed) returns the function to time
+    if kind == 'process_cuefile':
+        def measured():
+            cuetools.process_cuefile(params['cue'])
+    elif kind == 'determine_durations':
+        header, tracks = cuetools.process_cuefile(params['cue'])
+
+        def measured():
+            cuetools.determine_durations(tracks, header.duration_in_frames)
+    elif kind == 'generate_cue_tracks':
+        module = load_tool('audio_lengths_to_cue')
+
+        def measured():
+            with quiet:
+                module.generate_cue_tracks(params['directory'])
+    elif kind == 'time_calc':
+        module = load_tool('time_calc_cmd')
+        output = os.path.join(scratch, 'time-calc.cue')
+
+        def measured():
+            sys.argv = ['time-calc-cmd.py', '-f', params['input'], '-o', output]
+            module.main()
+    elif kind in ('tag_save_first', 'tag_save_repeat', 'tag_unchanged'):
+        module = load_tool('chapter_maker')
+        book = os.path.join(scratch, 'book.mp3')
+        shutil.copyfile(params['book'], book)
+        if kind != 'tag_save_first':  # tag once so the timed save can reuse the padding, or skip it
+            with quiet:
+                module.tag_book(book, params['cue'], params['cover'], interactive=False)
+
+        def measured():
+            with quiet:
+                module.tag_book(book, params['cue'], params['cover'], interactive=False,
+                                force=kind == 'tag_save_repeat')
+    else:
+        raise ValueError('unknown benchmark ' + kind)
+
+    io_before = read_proc_io()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    measured()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    io_after = read_proc_io()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024  # Linux reports KiB, macOS bytes
+    result = {'wall_s': wall, 'cpu_s': cpu, 'peak_rss_bytes': peak}
+    if io_before:
+        result['bytes_written'] = io_after['wchar'] - io_before['wchar']
+        result['bytes_read'] = io_after['rchar'] - io_before['rchar']
+    return result
+
+
+# driver
+
+def run_child(name: str, kind: str, params: dict, workdir: str) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), '--child', kind, '--workdir', workdir,
+               '--params', json.dumps(params)]
+    env = dict(os.environ, CHAPTER_MAKER_CACHE=os.path.join(workdir, 'cache'))
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(old_file: str, new_file: str) -> int:
+    with open(old_file) as f:
+        old = json.load(f)['results']
+    with open(new_file) as f:
+        new = json.load(f)['results']
+    regressions = 0
+    print(f'{"benchmark":34} {"metric":16} {"old":>14} {"new":>14} {"ratio":>7}')
+    for name in sorted(set(old) & set(new)):
+        for metric in ('wall_s', 'peak_rss_bytes', 'bytes_written'):
+            before, after = old[name].get(metric), new[name].get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            flag = '  <-- regression' if ratio > REGRESSION_THRESHOLD else ''
+            regressions += bool(flag)
+            print(f'{name:34} {metric:16} {before:14.4g} {after:14.4g} {ratio:7.2f}{flag}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chapter-maker tools on synthetic inputs')
+    parser.add_argument('-o', '--output', help='Write results to this JSON file')
+    parser.add_argument('-w', '--workdir', default=os.path.join(REPO, 'benchmarks', 'work'),
+                        help='Where synthetic inputs are generated and kept between runs')
+    parser.add_argument('--full', action='store_true', help='Use the full sizes (100k-track sheets, 2 GB MP3)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per benchmark; the fastest is kept')
+    parser.add_argument('-k', '--filter', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--params', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare))
+
+    if args.child == 'startup':
+        print(json.dumps(run_startup(json.loads(args.params)['tool'])))
+        return
+    if args.child:
+        print(json.dumps(run_one(args.child, json.loads(args.params), args.workdir)))
+        return
+
+    workdir = os.path.abspath(args.workdir)
+    print('Preparing inputs in ' + workdir)
+    benchmarks = prepare(workdir, args.full)
+    results = {}
+    for name, kind, params in benchmarks:
+        if args.filter and args.filter not in name:
+            continue
+        runs = [run_child(name, kind, params, workdir) for _ in range(max(1, args.repeat))]
+        good = [run for run in runs if 'error' not in run]
+        results[name] = min(good, key=lambda run: run['wall_s']) if good else runs[0]
+        result = results[name]
+        if 'error' in result:
+            print(f'{name:34} ERROR {result["error"]}')
+        else:
+            print(f'{name:34} {result["wall_s"]:9.4f}s  peak {result["peak_rss_bytes"] / 1e6:8.1f} MB'
+                  f'  written {result.get("bytes_written", 0) / 1e6:10.2f} MB')
+
+    report = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'full': args.full,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Results written to ' + args.output)
+    if any('error' in result for result in results.values()):
+        sys.exit(1)  # includes a blown startup budget, so a pipeline can gate on it
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+# chapter-maker: CUE sheets, chapter tags and lossless MP3 joining/splitting for audiobooks.
+# each command line tool is the module named after it (chapter_maker, time_calc_cmd, ...) and is
+# installed as a console script; mutagen, numpy and Pillow are only imported on the paths that use them
+
+__version__ = "0.2.0"
@@ -0,0 +1,95 @@
+# generate cue file from list of MP3 files.
+
+import os
+import sys
+import time
+from . import cuetools
+from .durationcache import DurationCache
+from .metrics import Metrics, NO_METRICS, add_arguments as add_metrics_arguments, metrics_from_args
+from .timeline import CueHeader, TrackTable, frames_from_ms
+import argparse
+
+def make_header() -> CueHeader:
+	return CueHeader(title="GeneratedOutput", out_format="WAVE", performer="Performer")
+
+
+cue_tracks = TrackTable()
+fudge_time = 100 # fudge time in milliseconds
+jobs = 8 # number of files probed concurrently
+PROBE_METHOD = "mutagen-mp3"
+
+
+def probe_length(file_path: str) -> float:
+	from mutagen.mp3 import MP3  # only needed once the cache misses
+	audio = MP3(file_path)
+	return audio.info.length
+
+
+# Iterate over each file in the directory; progress goes to stderr, as the sheet may be going to stdout
+def generate_cue_tracks(directory, cache: DurationCache = None, metrics: Metrics = NO_METRICS):
+	global cue_tracks
+	started = time.perf_counter()
+	cue_tracks.add('XXXX1', 0, color="cyan")
+	total_millisecs = 0
+	order = 2  # we've already put in the first cue track, starting from zero time
+	with metrics.stage("list directory"):
+		file_names = [filename for filename in sorted(os.listdir(directory)) if filename.endswith('.mp3')]
+		file_paths = [os.path.join(directory, filename) for filename in file_names]
+	with metrics.stage("cache lookup"):
+		lengths = [cache.get(file_path, PROBE_METHOD) if cache else None for file_path in file_paths]
+	to_probe = [i for i, length in enumerate(lengths) if length is None]
+	# probing is I/O bound, so overlap it on threads; map() still hands back results in sorted order
+	from concurrent.futures import ThreadPoolExecutor  # pulls in logging, so not at import time
+	with metrics.stage("probe durations"), ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+		for i, length in zip(to_probe, executor.map(probe_length, [file_paths[i] for i in to_probe])):
+			lengths[i] = length
+			if cache:
+				cache.put(file_paths[i], PROBE_METHOD, length)
+	metrics.count("files found", len(file_paths))
+	metrics.count("files probed", len(to_probe))
+	durations = [int(length * 1000) for length in lengths]  # gives us milliseconds
+	probed = time.perf_counter()
+	for filename, duration in zip(file_names, durations):
+		print(f"File: {filename}, Duration: {int(duration/1000)} seconds", file=sys.stderr)
+		total_millisecs += (duration + fudge_time)
+		cue_tracks.add(f'XXXX{order}', frames_from_ms(total_millisecs), color="cyan")
+		order += 1
+	print(f"Probed {len(file_names)} files in {probed - started:.2f}s with {max(1, jobs)} jobs, "
+		f"total {(time.perf_counter() - started):.2f}s" + (f", {cache.summary()}" if cache else ""), file=sys.stderr)
+
+
+def save_cuefile(output_file:str):
+	cuetools.save_cue(output_file, make_header(), cue_tracks)
+
+
+def main():
+	global fudge_time, jobs
+	# Create the argument parser
+	parser = argparse.ArgumentParser(description='Calculate MP3 file durations and create a matching CUE file')
+
+	# Add the arguments
+	parser.add_argument('directory', type=str, help='Directory containing the MP3 files')
+	parser.add_argument('output_file', type=str, help='Name of the output CUE file, or - for stdout')
+	parser.add_argument('-f', '--fudge', type=int, help='Added time between tracks in millisecs', default=100, required=False)
+	parser.add_argument('-j', '--jobs', type=int, help='Number of files probed concurrently', default=jobs, required=False)
+	parser.add_argument('--no-cache', action='store_true', help='Do not read or write the duration cache')
+	parser.add_argument('--refresh', action='store_true', help='Re-probe every file and update the duration cache')
+	add_metrics_arguments(parser)
+
+
+	# Parse the arguments
+	args = parser.parse_args()
+	if args.fudge:
+		fudge_time = args.fudge
+	if args.jobs:
+		jobs = args.jobs
+
+	with metrics_from_args(args) as metrics:
+		with DurationCache(enabled=not args.no_cache, refresh=args.refresh) as cache:
+			generate_cue_tracks(args.directory, cache, metrics)
+		with metrics.stage("write cue"):
+			save_cuefile(args.output_file)
+	
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
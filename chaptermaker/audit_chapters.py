@@ -0,0 +1,126 @@
+# check the chapter tags across a library of MP3s without changing anything
+
+import argparse
+import csv
+import json
+import os
+import sys
+from . import id3scan
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+
+AUDIO_SUFFIXES = ('.mp3',)
+SUMMARY_FIELDS = ['file', 'title', 'author', 'chapters', 'tocs', 'cover', 'duration_s', 'tag_bytes', 'issues']
+CHAPTER_FIELDS = ['file', 'element_id', 'start_ms', 'end_ms', 'title']
+
+
+def find_files(paths):
+    # files named directly are taken as they are; directories are walked for MP3s, in name order
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirs, names in os.walk(path):
+            subdirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(AUDIO_SUFFIXES) and not name.startswith('.'):
+                    yield os.path.join(directory, name)
+
+
+def summary(scan: id3scan.TagScan) -> dict:
+    return {
+        'file': scan.fname,
+        'title': scan.title,
+        'author': scan.author,
+        'chapters': len(scan.chapters),
+        'tocs': len(scan.tocs),
+        'cover': ', '.join(f'{mime} {size // 1024} KiB' for mime, size in scan.covers),
+        'duration_s': round(scan.duration_ms / 1000, 3) if scan.duration_ms is not None else None,
+        'tag_bytes': scan.tag_size,
+        'issues': scan.issues,
+    }
+
+
+def chapter_rows(scan: id3scan.TagScan):
+    for chapter in sorted(scan.chapters, key=lambda chapter: chapter.start_ms):
+        yield {'file': scan.fname, 'element_id': chapter.element_id, 'start_ms': chapter.start_ms,
+               'end_ms': chapter.end_ms, 'title': chapter.title}
+
+
+class CSVReport:
+    def __init__(self, stream, list_chapters: bool):
+        self.list_chapters = list_chapters
+        self.writer = csv.DictWriter(stream, CHAPTER_FIELDS if list_chapters else SUMMARY_FIELDS)
+        self.writer.writeheader()
+
+    def add(self, scan: id3scan.TagScan):
+        if self.list_chapters:
+            self.writer.writerows(chapter_rows(scan))
+        else:
+            row = summary(scan)
+            row['issues'] = '; '.join(row['issues'])
+            self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class JSONReport:
+    # a JSON array written one file at a time, so a big library is never held in memory
+    def __init__(self, stream, list_chapters: bool):
+        self.stream = stream
+        self.list_chapters = list_chapters
+        self.separator = '[\n'
+
+    def add(self, scan: id3scan.TagScan):
+        row = summary(scan)
+        if self.list_chapters:
+            row['chapter_list'] = [{key: value for key, value in chapter.items() if key != 'file'}
+                                   for chapter in chapter_rows(scan)]
+        self.stream.write(self.separator + json.dumps(row, ensure_ascii=False))
+        self.separator = ',\n'
+
+    def close(self):
+        self.stream.write('[]\n' if self.separator == '[\n' else '\n]\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the chapter tags of MP3 files and check them for overlaps, gaps and chapters past the end of the audio')
+    parser.add_argument('paths', nargs='+', help='MP3 files, or directories to search for them')
+    parser.add_argument('-o', '--output', default='-', required=False, help='Report file, or - for stdout (the default)')
+    parser.add_argument('-f', '--format', choices=['csv', 'json'], required=False,
+                        help='Report format (default: from the -o suffix, else csv)')
+    parser.add_argument('-l', '--list', action='store_true', help='List every chapter instead of one summary per file')
+    parser.add_argument('--tolerance', type=int, default=id3scan.DEFAULT_TOLERANCE_MS, required=False,
+                        help='Milliseconds of gap or overlap to ignore as rounding')
+    parser.add_argument('-w', '--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4), required=False,
+                        help='Number of files read in parallel')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    report_format = args.format or ('json' if args.output.lower().endswith('.json') else 'csv')
+    report_class = JSONReport if report_format == 'json' else CSVReport
+
+    from concurrent.futures import ThreadPoolExecutor
+    files = with_issues = 0
+    with metrics_from_args(args) as metrics:
+        stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+        try:
+            report = report_class(stream, args.list)
+            with metrics.stage("scan tags"), ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+                # map keeps the report in path order while the reads overlap
+                for scan in executor.map(lambda fname: id3scan.scan_file(fname, args.tolerance), find_files(args.paths)):
+                    report.add(scan)
+                    files += 1
+                    with_issues += bool(scan.issues)
+            report.close()
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        metrics.count("files audited", files)
+        metrics.count("files with issues", with_issues)
+    print(f'{files} files audited, {with_issues} with issues', file=sys.stderr)
+    sys.exit(1 if with_issues else 0)
+
+
+if __name__ == '__main__':
+    main()
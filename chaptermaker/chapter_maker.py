@@ -0,0 +1,359 @@
+# reads a cue file and inserts chapters into the associated audio file
+
+from . import cuetools
+from .covers import CoverCache, load_cover
+from .durationcache import DurationCache
+from .metrics import Metrics, NO_METRICS, add_arguments as add_metrics_arguments, metrics_from_args
+from .id3chapters import DEFAULT_TAG_PADDING, UNCHANGED, build_tags, save_tags, update_tags
+from . import mp4chapters
+from .timeline import frames_to_seconds
+from . import spoolwatch
+from .subtitles import ALL_CUES, SubtitleRules, is_subtitle_file, process_subtitle_file
+import argparse
+import json
+import os
+import pathlib
+import re
+import signal
+import sys
+import time
+
+
+PICTURE_SUFFIXES = ['.jpg', '.jpeg', '.png']
+CHAPTER_SUFFIXES = ['.cue', '.vtt', '.srt']
+
+
+def read_sidecar(input_file: pathlib.Path) -> dict:
+    # optional <book>.json next to the MP3, e.g. {"title": "...", "author": "..."}
+    sidecar = input_file.with_suffix('.json')
+    if not sidecar.is_file():
+        return {}
+    with open(sidecar, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f'Sidecar {sidecar} does not contain a JSON object')
+    return data
+
+
+def resolve_metadata(header, input_file: pathlib.Path, title: str = None, author: str = None,
+                     default_title: str = None, default_author: str = None, interactive: bool = True):
+    # precedence: command line > CUE header > sidecar file > batch defaults > prompt
+    if not title and header.title and "mp3" not in header.title:
+        title = header.title
+    if not author and header.performer:
+        author = header.performer
+
+    if not title or not author:
+        sidecar = read_sidecar(input_file)
+        title = title or sidecar.get('title') or default_title
+        author = author or sidecar.get('author') or default_author
+
+    if not title:
+        if not interactive:
+            raise ValueError(f'No book title for {input_file.name} (CUE header, sidecar or --default-title)')
+        title = input("Book title? ")
+    if not author:
+        if not interactive:
+            raise ValueError(f'No author for {input_file.name} (CUE header, sidecar or --default-author)')
+        author = input("Author? ")
+    return title, author
+
+
+def read_chapters(input_file: pathlib.Path, chapter_file: pathlib.Path, cache: DurationCache = None,
+                  metrics: Metrics = NO_METRICS, rules: SubtitleRules = ALL_CUES):
+    # .srt/.vtt chapters are timed against the MP3 being tagged; anything else is read as a CUE sheet
+    if is_subtitle_file(chapter_file):
+        return process_subtitle_file(str(chapter_file), str(input_file), rules, cache=cache, metrics=metrics)
+    return cuetools.process_cuefile(str(chapter_file), cache=cache, metrics=metrics)
+
+
+def tag_mp3(input_file: pathlib.Path, title: str, performer: str, tracks: list, cover, reserve: int,
+            force: bool, metrics: Metrics) -> str:
+    wanted = build_tags(title, performer, tracks, cover)
+    from mutagen.id3 import ID3  # imported here so --help and the CUE-only paths don't pay for mutagen
+    from mutagen.mp3 import MP3
+    with metrics.stage("load tags"):
+        mp3_file = MP3(input_file, ID3=ID3)
+    if not mp3_file.tags:
+        mp3_file.add_tags()
+    if not update_tags(mp3_file.tags, wanted, cover is not None) and not force:
+        return UNCHANGED
+    with metrics.stage("save tags"):
+        return save_tags(mp3_file, input_file, reserve)
+
+
+def tag_book(input_file, chapter_file, picture=None, title=None, author=None,
+             default_title=None, default_author=None, interactive=True,
+             reserve: int = DEFAULT_TAG_PADDING, cache: DurationCache = None, metrics: Metrics = NO_METRICS,
+             cover_size: int = None, cover_max_bytes: int = None, cover_cache: CoverCache = None,
+             force: bool = False, rules: SubtitleRules = ALL_CUES):
+    # returns (chapters, outcome, header); outcome is UNCHANGED when the file already carried
+    # these chapters, title and cover, in which case it isn't written unless force is set
+    input_file = pathlib.Path(input_file)
+    chapter_file = pathlib.Path(chapter_file)
+
+    if not chapter_file.exists():
+        raise FileNotFoundError(f'Chapter file not found: {chapter_file}')
+    if not input_file.exists():
+        raise FileNotFoundError(f'Input file not found: {input_file}')
+
+    with metrics.stage("parse cue"):
+        header, tracks = read_chapters(input_file, chapter_file, cache, metrics, rules)
+    if not tracks:
+        raise ValueError(f'No tracks found in {chapter_file}')
+
+    title, performer = resolve_metadata(header, input_file, title, author,
+                                        default_title, default_author, interactive)
+
+    cover = None
+    if picture:
+        with metrics.stage("read cover"):
+            cover = load_cover(picture, cover_size, cover_max_bytes, cache=cover_cache)
+
+    if mp4chapters.is_mp4_file(input_file):
+        # M4B: Nero chapters and iTunes items, rebuilt inside moov without touching the audio
+        with metrics.stage("save tags"):
+            saved = mp4chapters.write_chapters(str(input_file), title, performer, tracks, cover, reserve, force)
+    else:
+        saved = tag_mp3(input_file, title, performer, tracks, cover, reserve, force, metrics)
+    if saved != UNCHANGED:
+        metrics.count("chapters written", len(tracks))
+    metrics.count("books tagged")
+    metrics.count("books " + saved)
+    return len(tracks), saved, header
+
+
+def describe(chapters: int, saved: str, header) -> str:
+    if header.duration_method:
+        duration = f'duration {frames_to_seconds(header.duration_in_frames)}s from {header.duration_method}'
+    else:
+        duration = 'audio duration unknown'
+    return f'{chapters} chapters, {duration}, {saved}'
+
+
+def find_picture(input_file: pathlib.Path):
+    for suffix in PICTURE_SUFFIXES:
+        candidate = input_file.with_suffix(suffix)
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def find_chapter_file(input_file: pathlib.Path) -> pathlib.Path:
+    # book.cue first, then book.vtt, book.srt; when none exists tag_book reports the missing CUE
+    for suffix in CHAPTER_SUFFIXES:
+        candidate = input_file.with_suffix(suffix)
+        if candidate.is_file():
+            return candidate
+    return input_file.with_suffix(CHAPTER_SUFFIXES[0])
+
+
+def read_manifest(manifest: pathlib.Path) -> list:
+    # one book per line: input.mp3|chapters.cue[|cover.jpg], paths relative to the manifest
+    jobs = []
+    base = manifest.parent
+    with open(manifest, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split('|')]
+            if len(parts) < 2:
+                raise ValueError(f'Bad manifest line in {manifest}: {line}')
+            picture = base / parts[2] if len(parts) > 2 and parts[2] else None
+            jobs.append((base / parts[0], base / parts[1], picture))
+    return jobs
+
+
+def scan_directory(directory: pathlib.Path) -> list:
+    # pair every book.mp3 or book.m4b with book.cue (or book.vtt/.srt when there is no CUE), and book.jpg/.png if present
+    jobs = []
+    for input_file in sorted(list(directory.glob('*.mp3')) + list(directory.glob('*.m4b'))):
+        jobs.append((input_file, find_chapter_file(input_file), find_picture(input_file)))
+    return jobs
+
+
+def run_job(job, default_title, default_author, reserve, use_cache=True, refresh=False, collect_metrics=False,
+            cover_size=None, cover_max_bytes=None, force=False, rules=ALL_CUES):
+    input_file, chapter_file, picture = job
+    metrics = Metrics(enabled=collect_metrics)
+    try:
+        with DurationCache(enabled=use_cache, refresh=refresh) as cache:
+            result = tag_book(input_file, chapter_file, picture,
+                              default_title=default_title, default_author=default_author,
+                              interactive=False, reserve=reserve, cache=cache, metrics=metrics,
+                              cover_size=cover_size, cover_max_bytes=cover_max_bytes,
+                              cover_cache=CoverCache(enabled=use_cache), force=force, rules=rules)
+        return str(input_file), True, describe(*result), metrics.to_dict()
+    except Exception as ex:
+        metrics.count("books failed")
+        return str(input_file), False, f'{type(ex).__name__}: {ex}', metrics.to_dict()
+
+
+def run_batch(source: str, workers: int, default_title: str = None, default_author: str = None,
+              reserve: int = DEFAULT_TAG_PADDING, use_cache: bool = True, refresh: bool = False,
+              metrics: Metrics = NO_METRICS, cover_size: int = None, cover_max_bytes: int = None,
+              force: bool = False, rules: SubtitleRules = ALL_CUES) -> int:
+    source = pathlib.Path(source)
+    if source.is_dir():
+        jobs = scan_directory(source)
+    else:
+        jobs = read_manifest(source)
+    if not jobs:
+        print("No books found in " + str(source))
+        return 1
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job, default_title, default_author, reserve, use_cache, refresh,
+                                   metrics.enabled, cover_size, cover_max_bytes, force, rules) for job in jobs]
+        for future in as_completed(futures):
+            name, ok, message, job_metrics = future.result()
+            metrics.merge(job_metrics)
+            print(('OK     ' if ok else 'FAILED ') + name + ': ' + message)
+            results.append((name, ok, message))
+
+    failed = [result for result in results if not result[1]]
+    print(f'{len(results) - len(failed)} of {len(results)} books tagged, {len(failed)} failed')
+    for name, ok, message in sorted(failed):
+        print('  ' + name + ': ' + message)
+    return 1 if failed else 0
+
+
+def run_watch(directory: str, workers: int, default_title: str = None, default_author: str = None,
+              reserve: int = DEFAULT_TAG_PADDING, use_cache: bool = True, refresh: bool = False,
+              metrics: Metrics = NO_METRICS, cover_size: int = None, cover_max_bytes: int = None,
+              settle: float = spoolwatch.DEFAULT_SETTLE_SECONDS, poll: float = spoolwatch.DEFAULT_POLL_SECONDS,
+              polling: bool = False, status_file: str = None, force: bool = False,
+              rules: SubtitleRules = ALL_CUES) -> int:
+    # long-running service: tags each book.mp3 + book.cue pair that settles in directory, then moves it
+    # to done/ or failed/. the worker processes stay up, so mutagen is imported once per
+    # worker rather than once per book. SIGINT/SIGTERM finish the books in progress and stop
+    from concurrent.futures import ProcessPoolExecutor
+    stats = spoolwatch.SpoolStats()
+    spool = spoolwatch.Spool(directory, settle)
+    watcher = spoolwatch.make_watcher(directory, poll, polling)
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    previous_handlers = [signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)]
+    print(f'Watching {directory} ({watcher.name}, {workers} workers, files settle after {settle}s)')
+    in_progress = {}
+    last_status = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                for future in [future for future in in_progress if future.done()]:
+                    job = in_progress.pop(future)
+                    name, ok, message, job_metrics = future.result()
+                    metrics.merge(job_metrics)
+                    spool.finish(job, ok, message)
+                    stats.record(ok, message)
+                    print(('OK     ' if ok else 'FAILED ') + name + ': ' + message)
+                if stopping:
+                    if not in_progress:
+                        break
+                else:
+                    ready, stats.settling = spool.scan()
+                    for job in ready:
+                        spool.claim(job)
+                        in_progress[executor.submit(run_job, job, default_title, default_author, reserve, use_cache,
+                                                    refresh, metrics.enabled, cover_size, cover_max_bytes,
+                                                    force, rules)] = job
+                stats.in_progress = len(in_progress)
+                status = stats.settling, stats.in_progress, stats.done, stats.failed
+                if status != last_status:
+                    print(time.strftime('%H:%M:%S ') + stats.summary())
+                    last_status = status
+                if status_file:
+                    stats.write(status_file)
+                # wake for file events, and often enough to notice finished books and settled files
+                busy = in_progress or stats.settling
+                spool.touched(watcher.wait(min(0.5, settle / 2) if busy else poll))
+    finally:
+        watcher.close()
+        for signum, handler in zip((signal.SIGINT, signal.SIGTERM), previous_handlers):
+            signal.signal(signum, handler)
+    print(f'Stopped: {stats.summary()}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process input arguments.')
+    parser.add_argument('-i', '--input', help='Input .MP3 or .M4B file')
+    parser.add_argument('-c', '--chapterfile', help='Chapters in a .CUE, .SRT or .VTT file')
+    parser.add_argument('-p', '--picture', required=False, help='Image file (JPG or PNG; GIF, WebP and BMP are converted)')
+    parser.add_argument('-t', '--title', required=False, help='Book title (overrides CUE header)')
+    parser.add_argument('-a', '--author', required=False, help='Author (overrides CUE header)')
+    parser.add_argument('-b', '--batch', required=False,
+                        help='Tag many books: a directory of book.mp3 + book.cue pairs, or a manifest file of mp3|cue[|picture] lines')
+    parser.add_argument('--watch', required=False,
+                        help='Run as a service: tag every book.mp3 + book.cue pair that appears in this directory')
+    parser.add_argument('--settle', type=float, default=spoolwatch.DEFAULT_SETTLE_SECONDS, required=False,
+                        help='Seconds a file must stay unchanged before --watch picks it up')
+    parser.add_argument('--poll', type=float, default=spoolwatch.DEFAULT_POLL_SECONDS, required=False,
+                        help='Seconds between directory scans when inotify is unavailable (or --polling is given)')
+    parser.add_argument('--polling', action='store_true', help='Scan the --watch directory on a timer instead of using inotify')
+    parser.add_argument('--status', required=False, help='With --watch, keep queue depth and throughput counters in this JSON file')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), required=False,
+                        help='Number of books tagged in parallel in batch and watch modes')
+    parser.add_argument('--default-title', required=False, help='Title used in batch and watch modes when the CUE header and sidecar have none')
+    parser.add_argument('--default-author', required=False, help='Author used in batch and watch modes when the CUE header and sidecar have none')
+    parser.add_argument('--tag-padding', type=int, default=DEFAULT_TAG_PADDING // 1024, required=False,
+                        help='KiB of ID3 padding to reserve when the tag grows, so later saves can be made in place')
+    parser.add_argument('--cover-size', type=int, required=False,
+                        help='Scale the cover down to at most this many pixels on its longest side (needs Pillow)')
+    parser.add_argument('--cover-max-kb', type=int, required=False,
+                        help='Recompress the cover as JPEG to at most this many KiB (needs Pillow)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the duration and cover caches')
+    parser.add_argument('--refresh', action='store_true', help='Re-probe audio durations and update the duration cache')
+    parser.add_argument('--chapter-pattern', required=False,
+                        help='With SRT/VTT chapters, only cues matching this regex start a chapter (a (?P<title>...) group sets the title)')
+    parser.add_argument('--min-chapter', type=float, default=0.0, required=False,
+                        help='With SRT/VTT chapters, fold cues starting less than this many seconds after the previous chapter into it')
+    parser.add_argument('--force', action='store_true',
+                        help='Save the tags even when the file already has the same chapters, title and cover')
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        rules = SubtitleRules(args.chapter_pattern, max(0.0, args.min_chapter))
+    except re.error as ex:
+        parser.error(f'bad --chapter-pattern: {ex}')
+
+    reserve = max(0, args.tag_padding) * 1024
+    cover_max_bytes = args.cover_max_kb * 1024 if args.cover_max_kb else None
+
+    if args.watch:
+        with metrics_from_args(args) as metrics:
+            status = run_watch(args.watch, max(1, args.workers or 1), args.default_title, args.default_author, reserve,
+                               not args.no_cache, args.refresh, metrics, args.cover_size, cover_max_bytes,
+                               args.settle, args.poll, args.polling, args.status, args.force, rules)
+        sys.exit(status)
+
+    if args.batch:
+        with metrics_from_args(args) as metrics:
+            status = run_batch(args.batch, max(1, args.workers or 1), args.default_title, args.default_author, reserve,
+                               not args.no_cache, args.refresh, metrics, args.cover_size, cover_max_bytes,
+                               args.force, rules)
+        sys.exit(status)
+
+    if not args.input or not args.chapterfile:
+        parser.error('-i/--input and -c/--chapterfile are required unless --batch or --watch is given')
+
+    try:
+        with metrics_from_args(args) as metrics, DurationCache(enabled=not args.no_cache, refresh=args.refresh) as cache:
+            result = tag_book(args.input, args.chapterfile, args.picture, args.title, args.author,
+                              reserve=reserve, cache=cache, metrics=metrics, cover_size=args.cover_size,
+                              cover_max_bytes=cover_max_bytes, cover_cache=CoverCache(enabled=not args.no_cache),
+                              force=args.force, rules=rules)
+        print(f'{args.input}: {describe(*result)}')
+    except (FileNotFoundError, ValueError) as ex:
+        print(ex)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
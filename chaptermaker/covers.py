@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# cover art for the APIC frame: the format is taken from the file's magic bytes, and a cover can
+# optionally be scaled down and recompressed (with Pillow) so print-resolution art doesn't bloat
+# every tag. processed covers are kept on disk under their content hash, so a cover shared by a
+# series or a whole batch is only processed once
+
+import contextlib
+import io
+import os
+import sys
+from typing import Optional
+
+from .durationcache import user_cache_dir
+
+
+COVER_CACHE_DIR = "covers"
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 40
+QUALITY_STEP = 10
+SHRINK_STEP = 0.75  # when even the lowest quality is too big, scale down by this and try again
+EMBEDDABLE = ('image/jpeg', 'image/png')  # what players reliably show from an APIC frame
+
+
+def pillow():
+    # PIL.Image, imported on first use (it is slow to import and only needed to resize), or None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+class Cover:
+    __slots__ = ('mime', 'data')
+
+    def __init__(self, mime: str, data: bytes):
+        self.mime = mime
+        self.data = data
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    # MIME type from the first few bytes, or None if it isn't an image we know
+    if head[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:2] == b'BM':
+        return 'image/bmp'
+    return None
+
+
+def needs_processing(cover: Cover, max_size: Optional[int], max_bytes: Optional[int]) -> bool:
+    if cover.mime not in EMBEDDABLE:
+        return True
+    if max_bytes and len(cover.data) > max_bytes:
+        return True
+    Image = pillow()
+    if max_size and Image is not None:
+        with Image.open(io.BytesIO(cover.data)) as image:  # only reads the header
+            return max(image.size) > max_size
+    return False
+
+
+def recompress(data: bytes, max_size: Optional[int], max_bytes: Optional[int],
+               quality: int = DEFAULT_QUALITY) -> bytes:
+    # a baseline JPEG no larger than max_size pixels on its longest side and, as far as quality
+    # and size steps allow, no more than max_bytes
+    Image = pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            if image.mode == 'RGBA':  # JPEG has no alpha, so flatten onto white
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+        if max_size and max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        while True:
+            for level in range(quality, MIN_QUALITY - 1, -QUALITY_STEP):
+                output = io.BytesIO()
+                image.save(output, 'JPEG', quality=level, optimize=True)
+                if not max_bytes or output.tell() <= max_bytes:
+                    return output.getvalue()
+            if min(image.size) < 64:
+                return output.getvalue()  # as small as is sensible; accept it
+            image = image.resize((int(image.width * SHRINK_STEP), int(image.height * SHRINK_STEP)), Image.LANCZOS)
+
+
+class CoverCache:
+    # processed covers on disk, named by the hash of the original image and the settings used
+    def __init__(self, path: str = None, enabled: bool = True):
+        self.enabled = enabled
+        self.path = path or os.path.join(user_cache_dir(), COVER_CACHE_DIR)
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.jpg')
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self.enabled:
+            try:
+                with open(self._file(key), 'rb') as f:
+                    self.hits += 1
+                    return f.read()
+            except OSError:
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        if not self.enabled:
+            return
+        try:
+            import tempfile  # only needed once there is something to cache
+            os.makedirs(self.path, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(prefix='.cover-', suffix='.tmp', dir=self.path)
+        except OSError as ex:
+            print("Cover cache not written: " + str(ex), file=sys.stderr)
+            return
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_name, self._file(key))  # concurrent batch workers may race; last one wins
+        except OSError as ex:
+            print("Cover cache not written: " + str(ex), file=sys.stderr)
+            with contextlib.suppress(OSError):
+                os.unlink(temp_name)
+
+
+def load_cover(picture, max_size: Optional[int] = None, max_bytes: Optional[int] = None,
+               quality: int = DEFAULT_QUALITY, cache: CoverCache = None) -> Cover:
+    # the cover as it should be embedded; unchanged unless it is over the limits or a format
+    # players can't show from an APIC frame
+    with open(picture, 'rb') as f:
+        data = f.read()
+    mime = sniff_image(data[:16])
+    if mime is None:
+        raise ValueError(f'{picture} is not a JPEG, PNG, GIF, WebP or BMP image')
+    cover = Cover(mime, data)
+    if not max_size and not max_bytes and mime in EMBEDDABLE:
+        return cover
+    if pillow() is None:
+        if mime in EMBEDDABLE:
+            print(f'Cover {picture} embedded unchanged: resizing needs Pillow', file=sys.stderr)
+            return cover
+        raise ValueError(f'{picture} is {mime}, which needs Pillow to convert to JPEG')
+    if not needs_processing(cover, max_size, max_bytes):
+        return cover
+
+    import hashlib  # OpenSSL-backed, so it is loaded only once there is a cover to hash
+    key = f'{hashlib.sha256(data).hexdigest()}-{max_size or 0}-{max_bytes or 0}-q{quality}'
+    processed = cache.get(key) if cache else None
+    if processed is None:
+        processed = recompress(data, max_size, max_bytes, quality)
+        if cache:
+            cache.put(key, processed)
+    return Cover('image/jpeg', processed)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import re
+import sys
+import struct
+import contextlib
+from . import probes
+from .metrics import NO_METRICS
+from itertools import chain
+from typing import Iterable, Iterator, TextIO, Tuple
+from .timeline import ChapterIndex, CueHeader, CueTrack, FRAMES_PER_SECOND, frames_from_msf, split_hms, split_msf
+
+
+# patterns are compiled once; every line is matched on its leading keyword only
+QUOTED_PATTERN = re.compile(r'"(.*?)"')
+FILE_AND_FORMAT_PATTERN = re.compile(r'"(.*?)" (.*?)$')
+CUETIME_PATTERN = re.compile(r'(\d+):(\d+):(\d+)')
+OFFSET_PATTERN = re.compile(r'(\d{1,3}\.\d{1,7})')
+WRITE_BUFFER_SIZE = 1 << 16
+PROBE_METHOD = "header-probe"  # duration cache key for durations read by the probes module
+ESTIMATED_TAIL_FRAMES = 1500  # used when we can't find the audio duration: last track + 20 secs
+
+
+def get_quoted_string(line: str) -> str:
+	match = QUOTED_PATTERN.search(line)
+	if match:
+		return match.group(1)
+	else:
+		return ""
+
+
+def probe_audio_duration(fname: str) -> Tuple[float, str]:
+	try:
+		return probes.probe_duration(fname)
+	except (probes.ProbeError, OSError, struct.error, IndexError) as ex:
+		return 0.0, ""
+
+
+def get_duration_and_method(fname: str, cache=None) -> Tuple[float, str]:
+	# duration in seconds read from the audio file's headers, and which probe produced it
+	if cache is None:
+		return probe_audio_duration(fname)
+	return cache.lookup_source(fname, PROBE_METHOD, probe_audio_duration)
+
+
+def get_duration(fname: str, cache=None) -> float:
+	return get_duration_and_method(fname, cache)[0]
+
+
+def file_is_ok(afile) -> bool:
+	if not os.path.exists(afile):
+		# print("Error: this file does not exist: " + afile)
+		return False
+	elif not os.path.isfile(afile):
+		# print("Error: this is not a file: " + afile)
+		return False
+	return True
+
+
+def get_file_and_format(line: str) -> Tuple[str, str]:
+	match = FILE_AND_FORMAT_PATTERN.search(line)
+	if match:
+		return match.group(1), match.group(2)
+	else:
+		return get_quoted_string(line), ""
+
+
+def get_wave_source(cuefile: str) -> str:
+	# read header to get the source file name
+	try:
+		fileobject = open(cuefile, "r", encoding="utf-8")
+	except IOError:
+		print("Could not open " + cuefile)
+		return ""
+
+	with fileobject:
+		try:
+			# read header lines, stop when we hit a track
+			for keyword, rest in tokenize_cue(fileobject):
+				if keyword == "TRACK":
+					break
+				if keyword == "FILE":
+					fi, fo = get_file_and_format(rest)
+					return fi
+		except UnicodeDecodeError:
+			print("Could not read " + cuefile)
+	return ""
+
+
+def cue_fields_to_frames(str_minutes: str, str_seconds: str, str_frames: str) -> int:
+	# mm:ss:ff with ff in CUE frames (1/75 s), the same unit write_cue() writes
+	try:
+		return frames_from_msf(int(str_minutes), int(str_seconds), int(str_frames))
+	except (ArithmeticError, ValueError):
+		print('Bad time conversion')
+		return 0
+
+
+def get_offset(line: str) -> str:
+	match = OFFSET_PATTERN.search(line)
+	if match:
+		return match.group(1)
+	else:
+		return ""
+
+
+def tokenize_cue(fileobject: Iterable[str]) -> Iterator[Tuple[str, str]]:
+	# yields (KEYWORD, rest of line) for each non-blank line; REM lines keep their sub-keyword in rest
+	for line in fileobject:
+		parts = line.split(None, 1)
+		if not parts:
+			continue
+		keyword = parts[0].lstrip('\ufeff').upper()
+		yield keyword, parts[1].strip() if len(parts) > 1 else ""
+
+
+def read_header(header: CueHeader, tokens: Iterator[Tuple[str, str]], cache=None, metrics=NO_METRICS) -> Iterator[Tuple[str, str]]:
+	# consumes header lines up to the first TRACK and returns the remaining tokens, starting at that TRACK
+	for keyword, rest in tokens:
+		if keyword == "TRACK":
+			return chain([(keyword, rest)], tokens)
+		if keyword == "TITLE":
+			header.title = get_quoted_string(rest)
+		elif keyword == "PERFORMER":
+			header.performer = get_quoted_string(rest)
+		elif keyword == "FILE":
+			fi, fo = get_file_and_format(rest)
+			path = os.path.split(header.cuefile)
+			header.file = fi
+			header.audiofile = os.path.join(path[0], fi)
+			header.out_format = fo
+			if file_is_ok(header.audiofile):
+				with metrics.stage("probe duration"):
+					duration, method = get_duration_and_method(header.audiofile, cache)
+				metrics.count("files probed")
+				if duration > 0.0:
+					header.duration_in_frames = int(FRAMES_PER_SECOND * duration)
+					header.duration_method = method
+	return iter(())
+
+
+def read_tracks(tokens: Iterator[Tuple[str, str]]) -> Iterator[CueTrack]:
+	# lazily yields one CueTrack per TRACK entry; only the track being built is held
+	newtrack = None
+	numtracks = 0
+	for keyword, rest in tokens:
+		if keyword == "TRACK":
+			if newtrack is not None:
+				yield newtrack
+			newtrack = CueTrack()
+			numtracks += 1
+			newtrack.order = numtracks
+		elif newtrack is None:
+			continue
+		elif keyword == "TITLE":
+			newtrack.title = get_quoted_string(rest)
+		elif keyword == "INDEX":
+			match = CUETIME_PATTERN.match(rest, rest.find(' ') + 1) if rest.startswith("01 ") else None
+			if match:
+				newtrack.start = cue_fields_to_frames(match.group(1), match.group(2), match.group(3))
+		elif keyword == "REM":
+			sub_keyword, _, value = rest.partition(' ')
+			sub_keyword = sub_keyword.upper()
+			if sub_keyword == "OFFSET":
+				newtrack.offset = get_offset(value)
+			elif sub_keyword == "COLOR":
+				newtrack.color = value.strip()
+	if newtrack is not None:
+		yield newtrack
+
+
+def read_cue(fileobject: TextIO, cuefile: str = "", passed_duration: int = 99999, cache=None,
+		metrics=NO_METRICS) -> Tuple[CueHeader, Iterator[CueTrack]]:
+	# reads the header eagerly and returns a generator over the tracks, which are parsed on demand
+	header = CueHeader()
+	header.cuefile = cuefile
+	header.duration_in_frames = passed_duration  # we'll try to read this later from wave file
+	tokens = read_header(header, tokenize_cue(fileobject), cache, metrics)
+	return header, read_tracks(tokens)
+
+
+def with_durations(tracks: Iterable[CueTrack], total_duration: int) -> Iterator[CueTrack]:
+	# fills in track durations as tracks stream past, using one track of lookahead.
+	# we use red color to indicate tracks which are indented below a blue parent track; the parent's
+	# duration covers its children, so a parent and its children are held back until the group ends
+	# (at the first track that isn't red; a red track after that has no parent and keeps its own span)
+	held = []
+	parent = None
+	previous = None
+
+	def finish(track: CueTrack):
+		nonlocal parent
+		if track.color == "red" and parent is not None:  # this is an indented item
+			parent.duration += track.duration
+			held.append(track)
+			return []
+		released = held[:]
+		held.clear()
+		parent = None
+		if track.color == "blue":  # may be the parent of the tracks that follow
+			parent = track
+			held.append(track)
+		else:
+			released.append(track)
+		return released
+
+	for track in tracks:
+		if previous is not None:
+			previous.duration = track.start - previous.start
+			yield from finish(previous)
+		previous = track
+
+	if previous is not None:
+		if not total_duration:  # if we didn't get a duration so far, estimate it
+			total_duration = previous.start + ESTIMATED_TAIL_FRAMES
+		previous.duration = total_duration - previous.start
+		yield from finish(previous)
+	yield from held
+
+
+def determine_durations(tracks: list, total_duration: int):
+	for _ in with_durations(tracks, total_duration):
+		pass
+
+
+def format_frames(frames: int, long_form: bool = False) -> str:
+	hours, minutes, seconds = split_hms(frames)
+	if long_form:  # for Excel
+		return str(hours).zfill(2) + "\t" + str(minutes).zfill(2) + "\t" + str(seconds).zfill(2)
+	if hours > 0:
+		return str(hours).zfill(2) + ':' + str(minutes).zfill(2) + ':' + str(seconds).zfill(2)
+	else:
+		return str(minutes).zfill(2) + ':' + str(seconds).zfill(2)
+
+
+def index_title(atitle: str) -> str:
+	# replace " by " in book titles
+	atitle = atitle.replace(" by ", "~")
+	pattern = "^(A|The) (.*?)~(.*?)$"
+	match = re.search(pattern, atitle)
+	if match:
+		atitle = match.group(2) + ", " + match.group(1) + "~" + match.group(3)
+	return atitle
+
+
+def get_track_before_time(index: ChapterIndex, time_in_secs: int) -> CueTrack:
+	# latest heading starting in or before the given second that hasn't been used yet, which is then
+	# marked as used; build the ChapterIndex once and look up as many times as needed
+	track = index.take_before((int(time_in_secs // 1) + 1) * FRAMES_PER_SECOND - 1)
+	return track if track is not None else CueTrack()  # couldnt find it, so return an empty track
+
+
+def process_cuefile(filename: str, passed_duration: int = 99999, cache=None, metrics=NO_METRICS) -> Tuple[CueHeader, list]:
+	header = CueHeader()
+	header.cuefile = filename
+	header.duration_in_frames = passed_duration
+	track_list = []
+	try:
+		fileobject = open(filename, "r", encoding="utf-8")
+	except IOError:
+		print("Could not open " + filename)
+		return header, track_list
+
+	with fileobject:
+		try:
+			header, tracks = read_cue(fileobject, filename, passed_duration, cache, metrics)
+			track_list = list(with_durations(tracks, header.duration_in_frames))
+		except UnicodeDecodeError:
+			print("Could not read " + filename)
+			return header, []
+
+	return header, track_list
+
+
+def write_cue(stream: TextIO, header: CueHeader, tracks: Iterable[CueTrack]) -> int:
+	# writes the sheet straight to stream as tracks are produced; returns the number of tracks
+	write = stream.write
+	write('TITLE "' + header.title + '"\n')
+	write('FILE "' + header.file + '" ' + header.out_format + '\n')
+	if header.performer:
+		write('PERFORMER "' + header.performer + '"\n')
+	track_count = 0
+	for track in tracks:
+		track_count += 1
+		minutes, seconds, frames = split_msf(track.start)  # CUE minutes carry on past 59 rather than wrapping to hours
+		write(f'  TRACK {track_count:02} AUDIO\n    TITLE "{track.title}"\n    INDEX 01 {minutes:02}:{seconds:02}:{frames:02}\n')
+		if track.offset:
+			write('    REM OFFSET ' + track.offset + '\n')
+		if track.color:
+			write('    REM COLOR ' + track.color + '\n')
+	return track_count
+
+
+@contextlib.contextmanager
+def open_atomic(filename: str, binary: bool = False, prefix: str = ".out-"):
+	# yields a buffered file for a temporary name next to filename, and renames it over filename
+	# once the block finishes, so readers never see a half-written file; on error the temp goes
+	import shutil, tempfile  # together they cost ~10 ms, so they stay off the --help path
+	directory = os.path.dirname(os.path.abspath(filename))
+	fd, temp_name = tempfile.mkstemp(prefix=prefix, suffix=".tmp", dir=directory)
+	try:
+		if binary:
+			output = open(fd, "w+b", buffering=WRITE_BUFFER_SIZE)
+		else:
+			output = open(fd, "w", encoding="utf-8", newline="\n", buffering=WRITE_BUFFER_SIZE)
+		with output:
+			yield output
+			output.flush()
+			os.fsync(output.fileno())
+		if os.path.exists(filename):
+			shutil.copymode(filename, temp_name)
+		else:
+			os.chmod(temp_name, 0o644)
+		os.replace(temp_name, filename)
+	except BaseException:
+		with contextlib.suppress(OSError):
+			os.unlink(temp_name)
+		raise
+
+
+def save_cue(filename: str, header: CueHeader, tracks: Iterable[CueTrack]) -> int:
+	# "-" writes to stdout; otherwise the sheet is written atomically (see open_atomic)
+	if filename == "-":
+		count = write_cue(sys.stdout, header, tracks)
+		sys.stdout.flush()
+		return count
+	with open_atomic(filename, prefix=".cue-") as cuefile:
+		return write_cue(cuefile, header, tracks)
+
+
+def generate_output(header: CueHeader, tracks: list) -> str:
+	output = io.StringIO()
+	write_cue(output, header, tracks)
+	return output.getvalue()
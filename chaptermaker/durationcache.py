@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# on-disk cache of audio durations, shared by cuetools and audio-lengths-to-cue
+
+import os
+import sys
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+
+DEFAULT_MAX_ENTRIES = 50000
+CACHE_FILE_NAME = "durations.sqlite"
+
+
+def user_cache_dir() -> str:
+    # CHAPTER_MAKER_CACHE wins, otherwise the platform's per-user cache location
+    override = os.environ.get("CHAPTER_MAKER_CACHE")
+    if override:
+        return override
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    elif os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "chapter-maker")
+
+
+class DurationCache:
+    # maps (path, probe method) to a duration in seconds, valid while size and mtime are unchanged
+    hits = 0
+    misses = 0
+
+    def __init__(self, path: str = None, enabled: bool = True, refresh: bool = False,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.enabled = enabled
+        self.refresh = refresh  # ignore stored values, but still store fresh ones
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        if not enabled:
+            return
+        import sqlite3  # ~6 ms to load, so only once a cache is actually opened
+        if path is None:
+            path = os.path.join(user_cache_dir(), CACHE_FILE_NAME)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # autocommit: each statement holds the write lock only while it runs, so parallel batch
+            # and watch workers sharing the cache never wait on each other's books
+            self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS durations ("
+                "path TEXT NOT NULL, method TEXT NOT NULL, size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, duration REAL NOT NULL, used REAL NOT NULL, "
+                "source TEXT NOT NULL DEFAULT '', PRIMARY KEY (path, method))")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(durations)")]
+            if "source" not in columns:  # caches written before probes reported their source
+                self._connection.execute("ALTER TABLE durations ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS durations_used ON durations (used)")
+        except (OSError, sqlite3.Error) as ex:
+            print("Duration cache disabled: " + str(ex), file=sys.stderr)
+            self._connection = None
+            self.enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _key(fname: str):
+        stat = os.stat(fname)
+        return os.path.realpath(fname), stat.st_size, stat.st_mtime_ns
+
+    def get(self, fname: str, method: str) -> Optional[float]:
+        entry = self.get_entry(fname, method)
+        return entry[0] if entry else None
+
+    def get_entry(self, fname: str, method: str) -> Optional[Tuple[float, str]]:
+        # (duration, source) where source says how the duration was originally worked out
+        if not self._connection or self.refresh:
+            self.misses += 1
+            return None
+        try:
+            path, size, mtime_ns = self._key(fname)
+        except OSError:
+            self.misses += 1
+            return None
+        import sqlite3  # already loaded by __init__; just binds the name
+        with self._lock:
+            try:
+                row = self._connection.execute(
+                    "SELECT duration, source FROM durations WHERE path = ? AND method = ? AND size = ? AND mtime_ns = ?",
+                    (path, method, size, mtime_ns)).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE durations SET used = ? WHERE path = ? AND method = ?", (time.time(), path, method))
+            except sqlite3.Error:
+                row = None  # a busy or broken cache is just a miss
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], row[1]
+
+    def put(self, fname: str, method: str, duration: float, source: str = ""):
+        if not self._connection:
+            return
+        try:
+            path, size, mtime_ns = self._key(fname)
+        except OSError:
+            return
+        import sqlite3
+        with self._lock:
+            try:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO durations (path, method, size, mtime_ns, duration, used, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, method, size, mtime_ns, duration, time.time(), source))
+            except sqlite3.Error:
+                pass  # the value is probed again next time
+
+    def lookup(self, fname: str, method: str, probe: Callable[[str], float]) -> float:
+        # cached value if the file is unchanged, otherwise probe it and remember the result
+        duration = self.get(fname, method)
+        if duration is None:
+            duration = probe(fname)
+            if duration and duration > 0.0:  # don't remember failed probes
+                self.put(fname, method, duration)
+        return duration
+
+    def lookup_source(self, fname: str, method: str, probe: Callable[[str], Tuple[float, str]]) -> Tuple[float, str]:
+        # as lookup(), for probes that also say how they got the duration
+        entry = self.get_entry(fname, method)
+        if entry is None:
+            entry = probe(fname)
+            if entry[0] and entry[0] > 0.0:
+                self.put(fname, method, entry[0], entry[1])
+        return entry
+
+    def evict(self):
+        # drop least recently used entries once the table grows past max_entries
+        if not self._connection:
+            return
+        import sqlite3
+        with self._lock:
+            try:
+                count = self._connection.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+                excess = count - self.max_entries
+                if excess > 0:
+                    excess += self.max_entries // 10  # make some headroom so we don't evict on every run
+                    self._connection.execute(
+                        "DELETE FROM durations WHERE rowid IN "
+                        "(SELECT rowid FROM durations ORDER BY used LIMIT ?)", (excess,))
+            except sqlite3.Error:
+                pass  # eviction can wait for the next run
+
+    def close(self):
+        if not self._connection:
+            return
+        try:
+            self.evict()
+        finally:
+            self._connection.close()
+            self._connection = None
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "duration cache off"
+        return f"duration cache: {self.hits} hits, {self.misses} misses"
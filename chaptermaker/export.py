@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# one CUE parse, many chapter formats: the track model is walked once and each chapter is handed
+# to every requested writer, which streams it into its own buffered output file
+
+import contextlib
+import json
+import os
+import sys
+from typing import Dict, Iterator, List
+
+from . import cuetools
+from . import mp4atoms
+from .metrics import NO_METRICS
+from .timeline import ChapterNode, CueTrack, build_hierarchy, frames_to_ms
+
+
+class ExportChapter:
+    __slots__ = ('order', 'title', 'start_ms', 'end_ms', 'track')
+
+    def __init__(self, order: int, title: str, start_ms: int, end_ms: int, track: CueTrack):
+        self.order = order
+        self.title = title
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.track = track
+
+
+def flat_chapters(nodes: List[ChapterNode]) -> Iterator[ExportChapter]:
+    # the tree in track order; a group's chapter runs up to its first child, so flat formats get
+    # chapters that follow each other rather than a part that overlaps its own chapters
+    stack = list(reversed(nodes))
+    order = 0
+    while stack:
+        node = stack.pop()
+        order += 1
+        track = node.track
+        yield ExportChapter(order, track.title, frames_to_ms(track.start), frames_to_ms(node.own_end), track)
+        stack.extend(reversed(node.children))
+
+
+def clock(ms: int) -> str:
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02}:{minutes:02}:{seconds:02}.{ms:03}'
+
+
+class ChapterWriter:
+    # begin() once, chapter() for each chapter in order, end() once; output is a buffered file
+    # opened by cuetools.open_atomic, binary when binary is set
+    suffix = ''
+    binary = False
+    max_chapters = None  # the most chapters the format can hold, None for no limit
+
+    def begin(self, output, title: str, author: str, count: int):
+        self.output = output
+
+    def chapter(self, chapter: ExportChapter):
+        pass
+
+    def end(self):
+        pass
+
+
+class FFMetadataWriter(ChapterWriter):
+    # ffmpeg -i book.mp3 -i book.ffmetadata -map_metadata 1 -map_chapters 1 ...
+    suffix = '.ffmetadata'
+
+    @staticmethod
+    def escape(text: str) -> str:
+        for char in '\\=;#\n':
+            text = text.replace(char, '\\' + char)
+        return text
+
+    def begin(self, output, title, author, count):
+        super().begin(output, title, author, count)
+        output.write(f';FFMETADATA1\ntitle={self.escape(title)}\nalbum={self.escape(title)}\nartist={self.escape(author)}\n')
+
+    def chapter(self, chapter):
+        self.output.write(f'\n[CHAPTER]\nTIMEBASE=1/1000\nSTART={chapter.start_ms}\nEND={chapter.end_ms}\n'
+                          f'title={self.escape(chapter.title)}\n')
+
+
+class PodloveJSONWriter(ChapterWriter):
+    # Podlove Simple Chapters in their JSON form: [{"start": "hh:mm:ss.mmm", "title": ...}, ...]
+    suffix = '.chapters.json'
+
+    def begin(self, output, title, author, count):
+        super().begin(output, title, author, count)
+        self.separator = '[\n  '
+
+    def chapter(self, chapter):
+        self.output.write(f'{self.separator}{{"start": "{clock(chapter.start_ms)}", "title": {json.dumps(chapter.title, ensure_ascii=False)}}}')
+        self.separator = ',\n  '
+
+    def end(self):
+        self.output.write('[]\n' if self.separator == '[\n  ' else '\n]\n')
+
+
+class WebVTTWriter(ChapterWriter):
+    # a WebVTT chapters track, as used by <track kind="chapters">
+    suffix = '.chapters.vtt'
+
+    def begin(self, output, title, author, count):
+        super().begin(output, title, author, count)
+        output.write('WEBVTT\n')
+
+    def chapter(self, chapter):
+        title = ' '.join(chapter.title.replace('&', '&amp;').replace('<', '&lt;').split())
+        self.output.write(f'\n{chapter.order}\n{clock(chapter.start_ms)} --> {clock(chapter.end_ms)}\n{title}\n')
+
+
+class ChplWriter(ChapterWriter):
+    # a bare Nero chpl atom, ready to go into an MP4's moov/udta
+    suffix = '.chpl'
+    binary = True
+    max_chapters = mp4atoms.MAX_CHPL_CHAPTERS
+
+    def begin(self, output, title, author, count):
+        if count > self.max_chapters:  # fail before anything is written
+            raise ValueError(f'Nero chapters hold at most {self.max_chapters} chapters, not {count}')
+        super().begin(output, title, author, count)
+        self.entries = []
+
+    def chapter(self, chapter):
+        self.entries.append(mp4atoms.chpl_entry(chapter.start_ms, chapter.title))
+
+    def end(self):
+        self.output.write(mp4atoms.chpl_atom(self.entries, len(self.entries)))
+
+
+class ID3Writer(ChapterWriter):
+    # a tag-only ID3v2.4 file with the book frames and nested CTOC/CHAP frames chapter-maker writes
+    suffix = '.id3'
+    binary = True
+
+    def begin(self, output, title, author, count):
+        super().begin(output, title, author, count)
+        self.title = title
+        self.author = author
+        self.tracks = []
+
+    def chapter(self, chapter):
+        self.tracks.append(chapter.track)
+
+    def end(self):
+        from .id3chapters import build_tags  # mutagen only loads when ID3 output is asked for
+        build_tags(self.title, self.author, self.tracks).save(self.output, v1=0, v2_version=4, padding=lambda info: 0)
+
+
+EXPORT_FORMATS: Dict[str, type] = {
+    'id3': ID3Writer,
+    'ffmetadata': FFMetadataWriter,
+    'podlove': PodloveJSONWriter,
+    'vtt': WebVTTWriter,
+    'chpl': ChplWriter,
+}
+
+
+def formats_that_fit(formats: List[str], count: int, cuefile: str = '') -> List[str]:
+    # drops the formats too small for count chapters, with a warning, so one limited format doesn't
+    # cost a big sheet all of its exports; it is an error only when nothing would be left
+    fitting = []
+    for name in formats:
+        limit = EXPORT_FORMATS[name].max_chapters
+        if limit is not None and count > limit:
+            print(f'{cuefile}: skipping {name}, which holds at most {limit} chapters, not {count}', file=sys.stderr)
+        else:
+            fitting.append(name)
+    if formats and not fitting:
+        raise ValueError(f'{", ".join(formats)} cannot hold {count} chapters')
+    return fitting
+
+
+def output_paths(cuefile: str, formats: List[str], output_dir: str = None) -> List[str]:
+    stem = os.path.splitext(os.path.basename(cuefile))[0]
+    directory = output_dir or os.path.dirname(cuefile)
+    return [os.path.join(directory, stem + EXPORT_FORMATS[name].suffix) for name in formats]
+
+
+def export_chapters(tracks: List[CueTrack], title: str, author: str, formats: List[str], paths: List[str]) -> int:
+    # every output is opened up front and fed in the same pass; all of them are renamed into place
+    # only when the pass finishes, so a failure leaves no partial exports. returns the chapter count
+    nodes = build_hierarchy(tracks)
+    writers = [EXPORT_FORMATS[name]() for name in formats]
+    count = len(tracks)
+    with contextlib.ExitStack() as outputs:
+        for writer, path in zip(writers, paths):
+            writer.begin(outputs.enter_context(cuetools.open_atomic(path, writer.binary, prefix='.export-')),
+                         title, author, count)
+        for chapter in flat_chapters(nodes):
+            for writer in writers:
+                writer.chapter(chapter)
+        for writer in writers:
+            writer.end()
+    return count
+
+
+def export_cue(cuefile: str, formats: List[str], output_dir: str = None, title: str = None, author: str = None,
+               cache=None, metrics=NO_METRICS) -> List[str]:
+    # parses cuefile once and writes every format next to it (or into output_dir); returns the paths
+    with metrics.stage("parse cue"):
+        header, tracks = cuetools.process_cuefile(cuefile, cache=cache, metrics=metrics)
+    if not tracks:
+        raise ValueError(f'No tracks found in {cuefile}')
+    title = title or header.title or os.path.splitext(os.path.basename(cuefile))[0]
+    author = author or header.performer
+    formats = formats_that_fit(formats, len(tracks), cuefile)
+    paths = output_paths(cuefile, formats, output_dir)
+    with metrics.stage("export"):
+        export_chapters(tracks, title, author, formats, paths)
+    metrics.count("chapters exported", len(tracks))
+    return paths
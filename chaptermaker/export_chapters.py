@@ -0,0 +1,66 @@
+# export the chapters of CUE sheets as ID3, ffmetadata, Podlove JSON, WebVTT and Nero chpl files
+
+import argparse
+import os
+import sys
+from . import export
+from .durationcache import DurationCache
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+
+
+def find_cue_files(paths):
+    # CUE files named directly, and every .cue under the directories given, in name order
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirs, names in os.walk(path):
+            subdirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith('.cue') and not name.startswith('.'):
+                    yield os.path.join(directory, name)
+
+
+def parse_formats(text: str) -> list:
+    formats = [name.strip().lower() for name in text.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in export.EXPORT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f'unknown format {", ".join(unknown)}; choose from {", ".join(export.EXPORT_FORMATS)}')
+    return formats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export CUE chapters to other chapter formats, parsing each sheet once')
+    parser.add_argument('paths', nargs='+', help='CUE files, or directories to search for them')
+    parser.add_argument('-f', '--formats', type=parse_formats, default=list(export.EXPORT_FORMATS), required=False,
+                        help='Comma-separated formats to write: ' + ', '.join(export.EXPORT_FORMATS) + ' (default: all)')
+    parser.add_argument('-o', '--output-dir', required=False, help='Directory for the exports (default: next to each CUE)')
+    parser.add_argument('-t', '--title', required=False, help='Book title (overrides CUE header)')
+    parser.add_argument('-a', '--author', required=False, help='Author (overrides CUE header)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the duration cache')
+    parser.add_argument('--refresh', action='store_true', help='Re-probe audio durations and update the duration cache')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    exported = failed = 0
+    with metrics_from_args(args) as metrics, DurationCache(enabled=not args.no_cache, refresh=args.refresh) as cache:
+        for cuefile in find_cue_files(args.paths):
+            try:
+                paths = export.export_cue(cuefile, args.formats, args.output_dir, args.title, args.author,
+                                          cache=cache, metrics=metrics)
+            except (OSError, ValueError) as ex:
+                print(f'FAILED {cuefile}: {ex}', file=sys.stderr)
+                failed += 1
+                continue
+            exported += 1
+            print(f'{cuefile}: ' + ', '.join(os.path.basename(path) for path in paths))
+        metrics.count("sheets exported", exported)
+    if exported + failed > 1:
+        print(f'{exported} of {exported + failed} sheets exported, {failed} failed', file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# the ID3 frames chapter-maker writes: book-level text frames, a top-level CTOC with one CHAP per
+# track, the cover picture, and a save that reuses the existing tag padding when it can.
+# update_tags compares what a file already carries with what the CUE asks for, so re-tagging an
+# unchanged book doesn't write anything
+
+from typing import Iterable
+
+from .timeline import ChapterNode, CueTrack, build_hierarchy, frames_to_ms
+
+
+DEFAULT_TAG_PADDING = 64 * 1024  # bytes of ID3 padding reserved when the tag has to grow
+BOOK_FRAMES = ['TIT2', 'TALB', 'TPE1', 'TPE2', 'TCON']
+MAX_CTOC_ENTRIES = 255  # a CTOC's entry count is a single byte
+
+# outcome of tagging one file
+UNCHANGED = 'unchanged'  # tags already matched, nothing written
+UPDATED = 'updated'      # new tag fitted in the old tag + padding, rewritten in place
+REWRITTEN = 'rewritten'  # tag grew past its padding, whole file rewritten
+
+
+# mutagen is imported inside each function: callers already have it loaded by the time they hold
+# a tag to fill, and importing this module (e.g. for DEFAULT_TAG_PADDING) stays cheap
+
+def add_book_frames(tags, title: str, performer: str):
+    from mutagen.id3 import TIT2, TPE1, TPE2, TALB, TCON
+    tags["TIT2"] = TIT2(text=[title])
+    tags["TALB"] = TALB(text=[title])  # album name
+    tags["TPE1"] = TPE1(text=[performer])
+    tags["TPE2"] = TPE2(text=[performer])  # album artist
+    tags["TCON"] = TCON(text=u'Books & Spoken')  # genre
+
+
+def add_chapter_frames(tags, tracks: Iterable[CueTrack]) -> int:
+    # one CHAP per track, chp1..chpN, listed in order by a top-level CTOC. tracks grouped by REM
+    # COLOR (see timeline.build_hierarchy) get a CTOC sub-table each, holding the group's own
+    # chapter and then its children, so players can step by part or chapter; returns the chapter count
+    from mutagen.id3 import CTOC, CHAP, TIT2, CTOCFlags
+    count = 0
+
+    def add_table(element_id: str, flags: int, title: str, entries: list):
+        # a table with more entries than a CTOC can count lists them through ordered sub-tables
+        # (element_id-1, element_id-2, ...) of at most MAX_CTOC_ENTRIES each, nested as deep as needed
+        part = 0
+        while len(entries) > MAX_CTOC_ENTRIES:
+            runs = []
+            for first in range(0, len(entries), MAX_CTOC_ENTRIES):
+                part += 1
+                runs.append(f"{element_id}-{part}")
+                tags.add(CTOC(element_id=runs[-1], flags=CTOCFlags.ORDERED,
+                              child_element_ids=entries[first:first + MAX_CTOC_ENTRIES], sub_frames=[TIT2(text=[title])]))
+            entries = runs
+        tags.add(CTOC(element_id=element_id, flags=flags, child_element_ids=entries, sub_frames=[TIT2(text=[title])]))
+
+    def add_node(node: ChapterNode) -> str:
+        # adds the node's frames and returns the id its parent table lists
+        nonlocal count
+        count += 1
+        track = node.track
+        chapid = "chp" + str(count)
+        start_time = frames_to_ms(track.start)
+        end_time = frames_to_ms(node.own_end)
+        track_title = TIT2(text=[track.title])
+        tags.add(CHAP(element_id=chapid, flags=1, start_time=start_time, end_time=end_time, start_offset=0, end_offset=0, sub_frames=[track_title]))
+        if not node.children:
+            return chapid
+        table_id = "toc" + str(count)
+        add_table(table_id, CTOCFlags.ORDERED, track.title, [chapid] + [add_node(child) for child in node.children])
+        return table_id
+
+    add_table(u"toc", CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED, u"TOC", [add_node(node) for node in build_hierarchy(tracks)])
+    return count
+
+
+def add_cover(tags, cover):
+    # cover is a covers.Cover, already checked and sized for embedding
+    from mutagen.id3 import APIC
+    tags.add(APIC(encoding=3, mime=cover.mime, type=2, desc=u'Cover', data=cover.data))
+
+
+def save_tags(mp3_file, input_file, reserve: int = DEFAULT_TAG_PADDING) -> str:
+    # if the new tag fits in the existing tag + padding, mutagen overwrites just that region;
+    # otherwise the audio has to be shifted, so reserve room to make the next save fit
+    outcome = []
+
+    def padding(info):
+        if info.padding >= 0:
+            outcome.append(UPDATED)
+            return info.padding  # keep the tag size unchanged so nothing after it moves
+        outcome.append(REWRITTEN)
+        return reserve
+
+    mp3_file.save(input_file, v1=0, v2_version=4, padding=padding)
+    return outcome[-1]
+
+
+def build_tags(title: str, performer: str, tracks: Iterable[CueTrack], cover=None):
+    # the frames a book should carry, in a detached tag that update_tags can compare and copy from
+    from mutagen.id3 import ID3
+    tags = ID3()
+    add_book_frames(tags, title, performer)
+    add_chapter_frames(tags, tracks)
+    if cover:
+        add_cover(tags, cover)
+    return tags
+
+
+def _text(frame) -> tuple:
+    return tuple(str(text) for text in frame.text) if frame is not None else None
+
+
+def tag_state(tags, with_cover: bool) -> tuple:
+    # everything chapter-maker owns in a tag, reduced to plain values: book text, the tables of
+    # contents, each chapter's id, times and title, and a hash of the pictures rather than their bytes
+    book = tuple(_text(tags.get(key)) for key in BOOK_FRAMES)
+    tocs = sorted((toc.element_id, int(toc.flags), tuple(toc.child_element_ids), _text(toc.sub_frames.get('TIT2')))
+                  for toc in tags.getall('CTOC'))
+    chapters = sorted((chap.element_id, chap.start_time, chap.end_time, _text(chap.sub_frames.get('TIT2')))
+                      for chap in tags.getall('CHAP'))
+    pictures = None
+    if with_cover:
+        import hashlib  # only comparing covers needs it; keeps it off the --help path
+        pictures = sorted((apic.mime, int(apic.type), apic.desc, hashlib.sha256(apic.data).hexdigest())
+                          for apic in tags.getall('APIC'))
+    return book, tocs, chapters, pictures
+
+
+def update_tags(tags, wanted, with_cover: bool) -> bool:
+    # make tags carry wanted's book, chapter (and with_cover, picture) frames; returns False when they
+    # already did. all CTOC/CHAP frames are replaced, so chapters left over from a longer CUE go too
+    if tag_state(tags, with_cover) == tag_state(wanted, with_cover):
+        return False
+    for key in BOOK_FRAMES:
+        tags[key] = wanted[key]
+    replaced = ['CTOC', 'CHAP'] + (['APIC'] if with_cover else [])
+    for key in replaced:
+        tags.delall(key)
+    for key in replaced:
+        for frame in wanted.getall(key):
+            tags.add(frame)
+    return True
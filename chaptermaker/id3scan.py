@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+# read-only look at the chapters in an MP3's ID3v2 tag, without mutagen: the file start is read in one
+# bounded read that normally holds the whole tag and a few KiB of audio after it for the duration
+# (only a tag bigger than that costs a second read), and only the CTOC, CHAP, TIT2, TPE1 and APIC
+# frames are decoded; every other frame is skipped by its size
+
+import os
+import struct
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from . import probes
+
+
+AUDIO_PEEK = 8 * 1024  # bytes read past the tag to find the first MPEG frame and its Xing/VBRI header
+FIRST_READ = 512 * 1024  # enough for the tag (cover included) and the peek of nearly every audiobook
+DEFAULT_TOLERANCE_MS = 10  # gaps and overlaps up to this size are rounding, not problems
+WANTED_FRAMES = {b'CTOC', b'CHAP', b'TIT2', b'TPE1', b'APIC'}
+TEXT_ENCODINGS = ['latin-1', 'utf-16', 'utf-16-be', 'utf-8']
+
+
+class ScannedChapter:
+    __slots__ = ('element_id', 'start_ms', 'end_ms', 'title')
+
+    def __init__(self, element_id: str, start_ms: int, end_ms: int, title: str):
+        self.element_id = element_id
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.title = title
+
+
+class ScannedToc:
+    __slots__ = ('element_id', 'top_level', 'children', 'title')
+
+    def __init__(self, element_id: str, top_level: bool, children: List[str], title: str):
+        self.element_id = element_id
+        self.top_level = top_level
+        self.children = children
+        self.title = title
+
+
+class TagScan:
+    # what one file's tag says about its chapters, plus the audio duration when it could be read
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.version = 0  # ID3v2 minor version, 0 when there is no tag
+        self.tag_size = 0
+        self.title = ""
+        self.author = ""
+        self.chapters: List[ScannedChapter] = []
+        self.tocs: List[ScannedToc] = []
+        self.covers: List[Tuple[str, int]] = []  # (mime, bytes)
+        self.duration_ms = None
+        self.duration_method = ""
+        self.issues: List[str] = []
+
+
+def syncsafe(data: bytes) -> int:
+    return (data[0] & 0x7f) << 21 | (data[1] & 0x7f) << 14 | (data[2] & 0x7f) << 7 | (data[3] & 0x7f)
+
+
+def resync(data: bytes) -> bytes:
+    # undo ID3 unsynchronisation, which inserts a zero after every 0xff
+    return data.replace(b'\xff\x00', b'\xff')
+
+
+def iter_frames(data: bytes, version: int) -> Iterator[Tuple[bytes, bytes]]:
+    # (frame id, payload) for the wanted frames of a v2.3/v2.4 frame area; stops at padding
+    pos = 0
+    end = len(data)
+    while pos + 10 <= end:
+        frame_id = data[pos:pos + 4]
+        if frame_id[0] == 0:
+            break
+        size = syncsafe(data[pos + 4:pos + 8]) if version == 4 else struct.unpack_from('>I', data, pos + 4)[0]
+        format_flags = data[pos + 9]
+        payload_start = pos + 10
+        pos = payload_start + size
+        if frame_id not in WANTED_FRAMES:
+            continue
+        payload = data[payload_start:pos]
+        # the extra bytes in front of the frame data come in the order the spec lists their flags
+        if version == 4:
+            if format_flags & 0x04:  # encrypted
+                continue
+            if format_flags & 0x40:  # group id
+                payload = payload[1:]
+            if format_flags & 0x01:  # data length indicator
+                payload = payload[4:]
+            if format_flags & 0x02:
+                payload = resync(payload)
+            if format_flags & 0x08:
+                payload = zlib.decompress(payload)
+        else:
+            if format_flags & 0x40:  # encrypted
+                continue
+            if format_flags & 0x80:  # decompressed size
+                payload = payload[4:]
+            if format_flags & 0x20:  # group id
+                payload = payload[1:]
+            if format_flags & 0x80:
+                payload = zlib.decompress(payload)
+        yield frame_id, payload
+
+
+def _terminator(data: bytes, pos: int, encoding: int) -> int:
+    # end of a null-terminated string starting at pos, in the given text encoding
+    if encoding in (1, 2):
+        end = pos
+        while True:
+            end = data.find(b'\x00\x00', end)
+            if end < 0 or (end - pos) % 2 == 0:
+                return end if end >= 0 else len(data)
+            end += 1
+    end = data.find(b'\x00', pos)
+    return end if end >= 0 else len(data)
+
+
+def decode_text(payload: bytes) -> str:
+    # text frame: an encoding byte, then values separated by nulls; values are joined with '/'
+    if not payload or payload[0] >= len(TEXT_ENCODINGS):
+        return ""
+    text = payload[1:].decode(TEXT_ENCODINGS[payload[0]], errors='replace')
+    return '/'.join(value for value in text.split('\x00') if value)
+
+
+def _element_id(payload: bytes) -> Tuple[str, int]:
+    end = _terminator(payload, 0, 0)
+    return payload[:end].decode('latin-1'), end + 1
+
+
+def _sub_title(data: bytes, version: int) -> str:
+    for frame_id, payload in iter_frames(data, version):
+        if frame_id == b'TIT2':
+            return decode_text(payload)
+    return ""
+
+
+def parse_chap(payload: bytes, version: int) -> ScannedChapter:
+    element_id, pos = _element_id(payload)
+    start_ms, end_ms = struct.unpack_from('>II', payload, pos)
+    return ScannedChapter(element_id, start_ms, end_ms, _sub_title(payload[pos + 16:], version))
+
+
+def parse_ctoc(payload: bytes, version: int) -> ScannedToc:
+    element_id, pos = _element_id(payload)
+    flags, count = payload[pos], payload[pos + 1]
+    pos += 2
+    children = []
+    for _ in range(count):
+        end = _terminator(payload, pos, 0)
+        children.append(payload[pos:end].decode('latin-1'))
+        pos = end + 1
+    return ScannedToc(element_id, bool(flags & 0x02), children, _sub_title(payload[pos:], version))
+
+
+def parse_apic(payload: bytes) -> Tuple[str, int]:
+    encoding = payload[0]
+    mime_end = _terminator(payload, 1, 0)
+    mime = payload[1:mime_end].decode('latin-1')
+    desc_start = mime_end + 2  # skip the picture type byte
+    desc_end = _terminator(payload, desc_start, encoding)
+    return mime, len(payload) - desc_end - (2 if encoding in (1, 2) else 1)
+
+
+def read_tag(fileobj, fname: str) -> Tuple[TagScan, bytes]:
+    # the whole tag plus AUDIO_PEEK bytes of the audio that follows it, from one FIRST_READ read
+    scan = TagScan(fname)
+    data = fileobj.read(FIRST_READ)
+    header = data[:10]
+    scan.tag_size = probes.id3v2_size(header)
+    if not scan.tag_size:
+        return scan, data[:AUDIO_PEEK]
+    scan.version = header[3]
+    wanted = scan.tag_size + AUDIO_PEEK
+    if len(data) == FIRST_READ and wanted > FIRST_READ:
+        data += fileobj.read(wanted - FIRST_READ)
+    data = data[10:wanted]
+    body = data[:syncsafe(header[6:10])]
+    if scan.version not in (3, 4):
+        scan.issues.append(f'ID3v2.{scan.version} tag not supported')
+        return scan, data[scan.tag_size - 10:]
+    if header[5] & 0x80 and scan.version == 3:  # whole-tag unsynchronisation
+        body = resync(body)
+    if header[5] & 0x40:  # extended header
+        if scan.version == 4:
+            body = body[syncsafe(body[:4]):]
+        else:
+            body = body[4 + struct.unpack_from('>I', body)[0]:]
+
+    for frame_id, payload in iter_frames(body, scan.version):
+        if frame_id == b'CHAP':
+            scan.chapters.append(parse_chap(payload, scan.version))
+        elif frame_id == b'CTOC':
+            scan.tocs.append(parse_ctoc(payload, scan.version))
+        elif frame_id == b'TIT2':
+            scan.title = decode_text(payload)
+        elif frame_id == b'TPE1':
+            scan.author = decode_text(payload)
+        elif frame_id == b'APIC':
+            scan.covers.append(parse_apic(payload))
+    return scan, data[scan.tag_size - 10:]
+
+
+def mpeg_duration(head: bytes, audio_bytes: int) -> Optional[Tuple[float, str]]:
+    # as probes.probe_mpeg, but from bytes already read; CBR files are estimated from the size
+    pos, frame = probes.find_first_frame(head)
+    if frame is None or pos + frame.size > len(head):
+        return None
+    vbr = probes.read_vbr_header(head[pos:pos + frame.size], frame)
+    if vbr is not None:
+        frames, dropped, method = vbr
+        return max(0, frames * frame.samples - dropped) / frame.sample_rate, method
+    return (audio_bytes - pos) * 8 / frame.bitrate, 'mp3-cbr'
+
+
+def check_chapters(scan: TagScan, tolerance_ms: int = DEFAULT_TOLERANCE_MS) -> List[str]:
+    issues = []
+    if not scan.chapters:
+        issues.append('no chapters')
+        return issues
+    ids = [chapter.element_id for chapter in scan.chapters] + [toc.element_id for toc in scan.tocs]
+    if len(set(ids)) < len(ids):
+        issues.append('duplicate element ids')
+
+    chapters = sorted(scan.chapters, key=lambda chapter: chapter.start_ms)
+    if chapters[0].start_ms > tolerance_ms:
+        issues.append(f'gap of {chapters[0].start_ms} ms before {chapters[0].element_id}')
+    previous = None
+    for chapter in chapters:
+        if chapter.end_ms < chapter.start_ms:
+            issues.append(f'{chapter.element_id} ends before it starts')
+        if previous is not None:
+            if chapter.start_ms < previous.end_ms - tolerance_ms:
+                issues.append(f'{chapter.element_id} overlaps {previous.element_id} by {previous.end_ms - chapter.start_ms} ms')
+            elif chapter.start_ms > previous.end_ms + tolerance_ms:
+                issues.append(f'gap of {chapter.start_ms - previous.end_ms} ms after {previous.element_id}')
+        previous = chapter
+    if scan.duration_ms is not None:
+        past = [chapter for chapter in chapters if chapter.end_ms > scan.duration_ms + tolerance_ms]
+        for chapter in past:
+            issues.append(f'{chapter.element_id} ends {chapter.end_ms - scan.duration_ms} ms past the audio')
+
+    if not any(toc.top_level for toc in scan.tocs):
+        issues.append('no top-level CTOC')
+    listed = set()
+    known = set(ids)
+    for toc in scan.tocs:
+        for child in toc.children:
+            if child not in known:
+                issues.append(f'{toc.element_id} lists missing {child}')
+            listed.add(child)
+    unlisted = [chapter.element_id for chapter in scan.chapters if chapter.element_id not in listed]
+    if scan.tocs and unlisted:
+        issues.append(f'{len(unlisted)} chapters in no CTOC (first {unlisted[0]})')
+    return issues
+
+
+def scan_file(fname: str, tolerance_ms: int = DEFAULT_TOLERANCE_MS) -> TagScan:
+    # never raises for a bad file: read and parse failures become issues on the result
+    try:
+        with open(fname, 'rb') as fileobj:
+            size = os.fstat(fileobj.fileno()).st_size
+            scan, head = read_tag(fileobj, fname)
+    except OSError as ex:
+        scan = TagScan(fname)
+        scan.issues.append(f'{type(ex).__name__}: {ex}')
+        return scan
+    except (IndexError, ValueError, struct.error, zlib.error) as ex:
+        scan = TagScan(fname)
+        scan.issues.append(f'corrupt ID3v2 tag ({type(ex).__name__}: {ex})')
+        return scan
+    if not scan.tag_size:
+        scan.issues.append('no ID3v2 tag')
+    duration = mpeg_duration(head, size - scan.tag_size)
+    if duration is not None:
+        scan.duration_ms = int(duration[0] * 1000)
+        scan.duration_method = duration[1]
+    if scan.tag_size and not scan.issues:
+        scan.issues.extend(check_chapters(scan, tolerance_ms))
+    return scan
@@ -0,0 +1,68 @@
+# join a directory of MP3 parts into one chaptered audiobook, without re-encoding
+
+import argparse
+import os
+import sys
+from . import cuetools
+from . import mp3join
+from .covers import load_cover
+from .id3chapters import DEFAULT_TAG_PADDING, add_book_frames, add_chapter_frames, add_cover, save_tags
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+from .probes import ProbeError
+from .timeline import CueHeader
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Join MP3 parts into one chaptered MP3 by copying their frames')
+    parser.add_argument('directory', type=str, help='Directory containing the MP3 parts, joined in name order')
+    parser.add_argument('output_file', type=str, help='Name of the joined MP3 file')
+    parser.add_argument('-t', '--title', required=False, help='Book title')
+    parser.add_argument('-a', '--author', required=False, help='Author')
+    parser.add_argument('-p', '--picture', required=False, help='Image file (JPG or PNG; GIF, WebP and BMP are converted)')
+    parser.add_argument('-c', '--cue', required=False, help='Also write the chapters to this CUE file')
+    parser.add_argument('--tag-padding', type=int, default=DEFAULT_TAG_PADDING // 1024, required=False,
+                        help='KiB of ID3 padding to reserve, so later tag edits can be made in place')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name for name in sorted(os.listdir(args.directory)) if name.lower().endswith('.mp3')]
+    if not names:
+        print("No MP3 files found in " + args.directory)
+        sys.exit(1)
+    title = args.title or input("Book title? ")
+    author = args.author or input("Author? ")
+
+    with metrics_from_args(args) as metrics:
+        try:
+            with metrics.stage("scan parts"):
+                parts = [mp3join.scan_part(os.path.join(args.directory, name)) for name in names]
+            metrics.count("parts", len(parts))
+            metrics.count("frames", sum(part.frame_count for part in parts))
+            cover = load_cover(args.picture) if args.picture else None
+            tracks, total = mp3join.part_tracks(parts, [os.path.splitext(name)[0] for name in names])
+
+            def write_tags(fileobj):
+                from mutagen.id3 import ID3
+                tags = ID3()
+                add_book_frames(tags, title, author)
+                add_chapter_frames(tags, tracks)
+                if cover:
+                    add_cover(tags, cover)
+                save_tags(tags, fileobj, max(0, args.tag_padding) * 1024)
+
+            with metrics.stage("join"):
+                method = mp3join.join_parts(parts, args.output_file, write_tags)
+        except (OSError, ProbeError, ValueError) as ex:
+            print(ex)
+            sys.exit(1)
+        if args.cue:
+            header = CueHeader(title=title, file=os.path.basename(args.output_file), out_format="MP3", performer=author)
+            with metrics.stage("write cue"):
+                cuetools.save_cue(args.cue, header, tracks)
+
+    print(f"Joined {len(parts)} parts ({sum(part.frame_count for part in parts)} frames, "
+          f"{cuetools.format_frames(total)}) into {args.output_file} using {method}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# per-stage timing and I/O metrics shared by the command line tools.
+# when disabled, stage() hands back one shared no-op context manager, so instrumented code costs
+# a method call and an attribute check per stage
+
+import argparse
+import contextlib
+import json
+import sys
+import time
+from typing import Dict, Optional
+
+
+def read_proc_io() -> Optional[Dict[str, int]]:
+    # process-wide byte counters; Linux only
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except (OSError, ValueError):
+        return None
+
+
+class StageTotals:
+    __slots__ = ('calls', 'wall', 'cpu', 'bytes_read', 'bytes_written')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def to_dict(self) -> dict:
+        return {'calls': self.calls, 'wall_s': self.wall, 'cpu_s': self.cpu,
+                'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written}
+
+
+class StageTimer:
+    __slots__ = ('totals', 'wall', 'cpu', 'io')
+
+    def __init__(self, totals: StageTotals):
+        self.totals = totals
+
+    def __enter__(self):
+        self.io = read_proc_io()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        totals = self.totals
+        totals.wall += time.perf_counter() - self.wall
+        totals.cpu += time.process_time() - self.cpu
+        totals.calls += 1
+        if self.io is not None:
+            io = read_proc_io()
+            totals.bytes_read += io['rchar'] - self.io['rchar']
+            totals.bytes_written += io['wchar'] - self.io['wchar']
+        return False
+
+
+NULL_STAGE = contextlib.nullcontext()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages: Dict[str, StageTotals] = {}
+        self.counters: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    def stage(self, name: str):
+        # with metrics.stage("parse cue"): ...   (stages may nest; each keeps its own totals)
+        if not self.enabled:
+            return NULL_STAGE
+        totals = self.stages.get(name)
+        if totals is None:
+            totals = self.stages[name] = StageTotals()
+        return StageTimer(totals)
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, data: dict):
+        # fold in to_dict() output from another process, e.g. a batch worker
+        if not self.enabled or not data:
+            return
+        for name, values in data.get('stages', {}).items():
+            totals = self.stages.setdefault(name, StageTotals())
+            totals.calls += values['calls']
+            totals.wall += values['wall_s']
+            totals.cpu += values['cpu_s']
+            totals.bytes_read += values['bytes_read']
+            totals.bytes_written += values['bytes_written']
+        for name, amount in data.get('counters', {}).items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {'total_wall_s': time.perf_counter() - self.started,
+                'stages': {name: totals.to_dict() for name, totals in self.stages.items()},
+                'counters': dict(self.counters)}
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        stream.write(f'{"stage":24} {"calls":>6} {"wall s":>9} {"cpu s":>9} {"read MB":>9} {"written MB":>10}\n')
+        for name, totals in self.stages.items():
+            stream.write(f'{name:24} {totals.calls:6} {totals.wall:9.3f} {totals.cpu:9.3f} '
+                         f'{totals.bytes_read / 1e6:9.2f} {totals.bytes_written / 1e6:10.2f}\n')
+        for name, amount in self.counters.items():
+            stream.write(f'{name:24} {amount:6}\n')
+        stream.write(f'{"total":24} {"":6} {time.perf_counter() - self.started:9.3f}\n')
+
+
+class Reporter:
+    # ties the command line switches to a Metrics object: use as "with metrics_from_args(args) as metrics:"
+    def __init__(self, metrics: Metrics, show: bool, json_path: str, profile_path: str):
+        self.metrics = metrics
+        self.show = show
+        self.json_path = json_path
+        self.profile_path = profile_path
+        self.profiler = None
+
+    def __enter__(self) -> Metrics:
+        if self.profile_path:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self.metrics
+
+    def __exit__(self, *exc):
+        metrics = self.metrics
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        if self.show:
+            metrics.report()
+        if self.json_path:
+            with open(self.json_path, 'w') as f:
+                json.dump(metrics.to_dict(), f, indent=2)
+        return False
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--profile', action='store_true', help='Print per-stage timing and I/O to stderr')
+    parser.add_argument('--metrics-json', metavar='FILE', help='Write per-stage timing and I/O to a JSON file')
+    parser.add_argument('--cprofile', metavar='FILE', help='Dump cProfile statistics to FILE (view with pstats)')
+
+
+def metrics_from_args(args) -> Reporter:
+    enabled = bool(args.profile or args.metrics_json)
+    return Reporter(Metrics(enabled), args.profile, args.metrics_json, args.cprofile)
+
+
+NO_METRICS = Metrics(enabled=False)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+# joins MP3 parts into one stream without re-encoding. each part is scanned frame by frame (headers
+# only) to find its exact audio range and frame count; its ID3/APE tags and Xing/Info frame are left
+# behind, one new Info frame describing the whole result is written at the front, and the audio
+# payloads are copied by the kernel (copy_file_range, then sendfile) where it can
+
+import errno
+import mmap
+import os
+import struct
+from array import array
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from . import cuetools
+from . import probes
+from .probes import ProbeError, parse_mpeg_header
+from .timeline import CueTrack, FRAMES_PER_SECOND
+
+
+COPY_CHUNK = 64 * 1024 * 1024  # bytes per copy_file_range/sendfile call
+XING_TOC_ENTRIES = 100
+DEFAULT_ENCODER = b'LAME3.100'  # version string used when no part carries a LAME tag
+KERNEL_COPY_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+
+class MP3Part:
+    __slots__ = ('fname', 'audio_start', 'audio_end', 'frame_sizes', 'first_header', 'samples_per_frame',
+                 'sample_rate', 'bitrates', 'lame_tag', 'delay', 'padding')
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.audio_start = 0  # first audio frame, after any ID3v2 tag and Xing/Info frame
+        self.audio_end = 0  # end of the last whole frame, before any trailing tags or junk
+        self.frame_sizes = array('H')
+        self.first_header = b''
+        self.samples_per_frame = 0
+        self.sample_rate = 0
+        self.bitrates = set()
+        self.lame_tag = None  # the 36-byte LAME extension of the part's Info frame, if any
+        self.delay = 0
+        self.padding = 0
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.frame_sizes)
+
+    @property
+    def audio_size(self) -> int:
+        return self.audio_end - self.audio_start
+
+    @property
+    def stream_format(self) -> Tuple[int, int, bool]:
+        # (MPEG version and layer bits, sample rate index, mono): parts must agree on these to be joined
+        return self.first_header[1] & 0x1e, self.first_header[2] & 0x0c, self.first_header[3] >> 6 == 3
+
+
+def tag_end(data, size: int) -> int:
+    # end of the audio once an ID3v1 tag and/or APEv2 tag (in either order) are taken off the end
+    end = size
+    for _ in range(2):
+        if end >= 128 and data[end - 128:end - 125] == b'TAG':
+            end -= 128
+        if end >= 32 and data[end - 32:end - 24] == b'APETAGEX':
+            tag_size, _, flags = struct.unpack('<III', data[end - 20:end - 8])
+            end -= tag_size + (32 if flags & 0x80000000 else 0)
+    return max(0, end)
+
+
+def scan_part(fname: str) -> MP3Part:
+    part = MP3Part(fname)
+    with open(fname, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            raise ProbeError(f'{fname} is empty')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(data, 'madvise'):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            start = probes.id3v2_size(data[:10])
+            end = tag_end(data, size)
+            pos, frame = probes.find_first_frame(data[start:start + probes.HEAD_SIZE])
+            if frame is None:
+                raise ProbeError(f'no MPEG audio frames in {fname}')
+            pos += start
+            part.first_header = data[pos:pos + 4]
+            part.samples_per_frame = frame.samples
+            part.sample_rate = frame.sample_rate
+            frame_data = data[pos:pos + frame.size]
+            if probes.has_vbr_header(frame_data, frame):
+                lame = probes.lame_tag_offset(frame_data, frame)
+                if lame is not None:
+                    part.lame_tag = frame_data[lame:lame + probes.LAME_TAG_SIZE]
+                    part.delay, part.padding = probes.read_lame_delay(frame_data, frame)
+                pos += frame.size
+            part.audio_start = pos
+
+            # walk the frame headers; a header seen before is looked up rather than parsed again
+            same_stream = part.first_header[1] & 0x1e, part.first_header[2] & 0x0c
+            sizes = {}
+            frame_sizes = part.frame_sizes
+            while pos + 4 <= end:
+                header = data[pos:pos + 4]
+                frame_size = sizes.get(header)
+                if frame_size is None:
+                    frame = parse_mpeg_header(header)
+                    if frame is None or (header[1] & 0x1e, header[2] & 0x0c) != same_stream:
+                        break
+                    frame_size = sizes[header] = frame.size
+                    part.bitrates.add(header[2] >> 4)
+                if pos + frame_size > end:
+                    break  # truncated last frame
+                frame_sizes.append(frame_size)
+                pos += frame_size
+            part.audio_end = pos
+    if not part.frame_sizes:
+        raise ProbeError(f'no MPEG audio frames in {fname}')
+    return part
+
+
+def check_compatible(parts: List[MP3Part]):
+    # parts can only be concatenated if they decode with the same version, layer, rate and channels
+    first = parts[0]
+    for part in parts[1:]:
+        if part.stream_format != first.stream_format:
+            raise ValueError(f'{part.fname} has a different MPEG format, sample rate or channel count '
+                             f'from {first.fname}; it would need re-encoding to join')
+
+
+def crc16(data: bytes, crc: int = 0) -> int:
+    # CRC-16 (polynomial 0x8005, reflected), as used for the LAME tag checksum
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+    return crc
+
+
+def xing_toc(parts: List[MP3Part], info_size: int, total_frames: int, total_bytes: int) -> bytes:
+    # byte position (as a fraction of 256) of the frame at each whole percent of the playing time
+    targets = [percent * total_frames // XING_TOC_ENTRIES for percent in range(XING_TOC_ENTRIES)]
+    toc = bytearray(XING_TOC_ENTRIES)
+    entry = 0
+    first_frame = 0
+    offset = info_size
+    for part in parts:
+        sizes = part.frame_sizes
+        done = 0
+        while entry < XING_TOC_ENTRIES and targets[entry] < first_frame + len(sizes):
+            target = targets[entry] - first_frame
+            offset += sum(sizes[done:target])
+            done = target
+            toc[entry] = min(255, offset * 256 // total_bytes)
+            entry += 1
+        offset += sum(sizes[done:])
+        first_frame += len(sizes)
+    return bytes(toc)
+
+
+def build_info_frame(parts: List[MP3Part]) -> bytes:
+    # a silent frame holding a Xing/Info tag (frame count, byte count, seek table) and a LAME
+    # extension (encoder delay of the first part, padding of the last) for the joined stream
+    first = parts[0]
+    head = first.first_header
+    side_info_size = parse_mpeg_header(head).side_info_size
+    xing = 4 + side_info_size
+    lame = xing + 120
+    needed = lame + probes.LAME_TAG_SIZE
+    # use the stream's own bitrate when the tag fits, so a CBR stream stays uniform
+    for bitrate_index in [head[2] >> 4] + list(range(1, 15)):
+        header = bytes([0xff, head[1] | 1, bitrate_index << 4 | head[2] & 0x0c, head[3]])  # no CRC, no padding
+        frame = parse_mpeg_header(header)
+        if frame is not None and frame.size >= needed:
+            break
+    else:
+        raise ValueError('no MPEG frame size is big enough for an Info tag')
+
+    bitrates = set().union(*(part.bitrates for part in parts))
+    total_frames = sum(part.frame_count for part in parts)
+    total_bytes = frame.size + sum(part.audio_size for part in parts)
+    data = bytearray(frame.size)
+    data[:4] = header
+    struct.pack_into('>4sIII', data, xing, b'Info' if len(bitrates) == 1 else b'Xing', 0x0f, total_frames, total_bytes)
+    data[xing + 16:xing + 116] = xing_toc(parts, frame.size, total_frames, total_bytes)
+
+    if first.lame_tag is not None:
+        tag = bytearray(first.lame_tag)
+        tag[11:19] = bytes(8)  # the first part's ReplayGain doesn't describe the whole book
+    else:
+        tag = bytearray(probes.LAME_TAG_SIZE)
+        tag[:9] = DEFAULT_ENCODER
+        tag[9] = 1 if len(bitrates) == 1 else 0  # tag revision 0, CBR or unknown VBR method
+    delay, padding = min(first.delay, 0xfff), min(parts[-1].padding, 0xfff)
+    tag[21:24] = bytes([delay >> 4, (delay & 0x0f) << 4 | padding >> 8, padding & 0xff])
+    struct.pack_into('>IH', tag, 28, total_bytes, 0)  # music length; the music CRC would mean reading all the audio
+    data[lame:lame + probes.LAME_TAG_SIZE] = tag
+    struct.pack_into('>H', data, lame + 34, crc16(data[:lame + 34]))
+    return bytes(data)
+
+
+def part_tracks(parts: List[MP3Part], titles: List[str]) -> Tuple[List[CueTrack], int]:
+    # one track per part, starting where its first frame plays in the joined stream; positions come
+    # from frame counts, so they are exact to the sample before rounding to the nearest CUE frame
+    # (never more than half an MP3 frame out, so split-mp3 cuts back at the same boundary).
+    # returns the tracks and the playing time of the whole stream in CUE frames
+    rate = parts[0].sample_rate
+    delay = parts[0].delay
+    samples = 0
+    tracks = []
+    for order, (part, title) in enumerate(zip(parts, titles), 1):
+        start = max(0, samples - delay)
+        tracks.append(CueTrack(order, title, (start * FRAMES_PER_SECOND + rate // 2) // rate, color="cyan"))
+        samples += part.frame_count * part.samples_per_frame
+    total = max(0, samples - delay - parts[-1].padding) * FRAMES_PER_SECOND // rate
+    for track, following in zip(tracks, tracks[1:]):
+        track.duration = following.start - track.start
+    if tracks:
+        tracks[-1].duration = max(0, total - tracks[-1].start)
+    return tracks, total
+
+
+def write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_range(source_fd: int, target_fd: int, offset: int, count: int) -> str:
+    # appends count bytes of source from offset at the target's file position, without passing
+    # the data through user space where the kernel allows; returns the method that did the copy
+    method = 'copy_file_range' if hasattr(os, 'copy_file_range') else 'sendfile' if hasattr(os, 'sendfile') else 'read'
+    while count > 0:
+        chunk = min(count, COPY_CHUNK)
+        try:
+            if method == 'copy_file_range':
+                copied = os.copy_file_range(source_fd, target_fd, chunk, offset)
+            elif method == 'sendfile':
+                copied = os.sendfile(target_fd, source_fd, offset, chunk)
+            else:
+                data = os.pread(source_fd, chunk, offset)
+                write_all(target_fd, data)
+                copied = len(data)
+        except OSError as ex:
+            if method == 'read' or ex.errno not in KERNEL_COPY_ERRORS:
+                raise
+            method = 'sendfile' if method == 'copy_file_range' and hasattr(os, 'sendfile') else 'read'
+            continue
+        if copied == 0:
+            raise OSError(errno.EIO, 'file shrank while it was being copied')
+        offset += copied
+        count -= copied
+    return method
+
+
+def join_parts(parts: List[MP3Part], output: str, write_tags: Optional[Callable[[BinaryIO], None]] = None) -> str:
+    # writes a temporary file beside output and renames it into place (see cuetools.open_atomic).
+    # write_tags(fileobj) is called while that file is still empty, so an ID3 tag goes in front
+    # without moving the audio afterwards; mutagen saves to a file object as it does to a path.
+    # returns how the audio was copied
+    check_compatible(parts)
+    info = build_info_frame(parts)
+    method = 'none'
+    with cuetools.open_atomic(output, binary=True, prefix='.join-') as target:
+        if write_tags is not None:
+            write_tags(target)
+        target.seek(0, os.SEEK_END)
+        target.write(info)
+        target.flush()  # the parts are copied below the buffer, straight to the descriptor
+        for part in parts:
+            with open(part.fname, 'rb') as source:
+                method = copy_range(source.fileno(), target.fileno(), part.audio_start, part.audio_size)
+    return method
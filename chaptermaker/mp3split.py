@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# cuts one MP3 into per-chapter files on frame boundaries, without decoding. the source is scanned
+# once for its frame table; each chapter is then a run of whole frames, written behind its own
+# Info frame by mp3join, so every piece plays and seeks as a complete file
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+from . import mp3join
+from .mp3join import MP3Part
+from .timeline import CueTrack, frames_to_ms
+
+
+UNSAFE_NAME_PATTERN = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class Chapter:
+    __slots__ = ('order', 'title', 'start_ms', 'end_ms')
+
+    def __init__(self, order: int, title: str, start_ms: int, end_ms: int = 0):
+        self.order = order
+        self.title = title
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def __repr__(self):
+        return f'Chapter({self.order}, {self.title!r}, {self.start_ms}, {self.end_ms})'
+
+
+def chapters_from_tracks(tracks: List[CueTrack]) -> List[Chapter]:
+    # a parent track's span covers its children, so cut at every start rather than using track ends
+    return [Chapter(track.order, track.title, frames_to_ms(track.start)) for track in tracks]
+
+
+def chapters_from_tags(tags) -> List[Chapter]:
+    # CHAP frames already in the file, in time order
+    frames = sorted(tags.getall('CHAP'), key=lambda chap: chap.start_time)
+    chapters = []
+    for order, chap in enumerate(frames, 1):
+        title = chap.sub_frames.get('TIT2')
+        chapters.append(Chapter(order, str(title) if title else f'Chapter {order}', chap.start_time))
+    return chapters
+
+
+def frame_at(part: MP3Part, ms: int) -> int:
+    # index of the frame boundary nearest to a playing time, allowing for the encoder delay
+    sample = ms * part.sample_rate // 1000 + part.delay
+    return max(0, min(part.frame_count, (sample + part.samples_per_frame // 2) // part.samples_per_frame))
+
+
+def cut_points(part: MP3Part, chapters: List[Chapter]) -> List[Tuple[int, int]]:
+    # (first frame, byte offset) where each chapter starts, plus the end of the audio; the offsets are
+    # summed in one pass over the frame table
+    frames = [0] + [frame_at(part, chapter.start_ms) for chapter in chapters[1:]] + [part.frame_count]
+    points = []
+    done = 0
+    offset = part.audio_start
+    for frame in frames:
+        frame = max(frame, done)  # never go backwards, even if chapter times do
+        offset += sum(part.frame_sizes[done:frame])
+        done = frame
+        points.append((frame, offset))
+    return points
+
+
+def chapter_parts(part: MP3Part, chapters: List[Chapter]) -> List[MP3Part]:
+    # the source described as one MP3Part per chapter: same file, a different run of frames
+    points = cut_points(part, chapters)
+    pieces = []
+    for number, ((first, start), (last, end)) in enumerate(zip(points, points[1:])):
+        piece = MP3Part(part.fname)
+        piece.audio_start = start
+        piece.audio_end = end
+        piece.frame_sizes = part.frame_sizes[first:last]
+        piece.first_header = part.first_header
+        piece.samples_per_frame = part.samples_per_frame
+        piece.sample_rate = part.sample_rate
+        piece.bitrates = part.bitrates
+        piece.lame_tag = part.lame_tag
+        piece.delay = part.delay if number == 0 else 0
+        piece.padding = part.padding if number == len(points) - 2 else 0
+        pieces.append(piece)
+    for chapter, piece in zip(chapters, pieces):
+        chapter.end_ms = chapter.start_ms + (piece.frame_count * piece.samples_per_frame - piece.delay - piece.padding) * 1000 // piece.sample_rate
+    return pieces
+
+
+def file_name(chapter: Chapter, width: int = 2) -> str:
+    title = UNSAFE_NAME_PATTERN.sub('_', chapter.title).strip(' .') or 'Chapter'
+    return f'{chapter.order:0{width}} - {title}.mp3'
+
+
+def split(part: MP3Part, chapters: List[Chapter], outputs: List[str],
+          write_tags: Optional[Callable[[str, Chapter], None]] = None, workers: int = 4) -> List[str]:
+    # writes every chapter in parallel: the copies are kernel calls that release the GIL, and all
+    # workers read positioned ranges of the one source file. returns how each file was copied
+    pieces = chapter_parts(part, chapters)
+    empty = [chapter.title for chapter, piece in zip(chapters, pieces) if piece.frame_count == 0]
+    if empty:
+        raise ValueError('chapters too short to hold a single frame: ' + ', '.join(empty))
+
+    def write_one(item):
+        chapter, piece, output = item
+        tagger = (lambda path: write_tags(path, chapter)) if write_tags else None
+        return mp3join.join_parts([piece], output, tagger)
+
+    from concurrent.futures import ThreadPoolExecutor  # pulls in logging, so not at import time
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(write_one, zip(chapters, pieces, outputs)))
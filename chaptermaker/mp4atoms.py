@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# building blocks for MP4/M4B atoms (boxes): a size, a four-character type and a payload
+
+import struct
+from typing import Iterable, Tuple
+
+
+CHPL_UNITS_PER_MS = 10000  # Nero chapter starts are in 100 ns units
+MAX_CHPL_CHAPTERS = 255  # the chapter count is a single byte
+MAX_CHPL_TITLE = 255  # and so is each title's length, in UTF-8 bytes
+
+
+def atom(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def _chpl_title(title: str) -> bytes:
+    # cut on a character boundary so a long title still decodes
+    data = title.encode('utf-8')
+    if len(data) <= MAX_CHPL_TITLE:
+        return data
+    return data[:MAX_CHPL_TITLE].decode('utf-8', errors='ignore').encode('utf-8')
+
+
+def chpl_entry(start_ms: int, title: str) -> bytes:
+    data = _chpl_title(title)
+    return struct.pack('>QB', start_ms * CHPL_UNITS_PER_MS, len(data)) + data
+
+
+def chpl_atom(entries: Iterable[bytes], count: int) -> bytes:
+    # moov/udta/chpl, version 1: flags, four reserved bytes, the count, then the chpl_entry()s
+    if count > MAX_CHPL_CHAPTERS:
+        raise ValueError(f'Nero chapters hold at most {MAX_CHPL_CHAPTERS} chapters, not {count}')
+    return atom(b'chpl', b'\x01\x00\x00\x00' + bytes(4) + bytes([count]) + b''.join(entries))
+
+
+def chpl_from(chapters: Iterable[Tuple[int, str]]) -> bytes:
+    # chapters are (start_ms, title) in time order
+    entries = [chpl_entry(start_ms, title) for start_ms, title in chapters]
+    return chpl_atom(entries, len(entries))
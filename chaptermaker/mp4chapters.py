@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# chapters, title, author and cover for M4B/MP4 audiobooks: Nero chapters in moov/udta/chpl and
+# iTunes items in moov/udta/meta/ilst. only moov is rebuilt; it goes back where it was when it fits
+# there (with any free atoms next to it) or sits at the end of the file, so the audio in mdat is
+# never moved. only a moov that has to grow in front of mdat forces a rewrite of the whole file,
+# with the chunk offsets in stco/co64 shifted to match
+
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+from . import cuetools
+from . import mp3join
+from . import mp4atoms
+from . import probes
+from .id3chapters import DEFAULT_TAG_PADDING, UNCHANGED, UPDATED, REWRITTEN
+from .timeline import CueTrack, frames_to_ms
+
+
+MP4_SUFFIXES = ['.m4b', '.m4a', '.mp4']
+SLACK_ATOMS = (b'free', b'skip')
+# atoms whose payload is just more atoms, on the way down to the chunk offset tables
+CONTAINER_ATOMS = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+DATA_UTF8 = 1
+DATA_JPEG = 13
+DATA_PNG = 14
+DATA_INTEGER = 21
+COVER_TYPES = {'image/jpeg': DATA_JPEG, 'image/png': DATA_PNG}
+AUDIOBOOK_MEDIA_TYPE = 2  # stik value iTunes and Apple Books use for audiobooks
+BOOK_ITEMS = (b'\xa9nam', b'\xa9alb', b'\xa9ART', b'aART', b'\xa9gen', b'stik')
+
+
+def is_mp4_file(fname) -> bool:
+    return os.path.splitext(str(fname))[1].lower() in MP4_SUFFIXES
+
+
+def iter_atoms(data: bytes, start: int = 0, end: int = None) -> Iterator[Tuple[bytes, int, int, int]]:
+    # (type, atom start, payload start, atom end) for the atoms in data[start:end]
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        payload = pos + 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            payload = pos + 16
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos or pos + size > end:
+            raise ValueError(f'corrupt MP4 atom {kind!r} at {pos}')
+        yield kind, pos, payload, pos + size
+        pos += size
+
+
+def free_atom(size: int) -> bytes:
+    return struct.pack('>I4s', size, b'free') + bytes(size - 8)
+
+
+def item(kind: bytes, data_type: int, value: bytes) -> bytes:
+    # an ilst entry: the item atom around one data atom (type, zero locale, value)
+    return mp4atoms.atom(kind, mp4atoms.atom(b'data', struct.pack('>II', data_type, 0) + value))
+
+
+def book_items(title: str, author: str, cover=None) -> List[bytes]:
+    items = [
+        item(b'\xa9nam', DATA_UTF8, title.encode('utf-8')),
+        item(b'\xa9alb', DATA_UTF8, title.encode('utf-8')),  # album name
+        item(b'\xa9ART', DATA_UTF8, author.encode('utf-8')),
+        item(b'aART', DATA_UTF8, author.encode('utf-8')),  # album artist
+        item(b'\xa9gen', DATA_UTF8, b'Audiobook'),
+        item(b'stik', DATA_INTEGER, bytes([AUDIOBOOK_MEDIA_TYPE])),
+    ]
+    if cover is not None:
+        if cover.mime not in COVER_TYPES:
+            raise ValueError(f'MP4 covers must be JPEG or PNG, not {cover.mime}')
+        items.append(item(b'covr', COVER_TYPES[cover.mime], cover.data))
+    return items
+
+
+def build_meta(old_meta: Optional[bytes], items: List[bytes], replace_cover: bool) -> bytes:
+    # the iTunes meta atom with our items first and any other items kept after them, in their order
+    replaced = BOOK_ITEMS + ((b'covr',) if replace_cover else ())
+    full_box = True
+    handler = None
+    kept_items = []
+    others = []
+    if old_meta is not None:
+        payload = 8
+        full_box = old_meta[12:16] != b'hdlr'  # QuickTime writes meta without version and flags
+        for kind, start, child, end in iter_atoms(old_meta, payload + 4 if full_box else payload):
+            if kind == b'hdlr':
+                handler = old_meta[start:end]
+            elif kind == b'ilst':
+                kept_items.extend(old_meta[item_start:item_end] for item_kind, item_start, _, item_end
+                                  in iter_atoms(old_meta, child, end) if item_kind not in replaced)
+            elif kind not in SLACK_ATOMS:
+                others.append(old_meta[start:end])
+    if handler is None:
+        handler = mp4atoms.atom(b'hdlr', bytes(8) + b'mdirappl' + bytes(9))
+    ilst = mp4atoms.atom(b'ilst', b''.join(items + kept_items))
+    return mp4atoms.atom(b'meta', (bytes(4) if full_box else b'') + handler + ilst + b''.join(others))
+
+
+def build_moov(moov: bytes, items: List[bytes], chpl: bytes, replace_cover: bool) -> bytes:
+    # moov with udta holding the new meta and chpl; everything else is copied as it was, except
+    # free atoms inside moov and udta, whose space goes to the slack around the new moov
+    kind, _, payload, end = next(iter_atoms(moov))
+    children = []
+    udta_children = []
+    old_meta = None
+    for kind, start, child, child_end in iter_atoms(moov, payload, end):
+        if kind == b'udta':
+            for udta_kind, udta_start, _, udta_end in iter_atoms(moov, child, child_end):
+                if udta_kind == b'meta':
+                    old_meta = moov[udta_start:udta_end]
+                elif udta_kind != b'chpl' and udta_kind not in SLACK_ATOMS:
+                    udta_children.append(moov[udta_start:udta_end])
+        elif kind not in SLACK_ATOMS:
+            children.append(moov[start:child_end])
+    udta = mp4atoms.atom(b'udta', b''.join(udta_children) + build_meta(old_meta, items, replace_cover) + chpl)
+    return mp4atoms.atom(b'moov', b''.join(children) + udta)
+
+
+def shift_chunk_offsets(moov: bytearray, delta: int, from_offset: int, start: int = 0, end: int = None):
+    # adds delta to every stco/co64 chunk offset at or past from_offset, in place
+    for kind, _, payload, atom_end in iter_atoms(moov, start, end):
+        if kind in CONTAINER_ATOMS:
+            shift_chunk_offsets(moov, delta, from_offset, payload, atom_end)
+        elif kind in (b'stco', b'co64'):
+            count = struct.unpack_from('>I', moov, payload + 4)[0]
+            entry = '>I' if kind == b'stco' else '>Q'
+            width = struct.calcsize(entry)
+            for pos in range(payload + 8, payload + 8 + count * width, width):
+                offset = struct.unpack_from(entry, moov, pos)[0]
+                if offset >= from_offset:
+                    if kind == b'stco' and offset + delta > 0xffffffff:
+                        raise ValueError('moving the audio would push its chunk offsets past 4 GiB (stco)')
+                    struct.pack_into(entry, moov, pos, offset + delta)
+
+
+def top_level_atoms(fileobj, size: int) -> List[Tuple[bytes, int, int]]:
+    # (type, start, end) of each atom at the top of the file; only their headers are read
+    atoms = []
+    start = 0
+    for kind, _, end in probes.iter_boxes(fileobj, 0, size):
+        atoms.append((kind, start, end))
+        start = end
+    return atoms
+
+
+def write_chapters(fname: str, title: str, author: str, tracks: List[CueTrack], cover=None,
+                   reserve: int = DEFAULT_TAG_PADDING, force: bool = False) -> str:
+    # returns UNCHANGED, UPDATED (moov rewritten where it was) or REWRITTEN (whole file rewritten)
+    chpl = mp4atoms.chpl_from((frames_to_ms(track.start), track.title) for track in tracks)
+    items = book_items(title, author, cover)
+    with open(fname, 'r+b') as fileobj:
+        size = os.fstat(fileobj.fileno()).st_size
+        atoms = top_level_atoms(fileobj, size)
+        positions = [i for i, (kind, _, _) in enumerate(atoms) if kind == b'moov']
+        if len(positions) != 1:
+            raise ValueError(f'{fname} has {len(positions)} moov atoms, expected one')
+        first = last = positions[0]
+        moov_start, moov_end = atoms[first][1:]
+        old_moov = probes.read_at(fileobj, moov_start, moov_end - moov_start)
+        new_moov = build_moov(old_moov, items, chpl, cover is not None)
+        if new_moov == old_moov and not force:
+            return UNCHANGED
+
+        # the region moov may use: moov itself and the free atoms on either side of it
+        while first > 0 and atoms[first - 1][0] in SLACK_ATOMS:
+            first -= 1
+        while last + 1 < len(atoms) and atoms[last + 1][0] in SLACK_ATOMS:
+            last += 1
+        region_start = atoms[first][1]
+        region_end = atoms[last][2]
+        slack = region_end - region_start - len(new_moov)
+
+        if region_end == size:
+            # nothing follows, so the region can grow or shrink freely
+            fileobj.seek(region_start)
+            fileobj.write(new_moov)
+            fileobj.truncate()
+            return UPDATED
+        if slack == 0 or slack >= 8:
+            fileobj.seek(region_start)
+            fileobj.write(new_moov + (free_atom(slack) if slack else b''))
+            return UPDATED
+
+    # moov has to grow in front of the audio: rewrite the file with room to spare next time
+    padding = free_atom(max(8, reserve))
+    new_moov = bytearray(new_moov)
+    shift_chunk_offsets(new_moov, region_start + len(new_moov) + len(padding) - region_end, region_end)
+    with open(fname, 'rb') as source, cuetools.open_atomic(fname, binary=True, prefix='.m4b-') as output:
+        target_fd = output.fileno()
+        mp3join.copy_range(source.fileno(), target_fd, 0, region_start)
+        mp3join.write_all(target_fd, bytes(new_moov) + padding)
+        mp3join.copy_range(source.fileno(), target_fd, region_end, size - region_end)
+    return REWRITTEN
+
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+# header-only duration probes: each probe reads a few small regions of the file (the headers and,
+# for Ogg, the last page) and never scans the audio itself
+
+import os
+import struct
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+
+HEAD_SIZE = 64 * 1024  # how much of the file start we look at when sniffing and syncing
+OGG_TAIL_SIZE = 64 * 1024 + 27 + 255  # always holds the whole last page
+
+
+class ProbeError(Exception):
+    pass
+
+
+class Probe:
+    # name, file suffixes it claims, a sniff(head) test on the first bytes after any ID3v2 tag,
+    # and probe(fileobj, size, audio_start) -> (seconds, method)
+    def __init__(self, name: str, suffixes: List[str], sniff: Callable[[bytes], bool],
+                 probe: Callable[[BinaryIO, int, int], Tuple[float, str]]):
+        self.name = name
+        self.suffixes = suffixes
+        self.sniff = sniff
+        self.probe = probe
+
+
+PROBES: List[Probe] = []
+
+
+def register_probe(name: str, suffixes: List[str], sniff: Callable[[bytes], bool],
+                   probe: Callable[[BinaryIO, int, int], Tuple[float, str]]):
+    PROBES.append(Probe(name, suffixes, sniff, probe))
+
+
+def read_at(fileobj: BinaryIO, offset: int, size: int) -> bytes:
+    fileobj.seek(offset)
+    return fileobj.read(size)
+
+
+def id3v2_size(head: bytes) -> int:
+    # total length of an ID3v2 tag at the start of head (header, body and optional footer), else 0
+    if len(head) < 10 or head[:3] != b'ID3':
+        return 0
+    size = (head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+# MPEG audio
+
+MPEG_BITRATES = {
+    # (version is MPEG1, layer) -> kbps by index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MPEG_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+class MPEGFrame:
+    __slots__ = ('version', 'layer', 'bitrate', 'sample_rate', 'padding', 'channel_mode', 'size', 'samples')
+
+    def __init__(self, version: int, layer: int, bitrate: int, sample_rate: int, padding: int, channel_mode: int):
+        self.version = version  # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+        self.layer = layer
+        self.bitrate = bitrate  # bits per second
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channel_mode = channel_mode  # 3 = mono
+        if layer == 1:
+            self.samples = 384
+            self.size = (12 * bitrate // sample_rate + padding) * 4
+        else:
+            self.samples = 1152 if layer == 2 or version == 3 else 576
+            self.size = (self.samples // 8) * bitrate // sample_rate + padding
+
+    @property
+    def side_info_size(self) -> int:
+        if self.version == 3:
+            return 17 if self.channel_mode == 3 else 32
+        return 9 if self.channel_mode == 3 else 17
+
+
+def parse_mpeg_header(data: bytes, pos: int = 0) -> Optional[MPEGFrame]:
+    if len(data) < pos + 4 or data[pos] != 0xff or data[pos + 1] & 0xe0 != 0xe0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # reserved values, or free format which we can't size
+    bitrate = MPEG_BITRATES[(version == 3, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    return MPEGFrame(version, layer, bitrate, sample_rate, (b2 >> 1) & 1, b3 >> 6)
+
+
+def find_first_frame(data: bytes, start: int = 0) -> Tuple[int, Optional[MPEGFrame]]:
+    # first sync where the following frame header is also valid, to skip false syncs in junk/art
+    pos = data.find(b'\xff', start)
+    while pos != -1:
+        frame = parse_mpeg_header(data, pos)
+        if frame is not None:
+            following = parse_mpeg_header(data, pos + frame.size)
+            if following is not None or pos + frame.size >= len(data):
+                return pos, frame
+        pos = data.find(b'\xff', pos + 1)
+    return -1, None
+
+
+LAME_ENCODERS = (b'LAME', b'Lavf', b'Lavc', b'L3.9')
+LAME_TAG_SIZE = 36
+
+
+def xing_tag_offset(frame: MPEGFrame) -> int:
+    # where a Xing/Info tag sits in the first frame: straight after the header and side info
+    return 4 + frame.side_info_size
+
+
+def lame_tag_offset(frame_data: bytes, frame: MPEGFrame) -> Optional[int]:
+    # offset of the LAME extension that follows a Xing/Info tag, if the encoder wrote one
+    offset = xing_tag_offset(frame)
+    if frame_data[offset:offset + 4] not in (b'Xing', b'Info'):
+        return None
+    flags = struct.unpack('>I', frame_data[offset + 4:offset + 8])[0]
+    lame = offset + 8 + (4 if flags & 1 else 0) + (4 if flags & 2 else 0) + (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+    if frame_data[lame:lame + 4] in LAME_ENCODERS and len(frame_data) >= lame + LAME_TAG_SIZE:
+        return lame
+    return None
+
+
+def read_lame_delay(frame_data: bytes, frame: MPEGFrame) -> Optional[Tuple[int, int]]:
+    # (encoder delay, end padding) in samples from the LAME extension
+    lame = lame_tag_offset(frame_data, frame)
+    if lame is None:
+        return None
+    packed = frame_data[lame + 21:lame + 24]
+    return packed[0] << 4 | packed[1] >> 4, (packed[1] & 0x0f) << 8 | packed[2]
+
+
+def has_vbr_header(frame_data: bytes, frame: MPEGFrame) -> bool:
+    # the first frame is an encoder-written Xing/Info/VBRI header rather than audio
+    offset = xing_tag_offset(frame)
+    return frame_data[offset:offset + 4] in (b'Xing', b'Info') or frame_data[36:40] == b'VBRI'
+
+
+def read_vbr_header(frame_data: bytes, frame: MPEGFrame) -> Optional[Tuple[int, int, str]]:
+    # Xing/Info (with optional LAME delay/padding) or VBRI: (frame count, samples to drop, method)
+    offset = xing_tag_offset(frame)
+    tag = frame_data[offset:offset + 4]
+    if tag in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', frame_data[offset + 4:offset + 8])[0]
+        if not flags & 1:
+            return None
+        frames = struct.unpack('>I', frame_data[offset + 8:offset + 12])[0]
+        delay = read_lame_delay(frame_data, frame)
+        if delay is not None:
+            return frames, delay[0] + delay[1], 'mp3-lame'
+        return frames, 0, 'mp3-xing'
+    offset = 4 + 32
+    if frame_data[offset:offset + 4] == b'VBRI':
+        frames = struct.unpack('>I', frame_data[offset + 14:offset + 18])[0]
+        return frames, 0, 'mp3-vbri'
+    return None
+
+
+def probe_mpeg(fileobj: BinaryIO, size: int, audio_start: int) -> Tuple[float, str]:
+    head = read_at(fileobj, audio_start, HEAD_SIZE)
+    pos, frame = find_first_frame(head)
+    if frame is None:
+        raise ProbeError('no MPEG audio frames found')
+    frame_data = head[pos:pos + frame.size]
+    if len(frame_data) < frame.size:
+        frame_data = read_at(fileobj, audio_start + pos, frame.size)
+    vbr = read_vbr_header(frame_data, frame)
+    if vbr is not None:
+        frames, dropped, method = vbr
+        return max(0, frames * frame.samples - dropped) / frame.sample_rate, method
+    # no VBR header, so assume constant bitrate over the rest of the file
+    audio_end = size
+    if size >= 128 and read_at(fileobj, size - 128, 3) == b'TAG':
+        audio_end -= 128
+    audio_bytes = audio_end - audio_start - pos
+    return audio_bytes * 8 / frame.bitrate, 'mp3-cbr'
+
+
+def sniff_mpeg(head: bytes) -> bool:
+    return find_first_frame(head[:4096])[1] is not None
+
+
+# FLAC
+
+def probe_flac(fileobj: BinaryIO, size: int, audio_start: int) -> Tuple[float, str]:
+    head = read_at(fileobj, audio_start, 4 + 4 + 34)
+    if head[:4] != b'fLaC' or head[4] & 0x7f != 0:
+        raise ProbeError('no FLAC STREAMINFO block')
+    info = head[8:]
+    sample_rate = info[10] << 12 | info[11] << 4 | info[12] >> 4
+    total_samples = (info[13] & 0x0f) << 32 | struct.unpack('>I', info[14:18])[0]
+    if not sample_rate or not total_samples:
+        raise ProbeError('FLAC STREAMINFO has no length')
+    return total_samples / sample_rate, 'flac-streaminfo'
+
+
+# MP4 / M4B
+
+def iter_boxes(fileobj: BinaryIO, start: int, end: int):
+    # yields (type, offset of payload, end of box) for the boxes between start and end
+    pos = start
+    while pos + 8 <= end:
+        header = read_at(fileobj, pos, 16)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        payload = pos + 8
+        if box_size == 1:
+            if len(header) < 16:
+                return
+            box_size = struct.unpack('>Q', header[8:16])[0]
+            payload = pos + 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < payload - pos:
+            raise ProbeError('corrupt MP4 box')
+        yield box_type, payload, pos + box_size
+        pos += box_size
+
+
+def probe_mp4(fileobj: BinaryIO, size: int, audio_start: int) -> Tuple[float, str]:
+    for box_type, payload, box_end in iter_boxes(fileobj, 0, size):
+        if box_type != b'moov':
+            continue
+        for child_type, child_payload, child_end in iter_boxes(fileobj, payload, box_end):
+            if child_type != b'mvhd':
+                continue
+            mvhd = read_at(fileobj, child_payload, 32)
+            if mvhd[0] == 1:
+                timescale, duration = struct.unpack('>IQ', mvhd[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', mvhd[12:20])
+            if not timescale:
+                raise ProbeError('MP4 mvhd has no timescale')
+            return duration / timescale, 'mp4-mvhd'
+    raise ProbeError('no MP4 moov/mvhd box')
+
+
+def sniff_mp4(head: bytes) -> bool:
+    return head[4:8] in (b'ftyp', b'moov', b'free', b'mdat', b'wide')
+
+
+# Ogg (Vorbis, Opus)
+
+def probe_ogg(fileobj: BinaryIO, size: int, audio_start: int) -> Tuple[float, str]:
+    head = read_at(fileobj, audio_start, 27 + 255 + 64)
+    if head[:4] != b'OggS':
+        raise ProbeError('no Ogg page')
+    serial = head[14:18]
+    segments = head[26]
+    packet = head[27 + segments:]
+    if packet[:7] == b'\x01vorbis':
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+        pre_skip = 0
+        method = 'ogg-vorbis'
+    elif packet[:8] == b'OpusHead':
+        sample_rate = 48000  # Opus granule positions always count 48 kHz samples
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        method = 'ogg-opus'
+    else:
+        raise ProbeError('unsupported Ogg codec')
+    tail_start = max(audio_start, size - OGG_TAIL_SIZE)
+    tail = read_at(fileobj, tail_start, size - tail_start)
+    pos = tail.rfind(b'OggS')
+    while pos != -1:
+        if len(tail) >= pos + 18 and tail[pos + 14:pos + 18] == serial:
+            granule = struct.unpack('<q', tail[pos + 6:pos + 14])[0]
+            if granule >= 0 and sample_rate:
+                return max(0, granule - pre_skip) / sample_rate, method
+        pos = tail.rfind(b'OggS', 0, pos)
+    raise ProbeError('no final Ogg page with a granule position')
+
+
+# RIFF WAVE
+
+WAVE_FORMAT_EXTENSIBLE = 0xfffe
+
+
+class WaveFormat:
+    __slots__ = ('format_tag', 'channels', 'sample_rate', 'block_align', 'bits_per_sample', 'data_offset', 'data_size')
+
+    def __init__(self):
+        self.format_tag = 0
+        self.channels = 0
+        self.sample_rate = 0
+        self.block_align = 0
+        self.bits_per_sample = 0
+        self.data_offset = 0
+        self.data_size = 0
+
+    @property
+    def frame_count(self) -> int:
+        return self.data_size // self.block_align if self.block_align else 0
+
+
+def read_wave_format(fileobj: BinaryIO, size: int) -> WaveFormat:
+    # walks the RIFF chunks, reading only chunk headers and the fmt chunk
+    head = read_at(fileobj, 0, 12)
+    if head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+        raise ProbeError('not a RIFF WAVE file')
+    wave_format = WaveFormat()
+    pos = 12
+    while pos + 8 <= size:
+        chunk_id, chunk_size = struct.unpack('<4sI', read_at(fileobj, pos, 8))
+        if chunk_id == b'fmt ':
+            fmt = read_at(fileobj, pos + 8, 26)
+            (wave_format.format_tag, wave_format.channels, wave_format.sample_rate, _,
+             wave_format.block_align, wave_format.bits_per_sample) = struct.unpack('<HHIIHH', fmt[:16])
+            if wave_format.format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # the real encoding is the first two bytes of the sub-format GUID
+                wave_format.format_tag = struct.unpack('<H', fmt[24:26])[0]
+        elif chunk_id == b'data':
+            wave_format.data_offset = pos + 8
+            wave_format.data_size = min(chunk_size, size - pos - 8)  # streamed files may leave this unset
+            break
+        pos += 8 + chunk_size + (chunk_size & 1)
+    if not wave_format.sample_rate or not wave_format.data_offset:
+        raise ProbeError('WAVE file has no fmt or data chunk')
+    return wave_format
+
+
+def probe_wave(fileobj: BinaryIO, size: int, audio_start: int) -> Tuple[float, str]:
+    wave_format = read_wave_format(fileobj, size)
+    return wave_format.frame_count / wave_format.sample_rate, 'wave'
+
+
+register_probe('wave', ['.wav', '.wave'], lambda head: head[:4] == b'RIFF' and head[8:12] == b'WAVE', probe_wave)
+register_probe('flac', ['.flac'], lambda head: head[:4] == b'fLaC', probe_flac)
+register_probe('ogg', ['.ogg', '.oga', '.opus'], lambda head: head[:4] == b'OggS', probe_ogg)
+register_probe('mp4', ['.mp4', '.m4a', '.m4b'], sniff_mp4, probe_mp4)
+register_probe('mpeg', ['.mp3', '.mp2', '.mpga'], sniff_mpeg, probe_mpeg)  # last: the weakest sniff
+
+
+def select_probe(fname: str, head: bytes) -> Optional[Probe]:
+    for probe in PROBES:
+        if probe.sniff(head):
+            return probe
+    suffix = os.path.splitext(fname)[1].lower()
+    for probe in PROBES:
+        if suffix in probe.suffixes:
+            return probe
+    return None
+
+
+def probe_duration(fname: str) -> Tuple[float, str]:
+    # (duration in seconds, method that produced it); raises ProbeError or OSError on failure
+    with open(fname, 'rb') as fileobj:
+        size = os.fstat(fileobj.fileno()).st_size
+        head = fileobj.read(HEAD_SIZE)
+        audio_start = 0
+        if head[:3] == b'ID3':  # ID3v2 in front of MP3 (and sometimes FLAC)
+            audio_start = id3v2_size(head)
+            head = read_at(fileobj, audio_start, HEAD_SIZE)
+        probe = select_probe(fname, head)
+        if probe is None:
+            raise ProbeError('unrecognised audio format')
+        return probe.probe(fileobj, size, audio_start)
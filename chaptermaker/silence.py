@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# silence analysis of WAVE/PCM audio with numpy: the file is memory mapped and walked in fixed-size
+# blocks, so memory stays bounded however long the book is; only the RMS envelope (one value per
+# window) is kept for the whole file
+
+import mmap
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from . import probes
+from .timeline import CueTrack, FRAMES_PER_SECOND, frames_from_seconds
+
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+DEFAULT_WINDOW_MS = 50
+DEFAULT_BLOCK_SECONDS = 60
+SILENCE_FLOOR_DB = -120.0
+
+
+class PCMSource:
+    # a memory-mapped WAVE file; samples are exposed as numpy views straight onto the mapping
+    def __init__(self, fname: str):
+        self.fname = fname
+        self._file = open(fname, 'rb')
+        try:
+            size = self._file.seek(0, 2)
+            self.format = probes.read_wave_format(self._file, size)
+            if self.format.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                raise probes.ProbeError(f'unsupported WAVE encoding {self.format.format_tag:#x}')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        if hasattr(self._map, 'madvise'):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        self.sample_rate = self.format.sample_rate
+        self.channels = self.format.channels
+        self.sample_width = self.format.block_align // self.channels
+        self.frame_count = self.format.frame_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.sample_rate
+
+    def read(self, first_frame: int, frame_count: int) -> np.ndarray:
+        # mono float32 samples in [-1, 1] for frames [first_frame, first_frame + frame_count)
+        first_frame = max(0, first_frame)
+        frame_count = max(0, min(frame_count, self.frame_count - first_frame))
+        offset = self.format.data_offset + first_frame * self.format.block_align
+        width = self.sample_width
+        count = frame_count * self.channels
+        if width == 3:  # 24-bit: widen each sample to int32 by hand
+            raw = np.frombuffer(self._map, dtype=np.uint8, count=count * 3, offset=offset).reshape(-1, 3)
+            samples = (raw[:, 0].astype(np.int32) | raw[:, 1].astype(np.int32) << 8 | raw[:, 2].astype(np.int8).astype(np.int32) << 16)
+            scale = float(1 << 23)
+        elif self.format.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            samples = np.frombuffer(self._map, dtype='<f4' if width == 4 else '<f8', count=count, offset=offset)
+            scale = 1.0
+        elif width == 1:  # 8-bit WAVE is unsigned
+            samples = np.frombuffer(self._map, dtype=np.uint8, count=count, offset=offset).astype(np.int16) - 128
+            scale = 128.0
+        else:
+            samples = np.frombuffer(self._map, dtype={2: '<i2', 4: '<i4'}[width], count=count, offset=offset)
+            scale = float(1 << (8 * width - 1))
+        samples = samples.astype(np.float32) / scale
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        return samples
+
+    def release(self, first_frame: int, frame_count: int):
+        # drop pages we have finished with, so resident memory doesn't grow with the file
+        if not hasattr(self._map, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        start = self.format.data_offset + first_frame * self.format.block_align
+        end = start + frame_count * self.format.block_align
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            self._map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def rms_db(samples: np.ndarray, window: int) -> np.ndarray:
+    # RMS level in dBFS of each complete window of samples
+    windows = len(samples) // window
+    if windows == 0:
+        return np.empty(0, dtype=np.float32)
+    blocks = samples[:windows * window].reshape(windows, window)
+    power = np.einsum('ij,ij->i', blocks, blocks) / window
+    with np.errstate(divide='ignore'):
+        levels = 10.0 * np.log10(power)
+    return np.maximum(levels, SILENCE_FLOOR_DB).astype(np.float32)
+
+
+def window_samples(source: PCMSource, window_ms: int) -> int:
+    return max(1, source.sample_rate * window_ms // 1000)
+
+
+def iter_envelope(source: PCMSource, window_ms: int = DEFAULT_WINDOW_MS,
+                  block_seconds: int = DEFAULT_BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    # yields the RMS envelope one block at a time; blocks are a whole number of windows
+    window = window_samples(source, window_ms)
+    block = max(1, source.sample_rate * block_seconds // window) * window
+    for first in range(0, source.frame_count, block):
+        yield rms_db(source.read(first, block), window)
+        source.release(first, block)
+
+
+def envelope(source: PCMSource, window_ms: int = DEFAULT_WINDOW_MS,
+             block_seconds: int = DEFAULT_BLOCK_SECONDS) -> np.ndarray:
+    parts = list(iter_envelope(source, window_ms, block_seconds))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+
+def find_silences(levels: np.ndarray, window_s: float, threshold_db: float,
+                  min_silence_s: float) -> List[Tuple[float, float]]:
+    # (start, end) in seconds of every run of windows quieter than threshold_db lasting min_silence_s
+    quiet = np.concatenate(([False], levels < threshold_db, [False]))
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    min_windows = max(1, int(round(min_silence_s / window_s)))
+    keep = (ends - starts) >= min_windows
+    return [(start * window_s, end * window_s) for start, end in zip(starts[keep], ends[keep])]
+
+
+def silences_to_tracks(silences: List[Tuple[float, float]], duration: float, min_chapter_s: float,
+                       title_format: str = "Chapter {}", window_s: float = 0.0) -> List[CueTrack]:
+    # a chapter starts at time zero and at the middle of each long silence, skipping breaks that
+    # would make a chapter shorter than min_chapter_s
+    starts = [0.0]
+    for silence_start, silence_end in silences:
+        if silence_start <= 0.0 or silence_end >= duration - window_s:  # leading/trailing silence isn't a break
+            continue
+        middle = (silence_start + silence_end) / 2
+        if middle - starts[-1] >= min_chapter_s and duration - middle >= min_chapter_s:
+            starts.append(middle)
+    tracks = []
+    total = frames_from_seconds(duration)
+    for order, start in enumerate(starts, 1):
+        tracks.append(CueTrack(order, title_format.format(order), frames_from_seconds(start), color="cyan"))
+    for track, following in zip(tracks, tracks[1:]):
+        track.duration = following.start - track.start
+    if tracks:
+        tracks[-1].duration = total - tracks[-1].start
+    return tracks
+
+
+def detect_chapters(source: PCMSource, threshold_db: float, min_silence_s: float, min_chapter_s: float,
+                    window_ms: int = DEFAULT_WINDOW_MS, block_seconds: int = DEFAULT_BLOCK_SECONDS,
+                    title_format: str = "Chapter {}") -> List[CueTrack]:
+    window_s = window_samples(source, window_ms) / source.sample_rate
+    levels = envelope(source, window_ms, block_seconds)
+    silences = find_silences(levels, window_s, threshold_db, min_silence_s)
+    return silences_to_tracks(silences, source.duration, min_chapter_s, title_format, window_s)
+
+
+DEFAULT_SEARCH_S = 2.0
+DEFAULT_SNAP_WINDOW_MS = 10
+QUIET_TOLERANCE_DB = 1.0
+
+
+def quietest_frame(source: PCMSource, around: int, before: int, after: int,
+                   window_ms: int = DEFAULT_SNAP_WINDOW_MS) -> int:
+    # audio frame at the middle of the quietest window in [around - before, around + after); where
+    # several windows are about as quiet (a stretch of digital silence), take the one nearest around,
+    # or around itself when its own window is one of them, so a start already in silence stays put
+    window = window_samples(source, window_ms)
+    first = max(0, around - before)
+    levels = rms_db(source.read(first, around + after - first), window)
+    if len(levels) == 0:
+        return around
+    candidates = np.flatnonzero(levels <= levels.min() + QUIET_TOLERANCE_DB)
+    middles = first + candidates * window + window // 2
+    nearest = int(middles[np.argmin(np.abs(middles - around))])
+    return around if abs(nearest - around) <= window // 2 else nearest
+
+
+def snap_to_silence(source: PCMSource, tracks: List[CueTrack], search_s: float = DEFAULT_SEARCH_S,
+                    window_ms: int = DEFAULT_SNAP_WINDOW_MS) -> int:
+    # moves each track start (except one at time zero) to the quietest point within search_s of it,
+    # reading only those windows of the file; starts never cross their neighbours.
+    # returns how many tracks moved
+    rate = source.sample_rate
+    search = int(search_s * rate)
+    moved = 0
+    previous = 0
+    for number, track in enumerate(tracks):
+        following = tracks[number + 1].start * rate // FRAMES_PER_SECOND if number + 1 < len(tracks) else source.frame_count
+        around = track.start * rate // FRAMES_PER_SECOND
+        if track.start == 0 or around >= source.frame_count:
+            previous = around
+            continue
+        before = min(search, around - previous - 1)
+        after = min(search, following - around - 1)
+        if before <= 0 and after <= 0:
+            previous = around
+            continue
+        snapped = quietest_frame(source, around, max(0, before), max(0, after), window_ms)
+        start = track.start if snapped == around else snapped * FRAMES_PER_SECOND // rate
+        if start != track.start:
+            track.start = start
+            moved += 1
+        previous = snapped
+    return moved
@@ -0,0 +1,55 @@
+# find chapter breaks at long silences in a WAVE file and write them as a CUE sheet
+
+import argparse
+import os
+import sys
+from . import cuetools
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+from .probes import ProbeError
+from .timeline import CueHeader
+
+def load_silence():
+    # numpy is slow to import, so it is only loaded once the arguments have been parsed
+    try:
+        from . import silence
+    except ImportError as ex:
+        print(f"Silence detection needs numpy ({ex})")
+        sys.exit(1)
+    return silence
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create a CUE sheet with a chapter at every long silence in a WAVE file')
+    parser.add_argument('input_file', type=str, help='WAVE (PCM) audio file')
+    parser.add_argument('output_file', type=str, help='Name of the output CUE file, or - for stdout')
+    parser.add_argument('-t', '--threshold', type=float, default=-45.0, help='Level in dBFS below which audio counts as silence')
+    parser.add_argument('-s', '--min-silence', type=float, default=2.0, help='Shortest silence (seconds) that can separate chapters')
+    parser.add_argument('-m', '--min-chapter', type=float, default=60.0, help='Shortest chapter (seconds)')
+    parser.add_argument('-w', '--window', type=int, default=50, help='RMS window in millisecs')
+    parser.add_argument('--title', type=str, default=None, help='Book title for the CUE header')
+    parser.add_argument('--performer', type=str, default="", help='Performer for the CUE header')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    silence = load_silence()
+
+    with metrics_from_args(args) as metrics:
+        try:
+            with metrics.stage("scan audio"), silence.PCMSource(args.input_file) as source:
+                tracks = silence.detect_chapters(source, args.threshold, args.min_silence, args.min_chapter, args.window)
+                duration = source.duration
+        except (OSError, ProbeError) as ex:
+            print(f"Could not read {args.input_file}: {ex}")
+            sys.exit(1)
+        metrics.count("chapters", len(tracks))
+        name = os.path.basename(args.input_file)
+        header = CueHeader(title=args.title or os.path.splitext(name)[0], file=name, out_format="WAVE",
+                           performer=args.performer)
+        with metrics.stage("write cue"):
+            cuetools.save_cue(args.output_file, header, tracks)
+    if args.output_file != "-":
+        print(f"{len(tracks)} chapters found in {duration:.0f}s of audio")
+
+
+if __name__ == '__main__':
+    main()
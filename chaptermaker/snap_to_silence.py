@@ -0,0 +1,53 @@
+# move the chapter starts in a CUE sheet to the nearest silence in the audio
+
+import argparse
+import sys
+from . import cuetools
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+from .probes import ProbeError
+
+def load_silence():
+    # numpy is slow to import, so it is only loaded once the arguments have been parsed
+    try:
+        from . import silence
+    except ImportError as ex:
+        print(f"Silence detection needs numpy ({ex})")
+        sys.exit(1)
+    return silence
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move each chapter start in a CUE sheet to the quietest point nearby')
+    parser.add_argument('-c', '--cuefile', type=str, required=True, help='CUE sheet to adjust')
+    parser.add_argument('-a', '--audio', type=str, help='WAVE (PCM) audio; defaults to the FILE named in the CUE sheet')
+    parser.add_argument('-o', '--output', type=str, default='-', help='Output CUE file, or - for stdout')
+    parser.add_argument('-s', '--search', type=float, default=2.0, help='How far (seconds) either side of each start to look')
+    parser.add_argument('-w', '--window', type=int, default=10, help='RMS window in millisecs')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    silence = load_silence()
+
+    with metrics_from_args(args) as metrics:
+        with metrics.stage("parse cue"):
+            header, tracks = cuetools.process_cuefile(args.cuefile, metrics=metrics)
+        if not tracks:
+            sys.exit(1)
+        audio = args.audio or header.audiofile
+        try:
+            with metrics.stage("snap"), silence.PCMSource(audio) as source:
+                moved = silence.snap_to_silence(source, tracks, args.search, args.window)
+                total = int(source.duration * cuetools.FRAMES_PER_SECOND)
+        except (OSError, ProbeError) as ex:
+            print(f"Could not read {audio}: {ex}")
+            sys.exit(1)
+        cuetools.determine_durations(tracks, total)
+        metrics.count("chapters moved", moved)
+        with metrics.stage("write cue"):
+            cuetools.save_cue(args.output, header, tracks)
+    if args.output != '-':
+        print(f"{moved} of {len(tracks)} chapter starts moved")
+
+
+if __name__ == '__main__':
+    main()
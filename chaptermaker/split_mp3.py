@@ -0,0 +1,82 @@
+# cut a chaptered MP3 into one file per chapter, without re-encoding
+
+import argparse
+import os
+import sys
+from . import cuetools
+from . import mp3join
+from . import mp3split
+from .id3chapters import add_book_frames, save_tags
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+from .probes import ProbeError
+
+SPLIT_TAG_PADDING = 4 * 1024  # per-chapter files rarely get retagged, so keep their padding small
+
+
+def read_source_tags(input_file: str):
+    from mutagen.id3 import ID3, ID3NoHeaderError
+    try:
+        return ID3(input_file)
+    except ID3NoHeaderError:
+        return ID3()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split a chaptered MP3 into one MP3 per chapter by copying frames')
+    parser.add_argument('-i', '--input', required=True, help='Input .MP3 file')
+    parser.add_argument('-c', '--chapterfile', required=False, help='Chapters in a .CUE file (default: the CHAP frames in the MP3)')
+    parser.add_argument('-o', '--output', required=True, help='Directory for the chapter files')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), required=False,
+                        help='Number of chapter files written in parallel')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics_from_args(args) as metrics:
+        try:
+            with metrics.stage("load tags"):
+                source_tags = read_source_tags(args.input)
+            title = str(source_tags.get('TALB') or source_tags.get('TIT2') or '')
+            author = str(source_tags.get('TPE1') or '')
+            if args.chapterfile:
+                with metrics.stage("parse cue"):
+                    header, tracks = cuetools.process_cuefile(args.chapterfile, metrics=metrics)
+                chapters = mp3split.chapters_from_tracks(tracks)
+                title = title or header.title
+                author = author or header.performer
+            else:
+                chapters = mp3split.chapters_from_tags(source_tags)
+            if not chapters:
+                print("No chapters found for " + args.input)
+                sys.exit(1)
+            covers = source_tags.getall('APIC')
+
+            with metrics.stage("scan frames"):
+                source = mp3join.scan_part(args.input)
+            width = max(2, len(str(len(chapters))))
+            os.makedirs(args.output, exist_ok=True)
+            outputs = [os.path.join(args.output, mp3split.file_name(chapter, width)) for chapter in chapters]
+
+            def write_tags(path, chapter):
+                from mutagen.id3 import ID3, TIT2, TRCK
+                tags = ID3()
+                add_book_frames(tags, title, author)
+                tags["TIT2"] = TIT2(text=[chapter.title])
+                tags["TRCK"] = TRCK(text=[f'{chapter.order}/{len(chapters)}'])
+                for cover in covers:
+                    tags.add(cover)
+                save_tags(tags, path, SPLIT_TAG_PADDING)
+
+            with metrics.stage("write chapters"):
+                methods = mp3split.split(source, chapters, outputs, write_tags, args.workers)
+        except (OSError, ProbeError, ValueError) as ex:
+            print(ex)
+            sys.exit(1)
+        metrics.count("chapter files", len(outputs))
+
+    for chapter, output in zip(chapters, outputs):
+        print(f"{cuetools.format_frames(chapter.start_ms * cuetools.FRAMES_PER_SECOND // 1000)}  {output}")
+    print(f"Wrote {len(outputs)} chapter files to {args.output} using {methods[0]}")
+
+
+if __name__ == '__main__':
+    main()
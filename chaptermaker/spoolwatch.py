@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# watching a spool directory for books to tag. a watcher only says "something changed, look again":
+# inotify on Linux, otherwise a timed poll. files are trusted once their size and mtime have stayed
+# the same for a settle period, so half-copied uploads are never picked up
+
+import collections
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 2.0
+THROUGHPUT_WINDOW = 300.0  # seconds of history behind the books-per-minute figure
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+COMPANION_SUFFIXES = ['.jpg', '.jpeg', '.png', '.json']  # moved along with the book if present
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    name = "polling"
+
+    def __init__(self, directory: str, interval: float = DEFAULT_POLL_SECONDS):
+        self.directory = directory
+        self.interval = interval
+
+    def wait(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        return set()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    name = "inotify"
+
+    def __init__(self, directory: str):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'inotify_add_watch failed for ' + directory)
+
+    def wait(self, timeout: float) -> Set[str]:
+        # names touched since the last call, waiting up to timeout for the first one
+        names = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + INOTIFY_EVENT.size <= len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+                pos += INOTIFY_EVENT.size
+                names.add(os.fsdecode(data[pos:pos + length].rstrip(b'\0')))
+                pos += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(directory: str, poll_interval: float = DEFAULT_POLL_SECONDS, polling: bool = False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as ex:
+            print(f'inotify unavailable ({ex}), polling every {poll_interval}s instead')
+    return PollingWatcher(directory, poll_interval)
+
+
+class SpoolStats:
+    # the counters a running service reports: what is waiting, what is being worked on, what finished
+    def __init__(self):
+        self.started = time.time()
+        self.settling = 0
+        self.in_progress = 0
+        self.done = 0
+        self.failed = 0
+        self.last_error = ""
+        self.finished = collections.deque()  # completion times within THROUGHPUT_WINDOW
+
+    def record(self, ok: bool, message: str = ""):
+        now = time.time()
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+            self.last_error = message
+        self.finished.append(now)
+        while self.finished and self.finished[0] < now - THROUGHPUT_WINDOW:
+            self.finished.popleft()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.settling + self.in_progress
+
+    def per_minute(self) -> float:
+        now = time.time()
+        while self.finished and self.finished[0] < now - THROUGHPUT_WINDOW:
+            self.finished.popleft()
+        window = min(THROUGHPUT_WINDOW, now - self.started) or 1.0
+        return len(self.finished) * 60.0 / window
+
+    def to_dict(self) -> dict:
+        return {'uptime_s': round(time.time() - self.started, 1), 'queue_depth': self.queue_depth,
+                'settling': self.settling, 'in_progress': self.in_progress, 'done': self.done,
+                'failed': self.failed, 'books_per_minute': round(self.per_minute(), 2),
+                'last_error': self.last_error}
+
+    def summary(self) -> str:
+        return (f'queue {self.queue_depth} ({self.settling} settling, {self.in_progress} in progress), '
+                f'{self.done} done, {self.failed} failed, {self.per_minute():.1f}/min')
+
+    def write(self, path: str):
+        # written to a temporary file and renamed, so a monitor never reads half a status
+        import tempfile  # only the service writes a status file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_name = tempfile.mkstemp(prefix=".status-", suffix=".tmp", dir=directory)
+        with open(fd, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_name, path)
+
+
+class Spool:
+    # finds book.mp3 + book.cue pairs (with any book.jpg/.png/.json) whose files have all settled
+    def __init__(self, directory: str, settle: float = DEFAULT_SETTLE_SECONDS):
+        self.directory = directory
+        self.settle = settle
+        self.seen: Dict[str, Tuple[Tuple[int, int], float]] = {}  # name -> (size, mtime_ns), unchanged since
+        self.claimed: Set[str] = set()  # stems handed to a worker and not yet moved away
+
+    def _settled(self, name: str, now: float) -> bool:
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            self.seen.pop(name, None)
+            return False
+        signature = stat.st_size, stat.st_mtime_ns
+        previous = self.seen.get(name)
+        if previous is None or previous[0] != signature:
+            self.seen[name] = signature, now
+            return False
+        return stat.st_size > 0 and now - previous[1] >= self.settle
+
+    def touched(self, names: Set[str]):
+        # a watcher saw these change: restart their settle period even if size and mtime match
+        for name in names:
+            self.seen.pop(name, None)
+
+    def scan(self, now: float = None) -> Tuple[List[Tuple[str, str, Optional[str]]], int]:
+        # (jobs ready to run, number of books still settling)
+        now = now or time.time()
+        names = set(os.listdir(self.directory))
+        ready = []
+        settling = 0
+        for name in sorted(names):
+            stem, suffix = os.path.splitext(name)
+            if suffix != '.mp3' or name.startswith('.') or stem in self.claimed:
+                continue
+            cue = stem + '.cue'
+            if cue not in names:
+                settling += 1
+                continue
+            companions = [stem + extra for extra in COMPANION_SUFFIXES if stem + extra in names]
+            if not all([self._settled(part, now) for part in [name, cue] + companions]):
+                settling += 1
+                continue
+            pictures = [part for part in companions if not part.endswith('.json')]
+            picture = os.path.join(self.directory, pictures[0]) if pictures else None
+            ready.append((os.path.join(self.directory, name), os.path.join(self.directory, cue), picture))
+        self.seen = {name: entry for name, entry in self.seen.items() if name in names}
+        return ready, settling
+
+    def claim(self, job):
+        self.claimed.add(os.path.splitext(os.path.basename(job[0]))[0])
+
+    def finish(self, job, ok: bool, message: str = ""):
+        # moves the book and its companions to done/ or failed/ (with the reason alongside)
+        stem = os.path.splitext(os.path.basename(job[0]))[0]
+        target = os.path.join(self.directory, DONE_DIR if ok else FAILED_DIR)
+        os.makedirs(target, exist_ok=True)
+        for suffix in ['.mp3', '.cue'] + COMPANION_SUFFIXES:
+            source = os.path.join(self.directory, stem + suffix)
+            if os.path.exists(source):
+                os.replace(source, os.path.join(target, stem + suffix))
+                self.seen.pop(stem + suffix, None)
+        if not ok:
+            with open(os.path.join(target, stem + '.error.txt'), 'w', encoding='utf-8') as f:
+                f.write(message + '\n')
+        self.claimed.discard(stem)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# chapters from SubRip (.srt) and WebVTT (.vtt) files. cues are streamed one block at a time and
+# the filtering and coalescing rules are applied as they go past, so a transcript with hundreds of
+# thousands of cues costs no more memory than the chapters that survive
+
+import os
+import re
+from typing import Iterable, Iterator, Tuple
+
+from . import cuetools
+from .metrics import NO_METRICS
+from .timeline import CueHeader, CueTrack, FRAMES_PER_SECOND, frames_from_ms
+
+
+SUBTITLE_SUFFIXES = ['.srt', '.vtt']
+# [hh:]mm:ss,mmm in SRT, [hh:]mm:ss.mmm in WebVTT; anything after the end time is VTT cue settings
+TIMING_PATTERN = re.compile(r'\s*(?:(\d+):)?(\d+):(\d+)[,.](\d+)\s*-->\s*(?:(\d+):)?(\d+):(\d+)[,.](\d+)')
+MARKUP_PATTERN = re.compile(r'<[^>]*>|\{\\[^}]*\}')  # <i>, <v Speaker>, <00:01.000>, {\an8}
+ENTITIES = {'&amp;': '&', '&lt;': '<', '&gt;': '>', '&nbsp;': ' ', '&lrm;': '', '&rlm;': ''}
+
+
+class SubtitleCue:
+    __slots__ = ('start_ms', 'end_ms', 'text')
+
+    def __init__(self, start_ms: int, end_ms: int, text: str):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+
+
+class SubtitleRules:
+    # which cues become chapters. pattern is a regex searched in each cue's text; if it has a
+    # group named title, that group is the chapter title. a cue starting less than min_chapter_s
+    # after the previous chapter, or (with merge_repeats) carrying the same title, is folded into it
+    def __init__(self, pattern: str = None, min_chapter_s: float = 0.0, merge_repeats: bool = True):
+        self.pattern = re.compile(pattern) if pattern else None
+        self.min_chapter_ms = int(min_chapter_s * 1000)
+        self.merge_repeats = merge_repeats
+
+
+ALL_CUES = SubtitleRules()
+
+
+def _ms(hours, minutes, seconds, fraction) -> int:
+    # the fraction is milliseconds, but some writers emit fewer or more than three digits
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int((fraction + '00')[:3])
+
+
+def clean_text(lines: Iterable[str]) -> str:
+    text = ' '.join(line.strip() for line in lines)
+    text = MARKUP_PATTERN.sub('', text)
+    if '&' in text:
+        for entity, value in ENTITIES.items():
+            text = text.replace(entity, value)
+    return ' '.join(text.split())
+
+
+def read_cues(fileobject: Iterable[str]) -> Iterator[SubtitleCue]:
+    # one pass over the lines of an SRT or WebVTT file. a cue is a timing line followed by text up
+    # to a blank line; lines before the timing line (SRT counters, VTT identifiers) are ignored, and
+    # blocks with no timing line (the WEBVTT header, NOTE, STYLE, REGION) are skipped whole
+    timing = None
+    text = []
+    for line in fileobject:
+        if not line.strip():
+            if timing is not None:
+                yield SubtitleCue(timing[0], timing[1], clean_text(text))
+                timing = None
+                text.clear()
+            continue
+        if timing is None:
+            match = TIMING_PATTERN.match(line) if '-->' in line else None
+            if match:
+                fields = match.groups()
+                timing = _ms(*fields[:4]), _ms(*fields[4:])
+        else:
+            text.append(line)
+    if timing is not None:
+        yield SubtitleCue(timing[0], timing[1], clean_text(text))
+
+
+def select_chapters(cues: Iterable[SubtitleCue], rules: SubtitleRules = ALL_CUES) -> Iterator[Tuple[int, str]]:
+    # yields (start_ms, title) for each cue that opens a chapter; the previous chapter is only held
+    # until the next one is known, so nothing else is kept
+    last_start = None
+    last_title = None
+    for cue in cues:
+        title = cue.text
+        if rules.pattern is not None:
+            match = rules.pattern.search(title)
+            if not match:
+                continue
+            if 'title' in rules.pattern.groupindex and match.group('title'):
+                title = match.group('title').strip()
+        if not title:
+            continue
+        if last_start is not None:
+            if cue.start_ms - last_start < rules.min_chapter_ms:
+                continue
+            if rules.merge_repeats and title == last_title:
+                continue
+        last_start = cue.start_ms
+        last_title = title
+        yield cue.start_ms, title
+
+
+def read_tracks(fileobject: Iterable[str], rules: SubtitleRules = ALL_CUES) -> Iterator[CueTrack]:
+    order = 0
+    for start_ms, title in select_chapters(read_cues(fileobject), rules):
+        order += 1
+        track = CueTrack()
+        track.order = order
+        track.title = title
+        track.start = frames_from_ms(start_ms)
+        yield track
+
+
+def is_subtitle_file(filename) -> bool:
+    return os.path.splitext(str(filename))[1].lower() in SUBTITLE_SUFFIXES
+
+
+def process_subtitle_file(filename: str, audiofile: str = None, rules: SubtitleRules = ALL_CUES,
+                          cache=None, metrics=NO_METRICS) -> Tuple[CueHeader, list]:
+    # the same (header, tracks) as cuetools.process_cuefile. subtitles don't name their audio, so the
+    # duration is probed from audiofile; the header's title and performer are left empty
+    header = CueHeader()
+    header.cuefile = filename
+    header.duration_in_frames = 0
+    if audiofile:
+        header.file = os.path.basename(str(audiofile))
+        header.audiofile = str(audiofile)
+        header.out_format = 'MP3'
+        if cuetools.file_is_ok(header.audiofile):
+            with metrics.stage("probe duration"):
+                duration, method = cuetools.get_duration_and_method(header.audiofile, cache)
+            metrics.count("files probed")
+            if duration > 0.0:
+                header.duration_in_frames = int(FRAMES_PER_SECOND * duration)
+                header.duration_method = method
+    # utf-8-sig drops the byte order mark many subtitle editors write
+    with open(filename, 'r', encoding='utf-8-sig', errors='replace') as fileobject:
+        tracks = list(cuetools.with_durations(read_tracks(fileobject, rules), header.duration_in_frames))
+    return header, tracks
@@ -0,0 +1,167 @@
+import os
+import re
+import sys
+import argparse
+from array import array
+from itertools import accumulate
+from typing import Iterable, List, Tuple
+from . import cuetools
+from .metrics import add_arguments as add_metrics_arguments, metrics_from_args
+from .timeline import CueHeader, TrackTable, frames_from_ms
+
+
+# durations are '1h22m33s' (any of the parts), or '1:22:33' / '22:33' with any of :,.- between fields
+CLOCK_PATTERN = re.compile(r"(?:(\d+)[:,.-])?(\d+)[:,.-](\d+)")
+UNITS_PATTERN = re.compile(r"(?=\d)(?:(\d+)h)?\s*(?:(\d+)m)?\s*(?:(\d+)s)?")
+END_FUDGE_MS = 30 * 1000  # END marker is placed this far before the end, so we're not right at the end of audio
+
+
+def make_header() -> CueHeader:
+    return CueHeader(title="Time Calculator Output", out_format="WAVE", performer="No performer")
+
+
+def parse_duration(text: str) -> int:
+    # milliseconds in a duration; ValueError if it isn't one of the forms above
+    match = CLOCK_PATTERN.fullmatch(text) or UNITS_PATTERN.fullmatch(text)
+    if not match:
+        raise ValueError(f"bad duration {text!r}")
+    hours, minutes, seconds = (int(field) if field else 0 for field in match.groups())
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+
+def read_list(lines: Iterable[str]) -> Tuple[List[str], array, List[str]]:
+    # one pass over 'Title|duration' lines: titles, durations as an int64 millisecond array, and an
+    # error message (with its line number) for every line that isn't valid. blank lines are skipped
+    titles = []
+    durations = array('q')
+    errors = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        title, bar, duration = line.rstrip("\r\n").rpartition("|")
+        if not bar:
+            errors.append(f"line {number}: expected 'Title|duration', got {line.strip()!r}")
+            continue
+        try:
+            durations.append(parse_duration(duration.strip()))
+        except ValueError as ex:
+            errors.append(f"line {number}: {ex}")
+            continue
+        titles.append(title)
+    return titles, durations, errors
+
+
+def make_tracks(titles: List[str], durations: array, start_ms: int = 0, padding_ms: int = 0) -> TrackTable:
+    # each chapter starts where the previous ones (plus padding) end: one running sum over the
+    # durations gives every start, and the final sum places the END marker
+    stride = durations if not padding_ms else array('q', (duration + padding_ms for duration in durations))
+    starts = array('q', accumulate(stride, initial=start_ms))
+    starts[-1] = max(start_ms, starts[-1] - padding_ms - END_FUDGE_MS)
+    return TrackTable.from_columns(titles + ["END"], array('q', map(frames_from_ms, starts)), color="cyan")
+
+
+def output_for(source: str, output: str, bulk: bool) -> str:
+    # a single list goes to -o (stdout by default); several lists each get list.cue, next to the
+    # list or in the -o directory. stdin always goes to stdout
+    if not bulk:
+        return output or "-"
+    if source == "-":
+        return "-"
+    name = os.path.splitext(os.path.basename(source))[0] + ".cue"
+    return os.path.join(output if output and output != "-" else os.path.dirname(source), name)
+
+
+def process_list(source: str, output: str, start_ms: int, padding_ms: int, metrics) -> List[str]:
+    # writes one CUE for one list; returns the list's errors, in which case nothing is written
+    with metrics.stage("read list"):
+        if source == "-":
+            titles, durations, errors = read_list(sys.stdin)
+        else:
+            with open(source, "r", encoding="utf-8") as inputfile:
+                titles, durations, errors = read_list(inputfile)
+    if errors:
+        return errors
+    if not titles:
+        return ["no chapters"]
+    with metrics.stage("accumulate"):
+        tracks = make_tracks(titles, durations, start_ms, padding_ms)
+    metrics.count("chapters", len(tracks))
+    with metrics.stage("write cue"):
+        cuetools.save_cue(output, make_header(), tracks)
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process input parameters.")
+
+    # list files: -f once or more, or as plain arguments; - reads stdin
+    parser.add_argument(
+        "-f", "--filename", type=str, action="append", default=[],
+        help="Input file name with .txt extension (- for stdin); may be given more than once"
+    )
+    parser.add_argument("lists", nargs="*", help="More input files")
+
+    # Starting time parameter
+    parser.add_argument(
+        "-s",
+        "--start_time",
+        type=str,
+        help="Starting time of the first chapter (e.g., 02:30)",
+        required=False,
+    )
+
+    # Output file parameter
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="Output file name with .cue extension, or - for stdout (the default). "
+             "With several inputs, a directory for their .cue files (default: next to each input)",
+        required=False,
+    )
+
+    # padding time
+    parser.add_argument(
+        "-p",
+        "--padding",
+        type=int,
+        help="Additional time (in millisecs) between cues",
+        required=False,
+        default=0,
+    )
+
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    sources = args.filename + args.lists
+    if not sources:
+        parser.error("no input: give -f list.txt (or - for stdin)")
+    try:
+        start_ms = parse_duration(args.start_time) if args.start_time else 0
+    except ValueError as ex:
+        parser.error(f"--start_time: {ex}")
+    bulk = len(sources) > 1
+    if bulk and args.output and args.output != "-" and not os.path.isdir(args.output):
+        parser.error("with several inputs, -o must be a directory")
+
+    failed = 0
+    with metrics_from_args(args) as metrics:
+        for source in sources:
+            output = output_for(source, args.output, bulk)
+            try:
+                errors = process_list(source, output, start_ms, max(0, args.padding), metrics)
+            except (OSError, UnicodeDecodeError) as ex:
+                errors = [str(ex)]
+            for error in errors:
+                print(f"{source}: {error}", file=sys.stderr)
+            if errors:
+                failed += 1
+            elif bulk and output != "-":
+                print(f"{source} -> {output}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+# shared timeline model: every timestamp is a plain integer count of CUE frames (1/75th of a sec)
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+FRAMES_PER_SECOND = 75
+FRAMES_PER_MINUTE = 60 * FRAMES_PER_SECOND
+FRAMES_PER_HOUR = 60 * FRAMES_PER_MINUTE
+# REM COLOR markers that group tracks: a blue part holds red chapters, a red chapter holds green
+# sections. uncoloured tracks (and other colours) are never grouped under anything
+COLOR_LEVELS = {'blue': 0, 'red': 1, 'green': 2}
+
+
+def frames_from_msf(minutes: int, seconds: int, frames: int) -> int:
+    return minutes * FRAMES_PER_MINUTE + seconds * FRAMES_PER_SECOND + frames
+
+
+def frames_from_hms(hours: int, minutes: int, seconds: int) -> int:
+    return hours * FRAMES_PER_HOUR + minutes * FRAMES_PER_MINUTE + seconds * FRAMES_PER_SECOND
+
+
+def frames_from_seconds(seconds: float) -> int:
+    return int(seconds * FRAMES_PER_SECOND)
+
+
+def frames_from_ms(millisecs: int) -> int:
+    return millisecs * FRAMES_PER_SECOND // 1000
+
+
+def frames_to_ms(frames: int) -> int:
+    return frames * 1000 // FRAMES_PER_SECOND
+
+
+def frames_to_seconds(frames: int) -> int:  # note this truncates the frames
+    return frames // FRAMES_PER_SECOND
+
+
+def split_msf(frames: int) -> Tuple[int, int, int]:
+    # CUE style: minutes are not wrapped into hours
+    minutes, remainder = divmod(frames, FRAMES_PER_MINUTE)
+    seconds, frames = divmod(remainder, FRAMES_PER_SECOND)
+    return minutes, seconds, frames
+
+
+def split_hms(frames: int) -> Tuple[int, int, int]:
+    # whole hours, minutes and seconds; the frames are truncated
+    hours, remainder = divmod(frames, FRAMES_PER_HOUR)
+    minutes, remainder = divmod(remainder, FRAMES_PER_MINUTE)
+    return hours, minutes, remainder // FRAMES_PER_SECOND
+
+
+class CueHeader:
+    def __init__(self, title: str = "", file: str = "", out_format: str = "", performer: str = ""):
+        self.title = title
+        self.file = file
+        self.out_format = out_format
+        self.performer = performer
+        self.duration_in_frames = 0
+        self.duration_method = ""  # which probe read duration_in_frames from the audio file, if any
+        self.cuefile = ""
+        self.audiofile = ""
+
+
+class CueTrack:
+    __slots__ = ('order', 'title', 'start', 'duration', 'offset', 'color')
+
+    def __init__(self, order: int = 0, title: str = "", start: int = 0, duration: int = 0,
+                 offset: str = "", color: str = ""):
+        self.order = order
+        self.title = title
+        self.start = start  # frames
+        self.duration = duration  # frames
+        self.offset = offset
+        self.color = color
+
+    @property
+    def end(self) -> int:
+        return self.start + self.duration
+
+    def __repr__(self) -> str:
+        return f'CueTrack({self.order}, {self.title!r}, start={self.start}, duration={self.duration})'
+
+
+class TrackTable:
+    # column-oriented track list: starts and durations are packed int64 arrays, so a large sheet costs
+    # a few bytes per track and the columns can be handed to numpy without copying (numpy.frombuffer)
+    __slots__ = ('titles', 'starts', 'durations', 'offsets', 'colors')
+
+    def __init__(self, tracks: Iterable[CueTrack] = ()):
+        self.titles = []
+        self.starts = array('q')
+        self.durations = array('q')
+        self.offsets = []
+        self.colors = []
+        for track in tracks:
+            self.append(track)
+
+    @classmethod
+    def from_columns(cls, titles: List[str], starts: array, durations: array = None, color: str = "") -> 'TrackTable':
+        # a table built from whole columns at once; durations default to zero and every track gets color
+        if len(titles) != len(starts) or (durations is not None and len(durations) != len(starts)):
+            raise ValueError('TrackTable columns must all be the same length')
+        table = cls()
+        table.titles = list(titles)
+        table.starts = array('q', starts)
+        table.durations = array('q', durations) if durations is not None else array('q', [0]) * len(starts)
+        table.offsets = [""] * len(starts)
+        table.colors = [color] * len(starts)
+        return table
+
+    def append(self, track: CueTrack):
+        self.add(track.title, track.start, track.duration, track.offset, track.color)
+
+    def add(self, title: str, start: int, duration: int = 0, offset: str = "", color: str = ""):
+        self.titles.append(title)
+        self.starts.append(start)
+        self.durations.append(duration)
+        self.offsets.append(offset)
+        self.colors.append(color)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> CueTrack:
+        if i < 0:
+            i += len(self.starts)
+        return CueTrack(i + 1, self.titles[i], self.starts[i], self.durations[i], self.offsets[i], self.colors[i])
+
+    def __iter__(self) -> Iterator[CueTrack]:
+        for i in range(len(self.starts)):
+            yield CueTrack(i + 1, self.titles[i], self.starts[i], self.durations[i], self.offsets[i], self.colors[i])
+
+
+class ChapterIndex:
+    # sorted start-time index over a set of tracks; times are in frames like everything else here
+    __slots__ = ('tracks', 'starts', '_left')
+
+    def __init__(self, tracks: Iterable[CueTrack]):
+        self.tracks = sorted(tracks, key=lambda track: track.start)
+        self.starts = array('q', (track.start for track in self.tracks))
+        # _left[i] points at the nearest unconsumed position <= i (-1 for none); consumed positions are
+        # skipped with path compression, so take_before() costs amortised O(log n) rather than a rescan
+        self._left = list(range(len(self.tracks)))
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def position_at(self, time: int) -> int:
+        # position of the last track starting at or before time, -1 if time is before the first track
+        return bisect_right(self.starts, time) - 1
+
+    def at(self, time: int) -> Optional[CueTrack]:
+        # the chapter playing at time
+        i = self.position_at(time)
+        return self.tracks[i] if i >= 0 else None
+
+    def in_range(self, start: int, end: int) -> List[CueTrack]:
+        # chapters starting in [start, end)
+        return self.tracks[bisect_left(self.starts, start):bisect_left(self.starts, end)]
+
+    def at_many(self, times: Iterable[int]) -> List[Optional[CueTrack]]:
+        # chapter at each of a sorted sequence of times, found in one merge pass over the index
+        results = []
+        starts = self.starts
+        count = len(starts)
+        i = -1
+        last_time = None
+        for time in times:
+            if last_time is not None and time < last_time:
+                raise ValueError("at_many() needs the times in ascending order")
+            last_time = time
+            while i + 1 < count and starts[i + 1] <= time:
+                i += 1
+            results.append(self.tracks[i] if i >= 0 else None)
+        return results
+
+    def _find_unconsumed(self, i: int) -> int:
+        left = self._left
+        root = i
+        while root >= 0 and left[root] != root:
+            root = left[root]
+        while i >= 0 and left[i] != i:  # compress the path we just walked
+            left[i], i = root, left[i]
+        return root
+
+    def take_before(self, time: int) -> Optional[CueTrack]:
+        # latest chapter starting at or before time that hasn't been taken yet; marks it as taken
+        i = self._find_unconsumed(self.position_at(time))
+        if i < 0:
+            return None
+        self._left[i] = i - 1
+        return self.tracks[i]
+
+
+class ChapterNode:
+    # one track in the chapter tree. own_end is where the track gives way to the next one (its first
+    # child, if it has children); end is where the track and everything under it finishes
+    __slots__ = ('track', 'level', 'own_end', 'end', 'children')
+
+    def __init__(self, track: CueTrack, level: int):
+        self.track = track
+        self.level = level
+        self.own_end = track.end
+        self.end = track.end
+        self.children = []
+
+    def __repr__(self) -> str:
+        return f'ChapterNode({self.track.title!r}, level={self.level}, end={self.end}, children={len(self.children)})'
+
+
+def build_hierarchy(tracks: Iterable[CueTrack], total_end: int = None) -> List[ChapterNode]:
+    # one pass with a stack of open groups: each track closes the groups at its level or deeper, so
+    # a group's end is known the moment it closes and nothing is rescanned. returns the top-level
+    # nodes; total_end defaults to the end of the last track
+    roots = []
+    open_groups = []
+    previous = None
+    for track in tracks:
+        level = COLOR_LEVELS.get(track.color)
+        node = ChapterNode(track, 0 if level is None else level)
+        if previous is not None:
+            previous.own_end = track.start
+            if not previous.children:
+                previous.end = track.start
+        while open_groups and (level is None or open_groups[-1].level >= level):
+            open_groups.pop().end = track.start
+        (open_groups[-1].children if open_groups else roots).append(node)
+        if level is not None:
+            open_groups.append(node)
+        previous = node
+    if previous is not None:
+        if total_end is None:
+            total_end = previous.track.end
+        previous.own_end = previous.end = total_end
+        for group in open_groups:
+            group.end = total_end
+    return roots
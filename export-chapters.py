@@ -0,0 +1,7 @@
+# export the chapters of CUE sheets as ID3, ffmetadata, Podlove JSON, WebVTT and Nero chpl files
+# runs the installed tool from a checkout; see chaptermaker/export_chapters.py
+
+from chaptermaker.export_chapters import main
+
+if __name__ == '__main__':
+    main()
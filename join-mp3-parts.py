@@ -0,0 +1,7 @@
+# join a directory of MP3 parts into one chaptered audiobook, without re-encoding
+# runs the installed tool from a checkout; see chaptermaker/join_mp3_parts.py
+
+from chaptermaker.join_mp3_parts import main
+
+if __name__ == '__main__':
+    main()
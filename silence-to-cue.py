@@ -0,0 +1,7 @@
+# find chapter breaks at long silences in a WAVE file and write them as a CUE sheet
+# runs the installed tool from a checkout; see chaptermaker/silence_to_cue.py
+
+from chaptermaker.silence_to_cue import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+# move the chapter starts in a CUE sheet to the nearest silence in the audio
+# runs the installed tool from a checkout; see chaptermaker/snap_to_silence.py
+
+from chaptermaker.snap_to_silence import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+# cut a chaptered MP3 into one file per chapter, without re-encoding
+# runs the installed tool from a checkout; see chaptermaker/split_mp3.py
+
+from chaptermaker.split_mp3 import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+# tiny synthetic audio for the tests: MP3s are runs of silent MPEG-1 layer III frames, which
+# mutagen and the probes parse like any other stream
+import pytest
+
+from chaptermaker.probes import parse_mpeg_header
+
+FRAME_128K = b'\xff\xfb\x90\x44'  # 128 kbps, 44.1 kHz, joint stereo: 417 bytes
+FRAME_192K = b'\xff\xfb\xb0\x44'  # 192 kbps: 626 bytes
+SAMPLES_PER_FRAME = 1152
+SAMPLE_RATE = 44100
+
+
+def mp3_frames(count: int, headers=(FRAME_128K,)) -> bytes:
+    # count frames, cycling through headers (more than one makes a VBR stream)
+    return b''.join(header + bytes(parse_mpeg_header(header).size - 4)
+                    for header in (headers[i % len(headers)] for i in range(count)))
+
+
+@pytest.fixture
+def make_mp3(tmp_path):
+    def make(name: str, count: int, headers=(FRAME_128K,), prefix: bytes = b'', suffix: bytes = b''):
+        path = tmp_path / name
+        path.write_bytes(prefix + mp3_frames(count, headers) + suffix)
+        return str(path)
+    return make
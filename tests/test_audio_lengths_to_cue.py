@@ -0,0 +1,20 @@
+import io
+import sys
+
+from chaptermaker import audio_lengths_to_cue, cuetools
+from chaptermaker.timeline import TrackTable
+
+
+def test_stdout_holds_only_the_sheet(make_mp3, tmp_path, monkeypatch, capsys):
+    for name, count in [('p0.mp3', 100), ('p1.mp3', 200), ('p2.mp3', 50)]:
+        make_mp3(name, count)
+    monkeypatch.setattr(audio_lengths_to_cue, 'cue_tracks', TrackTable())
+    monkeypatch.setattr(sys, 'argv', ['audio-lengths-to-cue', str(tmp_path), '-', '--no-cache'])
+    audio_lengths_to_cue.main()
+
+    out, err = capsys.readouterr()
+    assert 'File: p0.mp3' in err and 'Probed 3 files' in err
+    header, tracks = cuetools.read_cue(io.StringIO(out))
+    assert header.title == 'GeneratedOutput'
+    assert [track.title for track in tracks] == ['XXXX1', 'XXXX2', 'XXXX3', 'XXXX4']
+    assert 'File:' not in out and 'Probed' not in out
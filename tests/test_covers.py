@@ -0,0 +1,12 @@
+from chaptermaker.covers import CoverCache
+
+
+def test_unwritable_cache_warns_on_stderr(tmp_path, capsys):
+    # stdout may be carrying a CUE sheet, so the warning must not land in it
+    blocker = tmp_path / 'file'
+    blocker.write_bytes(b'')
+    cache = CoverCache(str(blocker / 'covers'))
+    cache.put('key', b'\xff\xd8\xff')
+    assert cache.get('key') is None
+    out, err = capsys.readouterr()
+    assert out == '' and err.startswith('Cover cache not written: ')
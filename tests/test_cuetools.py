@@ -0,0 +1,40 @@
+import io
+
+from chaptermaker import cuetools
+from chaptermaker.timeline import CueHeader, CueTrack
+
+
+def test_index_frames_round_trip(tmp_path):
+    # write_cue() writes the INDEX frames field in 1/75 s, and reading it back gives the same starts
+    tracks = [CueTrack(order, f'Chapter {order}', order * 76) for order in range(1, 75)]
+    header = CueHeader(title='Book', file='book.wav', out_format='WAVE')
+    stream = io.StringIO()
+    cuetools.write_cue(stream, header, tracks)
+    assert '    INDEX 01 00:37:37\n' in stream.getvalue()
+    stream.seek(0)
+    _, read_back = cuetools.read_cue(stream)
+    assert [track.start for track in read_back] == [track.start for track in tracks]
+
+
+def durations(colors: list, total: int) -> list:
+    # (title, duration) of tracks starting every 10 frames, in the order with_durations yields them
+    tracks = [CueTrack(order, str(order), (order - 1) * 10, color=color) for order, color in enumerate(colors, 1)]
+    return [(track.title, track.duration) for track in cuetools.with_durations(iter(tracks), total)]
+
+
+def test_uncoloured_track_closes_the_group():
+    # the red track after the uncoloured one is not added to the blue parent (it used to be, before
+    # with_durations, which made part 1 span the whole sheet)
+    assert durations(['blue', 'red', '', 'red'], 40) == [('1', 20), ('2', 10), ('3', 10), ('4', 10)]
+
+
+def test_new_parent_closes_the_group():
+    assert durations(['blue', 'red', 'blue', 'red', 'red'], 50) == [('1', 20), ('2', 10), ('3', 30), ('4', 10), ('5', 10)]
+
+
+def test_last_track_counts_towards_its_parent():
+    assert durations(['blue', 'red', 'red'], 45) == [('1', 45), ('2', 10), ('3', 25)]
+
+
+def test_red_track_without_a_parent_keeps_its_span():
+    assert durations(['red', 'blue', 'red'], 30) == [('1', 10), ('2', 20), ('3', 10)]
@@ -0,0 +1,55 @@
+import sqlite3
+
+from chaptermaker.durationcache import DurationCache
+
+
+def test_writes_are_visible_before_close(tmp_path):
+    # each put commits at once, so a second worker's cache neither waits for nor misses it
+    audio = tmp_path / 'book.mp3'
+    audio.write_bytes(b'x' * 100)
+    path = str(tmp_path / 'durations.sqlite')
+    with DurationCache(path) as first, DurationCache(path) as second:
+        first.put(str(audio), 'mp3', 12.5, 'xing')
+        assert first.get_entry(str(audio), 'mp3') == (12.5, 'xing')  # a hit updates its row too
+        second._connection.execute('PRAGMA busy_timeout = 0')
+        assert second.get_entry(str(audio), 'mp3') == (12.5, 'xing')
+        second.put(str(audio), 'wave', 3.0)
+        assert first.get(str(audio), 'wave') == 3.0
+
+
+def test_broken_cache_is_a_miss(tmp_path):
+    audio = tmp_path / 'book.mp3'
+    audio.write_bytes(b'x' * 100)
+    with DurationCache(str(tmp_path / 'durations.sqlite')) as cache:
+        cache._connection.execute('DROP TABLE durations')
+        cache.put(str(audio), 'mp3', 12.5)
+        assert cache.get(str(audio), 'mp3') is None
+        assert cache.lookup(str(audio), 'mp3', lambda fname: 7.0) == 7.0
+        assert cache.misses == 2
+
+
+def test_locked_cache_is_a_miss(tmp_path):
+    audio = tmp_path / 'book.mp3'
+    audio.write_bytes(b'x' * 100)
+    path = str(tmp_path / 'durations.sqlite')
+    with DurationCache(path) as cache:
+        cache.put(str(audio), 'mp3', 12.5)
+        cache._connection.execute('PRAGMA busy_timeout = 0')
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute('BEGIN EXCLUSIVE')
+        try:
+            assert cache.get(str(audio), 'mp3') is None
+        finally:
+            other.execute('ROLLBACK')
+            other.close()
+        assert cache.get(str(audio), 'mp3') == 12.5
+
+
+def test_unusable_cache_warns_on_stderr(tmp_path, capsys):
+    # stdout may be carrying a CUE sheet, so the warning must not land in it
+    blocker = tmp_path / 'file'
+    blocker.write_bytes(b'')
+    with DurationCache(str(blocker / 'durations.sqlite')) as cache:
+        assert not cache.enabled
+    out, err = capsys.readouterr()
+    assert out == '' and err.startswith('Duration cache disabled: ')
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from chaptermaker import export
+
+
+def write_sheet(path, count):
+    lines = ['TITLE "Textbook"', 'PERFORMER "Author"', 'FILE "book.mp3" MP3']
+    for order in range(1, count + 1):
+        minutes, seconds = divmod(order * 30, 60)
+        lines += [f'  TRACK {order:02} AUDIO', f'    TITLE "Section {order}"', f'    INDEX 01 {minutes:02}:{seconds:02}:00']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def test_big_sheet_skips_chpl_only(tmp_path, capsys):
+    cue = tmp_path / 'book.cue'
+    write_sheet(cue, 2000)
+    paths = export.export_cue(str(cue), list(export.EXPORT_FORMATS), cache=None)
+    assert sorted(path.rsplit('/', 1)[1] for path in paths) == \
+        ['book.chapters.json', 'book.chapters.vtt', 'book.ffmetadata', 'book.id3']
+    assert not (tmp_path / 'book.chpl').exists()
+    assert 'skipping chpl' in capsys.readouterr().err
+    assert len(json.loads((tmp_path / 'book.chapters.json').read_text(encoding='utf-8'))) == 2000
+
+
+def test_chpl_alone_for_a_big_sheet_fails(tmp_path):
+    cue = tmp_path / 'book.cue'
+    write_sheet(cue, 300)
+    with pytest.raises(ValueError):
+        export.export_cue(str(cue), ['chpl'], cache=None)
+    assert not list(tmp_path.glob('*.chpl')) and not list(tmp_path.glob('.export-*'))
+
+
+def test_small_sheet_writes_chpl(tmp_path):
+    cue = tmp_path / 'book.cue'
+    write_sheet(cue, 3)
+    export.export_cue(str(cue), ['chpl', 'vtt'], cache=None)
+    chpl = (tmp_path / 'book.chpl').read_bytes()
+    assert chpl[4:8] == b'chpl' and chpl[16] == 3
@@ -0,0 +1,50 @@
+from mutagen.id3 import ID3, CTOCFlags
+
+from chaptermaker import id3chapters, id3scan
+from chaptermaker.id3chapters import build_tags
+from chaptermaker.timeline import CueTrack
+
+
+def make_tracks(colors):
+    return [CueTrack(order, f'Section {order}', (order - 1) * 750, 750, color=color) for order, color in enumerate(colors, 1)]
+
+
+def walk(tags, element_id):
+    # chapter ids in the order the tables list them, starting from element_id
+    toc = tags.get('CTOC:' + element_id)
+    if toc is None:
+        return [element_id]
+    assert len(toc.child_element_ids) <= id3chapters.MAX_CTOC_ENTRIES
+    return [chapter for child in toc.child_element_ids for chapter in walk(tags, child)]
+
+
+def saved(tmp_path, tags):
+    path = tmp_path / 'book.id3'
+    tags.save(str(path), v2_version=4)
+    return ID3(str(path)), path
+
+
+def test_big_flat_sheet_is_split_into_sub_tables(tmp_path):
+    tags, path = saved(tmp_path, build_tags('Textbook', 'Author', make_tracks([''] * 2000)))
+    top = [toc for toc in tags.getall('CTOC') if toc.flags & CTOCFlags.TOP_LEVEL]
+    assert [toc.element_id for toc in top] == ['toc']
+    assert len(tags['CTOC:toc'].child_element_ids) == 8
+    assert walk(tags, 'toc') == [f'chp{order}' for order in range(1, 2001)]
+
+
+def test_sub_tables_nest_as_deep_as_needed(tmp_path, monkeypatch):
+    monkeypatch.setattr(id3chapters, 'MAX_CTOC_ENTRIES', 4)
+    tags, path = saved(tmp_path, build_tags('Textbook', 'Author', make_tracks([''] * 30)))
+    assert tags['CTOC:toc'].child_element_ids == ['toc-9', 'toc-10']
+    assert walk(tags, 'toc') == [f'chp{order}' for order in range(1, 31)]
+
+
+def test_big_group_is_split_and_still_scans_clean(tmp_path):
+    tags, path = saved(tmp_path, build_tags('Textbook', 'Author', make_tracks(['blue'] + ['red'] * 600 + ['blue'])))
+    assert walk(tags, 'toc') == [f'chp{order}' for order in range(1, 603)]
+    assert tags['CTOC:toc1'].child_element_ids == ['toc1-1', 'toc1-2', 'toc1-3']
+    assert tags['CTOC:toc1-1'].child_element_ids[0] == 'chp1'
+    with open(path, 'rb') as fileobj:
+        scan, _ = id3scan.read_tag(fileobj, str(path))
+    assert len(scan.chapters) == 602
+    assert id3scan.check_chapters(scan) == []
@@ -0,0 +1,118 @@
+import io
+import struct
+import zlib
+
+import pytest
+from mutagen.id3 import APIC, CHAP, CTOC, ID3, TIT2, TPE1, CTOCFlags
+from mutagen.mp3 import MP3
+
+from chaptermaker import id3scan
+from conftest import mp3_frames
+
+
+class CountingReader(io.BytesIO):
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def tagged_mp3(tmp_path, version=4, cover=b'', frames=200, name='book.mp3'):
+    tags = ID3()
+    tags.add(TIT2(encoding=1, text=['Book']))
+    tags.add(TPE1(encoding=3, text=['Author', 'Reader']))
+    tags.add(CTOC(element_id='toc', flags=CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED, child_element_ids=['chp1', 'chp2'],
+                  sub_frames=[TIT2(text=['TOC'])]))
+    tags.add(CHAP(element_id='chp1', start_time=0, end_time=2000, sub_frames=[TIT2(text=['One'])]))
+    tags.add(CHAP(element_id='chp2', start_time=2000, end_time=5200, sub_frames=[TIT2(encoding=1, text=['Twö'])]))
+    if cover:
+        tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=cover))
+    path = tmp_path / name
+    path.write_bytes(mp3_frames(frames))
+    tags.save(str(path), v2_version=version)
+    return str(path)
+
+
+@pytest.mark.parametrize('version', [3, 4])
+def test_scan_matches_mutagen(tmp_path, version):
+    path = tagged_mp3(tmp_path, version, cover=b'\xff\xd8' + bytes(5000))
+    scan = id3scan.scan_file(path)
+    assert scan.version == version
+    assert (scan.title, scan.author) == ('Book', 'Author/Reader')
+    assert [(c.element_id, c.start_ms, c.end_ms, c.title) for c in scan.chapters] == \
+        [('chp1', 0, 2000, 'One'), ('chp2', 2000, 5200, 'Twö')]
+    assert [(t.element_id, t.top_level, t.children, t.title) for t in scan.tocs] == [('toc', True, ['chp1', 'chp2'], 'TOC')]
+    assert scan.covers == [('image/jpeg', 5002)]
+    assert scan.duration_ms == pytest.approx(MP3(path).info.length * 1000, rel=0.01)  # CBR, so estimated from the size
+    assert scan.issues == []
+
+
+def test_tag_and_peek_come_from_one_read(tmp_path):
+    data = open(tagged_mp3(tmp_path, cover=bytes(100000)), 'rb').read()
+    reader = CountingReader(data)
+    scan, head = id3scan.read_tag(reader, 'book.mp3')
+    assert reader.reads == 1
+    assert head == data[scan.tag_size:scan.tag_size + id3scan.AUDIO_PEEK]
+
+
+def test_a_tag_bigger_than_the_first_read_is_read_whole(tmp_path):
+    data = open(tagged_mp3(tmp_path, cover=bytes(id3scan.FIRST_READ)), 'rb').read()
+    reader = CountingReader(data)
+    scan, head = id3scan.read_tag(reader, 'book.mp3')
+    assert reader.reads == 2
+    assert scan.covers == [('image/jpeg', id3scan.FIRST_READ)]
+    assert head == data[scan.tag_size:scan.tag_size + id3scan.AUDIO_PEEK]
+
+
+def frame(frame_id: bytes, payload: bytes, flags: int, version: int) -> bytes:
+    size = len(payload)
+    if version == 4:
+        size = (size >> 21 & 0x7f) << 24 | (size >> 14 & 0x7f) << 16 | (size >> 7 & 0x7f) << 8 | size & 0x7f
+    return frame_id + struct.pack('>IBB', size, 0, flags) + payload
+
+
+TITLE = b'\x00Compressed title'
+
+
+def test_v23_group_and_compression():
+    # v2.3 extra bytes: decompressed size, then (encryption method,) then group id
+    payload = struct.pack('>I', len(TITLE)) + b'\x07' + zlib.compress(TITLE)
+    frames = list(id3scan.iter_frames(frame(b'TIT2', payload, 0x80 | 0x20, 3), 3))
+    assert [id3scan.decode_text(payload) for _, payload in frames] == ['Compressed title']
+
+
+def test_v24_group_length_and_compression():
+    # v2.4 extra bytes: group id, (encryption method,) then data length indicator
+    payload = b'\x07' + struct.pack('>I', len(TITLE)) + zlib.compress(TITLE)
+    frames = list(id3scan.iter_frames(frame(b'TIT2', payload, 0x40 | 0x08 | 0x01, 4), 4))
+    assert [id3scan.decode_text(payload) for _, payload in frames] == ['Compressed title']
+
+
+def test_v24_unsynchronised_frame():
+    raw = b'\x00A\xff\xe0B'
+    frames = list(id3scan.iter_frames(frame(b'TIT2', raw.replace(b'\xff', b'\xff\x00'), 0x02, 4), 4))
+    assert frames == [(b'TIT2', raw)]
+
+
+def test_encrypted_and_unwanted_frames_are_skipped():
+    data = frame(b'TIT2', b'\x01' + TITLE, 0x04 | 0x40, 4) + frame(b'TXXX', b'\x00x\x00y', 0, 4) + frame(b'TPE1', b'\x00A', 0, 4)
+    assert list(id3scan.iter_frames(data + bytes(20), 4)) == [(b'TPE1', b'\x00A')]
+
+
+def test_chapter_problems_are_reported(tmp_path):
+    path = tagged_mp3(tmp_path, frames=100)  # 2.6 s of audio under chapters running to 5.2 s
+    tags = ID3(path)
+    tags.add(CHAP(element_id='chp3', start_time=1500, end_time=2500, sub_frames=[TIT2(text=['Stray'])]))
+    tags.save(path)
+    issues = id3scan.scan_file(path).issues
+    assert 'chp2 overlaps chp3 by 500 ms' in issues or 'chp3 overlaps chp1 by 500 ms' in issues
+    assert any(issue.startswith('chp2 ends') and 'past the audio' in issue for issue in issues)
+    assert '1 chapters in no CTOC (first chp3)' in issues
+
+
+def test_files_without_tags(tmp_path):
+    path = tmp_path / 'bare.mp3'
+    path.write_bytes(mp3_frames(10))
+    assert id3scan.scan_file(str(path)).issues == ['no ID3v2 tag']
+    assert id3scan.scan_file(str(tmp_path / 'missing.mp3')).issues[0].startswith('FileNotFoundError')
@@ -0,0 +1,85 @@
+import struct
+
+import pytest
+from mutagen.id3 import ID3
+from mutagen.mp3 import MP3
+
+from chaptermaker import mp3join
+from chaptermaker.id3chapters import add_chapter_frames
+from chaptermaker.probes import ProbeError
+from chaptermaker.timeline import frames_to_ms
+from conftest import FRAME_128K, FRAME_192K, SAMPLE_RATE, SAMPLES_PER_FRAME, mp3_frames
+
+
+@pytest.fixture
+def parts(make_mp3):
+    # a CBR part behind an ID3 tag and a VBR part with an ID3v1 tag at the end
+    tag = b'ID3\x04\x00\x00\x00\x00\x00\x0a' + bytes(10)
+    names = [make_mp3('01.mp3', 100, prefix=tag), make_mp3('02.mp3', 57, (FRAME_128K, FRAME_192K), suffix=b'TAG' + bytes(125))]
+    return [mp3join.scan_part(name) for name in names]
+
+
+def test_scan_skips_tags(parts):
+    assert [part.frame_count for part in parts] == [100, 57]
+    assert parts[0].audio_start == 20
+    assert parts[1].audio_size == len(mp3_frames(57, (FRAME_128K, FRAME_192K)))
+
+
+def test_join_writes_an_info_frame_for_the_whole_stream(parts, tmp_path):
+    parts[0].delay, parts[-1].padding = 576, 1000
+    output = str(tmp_path / 'book.mp3')
+    mp3join.join_parts(parts, output)
+
+    joined = mp3join.scan_part(output)
+    assert joined.frame_count == 157
+    assert (joined.delay, joined.padding) == (576, 1000)
+    data = open(output, 'rb').read()
+    xing = 4 + 32  # MPEG-1 stereo side info
+    kind, flags, frames, size = struct.unpack_from('>4sIII', data, xing)
+    assert (kind, flags, frames, size) == (b'Xing', 0x0f, 157, len(data))
+    lame = xing + 120
+    assert struct.unpack_from('>H', data, lame + 34)[0] == mp3join.crc16(data[:lame + 34])
+
+    info = MP3(output).info
+    assert info.length == pytest.approx((157 * SAMPLES_PER_FRAME - 576 - 1000) / SAMPLE_RATE)
+    assert info.encoder_info.startswith('LAME')
+
+
+def test_cbr_join_is_tagged_info(make_mp3, tmp_path):
+    parts = [mp3join.scan_part(make_mp3(f'{i}.mp3', 10)) for i in range(3)]
+    output = str(tmp_path / 'book.mp3')
+    mp3join.join_parts(parts, output)
+    assert open(output, 'rb').read(40)[36:40] == b'Info'
+    assert MP3(output).info.length == pytest.approx(30 * SAMPLES_PER_FRAME / SAMPLE_RATE)
+
+
+def test_chapters_start_on_part_boundaries(parts, tmp_path):
+    parts[0].delay = 576
+    tracks, total = mp3join.part_tracks(parts, ['One', 'Two'])
+    output = str(tmp_path / 'book.mp3')
+
+    def write_tags(fileobj):
+        tags = ID3()
+        add_chapter_frames(tags, tracks)
+        tags.save(fileobj, v2_version=4)
+
+    mp3join.join_parts(parts, output, write_tags)
+    chapters = sorted(MP3(output).tags.getall('CHAP'), key=lambda chap: chap.start_time)
+    second = (100 * SAMPLES_PER_FRAME - 576) * 1000 // SAMPLE_RATE
+    assert [chap.start_time for chap in chapters] == [0, frames_to_ms(tracks[1].start)]
+    assert abs(chapters[1].start_time - second) <= 14  # within one CUE frame
+    assert mp3join.scan_part(output).frame_count == 157
+
+
+def test_parts_must_share_a_format(make_mp3):
+    mono_22k = b'\xff\xf3\x90\xc4'  # MPEG-2, 22.05 kHz, mono
+    parts = [mp3join.scan_part(make_mp3('a.mp3', 5)), mp3join.scan_part(make_mp3('b.mp3', 5, (mono_22k,)))]
+    with pytest.raises(ValueError):
+        mp3join.check_compatible(parts)
+
+
+def test_no_frames_is_an_error(tmp_path):
+    path = tmp_path / 'empty.mp3'
+    path.write_bytes(bytes(1000))
+    with pytest.raises(ProbeError):
+        mp3join.scan_part(str(path))
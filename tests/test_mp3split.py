@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from mutagen.id3 import ID3, TIT2
+from mutagen.mp3 import MP3
+
+from chaptermaker import mp3join, mp3split
+from chaptermaker.id3chapters import add_chapter_frames, save_tags
+from conftest import FRAME_128K, FRAME_192K, SAMPLE_RATE, SAMPLES_PER_FRAME
+
+
+@pytest.fixture
+def book(make_mp3, tmp_path):
+    # three parts joined into a chaptered book, with the encoder delay and padding of a real encode
+    counts = [100, 57, 80]
+    parts = [mp3join.scan_part(make_mp3(f'{i}.mp3', count, (FRAME_128K, FRAME_192K)))
+             for i, count in enumerate(counts)]
+    parts[0].delay, parts[-1].padding = 576, 1000
+    tracks, _ = mp3join.part_tracks(parts, ['One', 'Two', 'Three'])
+    output = str(tmp_path / 'book.mp3')
+
+    def write_tags(fileobj):
+        tags = ID3()
+        add_chapter_frames(tags, tracks)
+        tags.save(fileobj, v2_version=4)
+
+    mp3join.join_parts(parts, output, write_tags)
+    return output, counts
+
+
+def test_join_then_split_gives_back_the_parts(book, tmp_path):
+    output, counts = book
+    chapters = mp3split.chapters_from_tags(ID3(output))
+    assert [chapter.title for chapter in chapters] == ['One', 'Two', 'Three']
+    outputs = [str(tmp_path / mp3split.file_name(chapter)) for chapter in chapters]
+
+    def write_tags(path, chapter):
+        tags = ID3()
+        tags['TIT2'] = TIT2(text=[chapter.title])
+        save_tags(tags, path, 1024)
+
+    mp3split.split(mp3join.scan_part(output), chapters, outputs, write_tags, workers=2)
+    assert [os.path.basename(path) for path in outputs] == ['01 - One.mp3', '02 - Two.mp3', '03 - Three.mp3']
+    pieces = [mp3join.scan_part(path) for path in outputs]
+    assert [piece.frame_count for piece in pieces] == counts
+    assert [(piece.delay, piece.padding) for piece in pieces] == [(576, 0), (0, 0), (0, 1000)]
+    assert [str(MP3(path).tags['TIT2']) for path in outputs] == ['One', 'Two', 'Three']
+    lengths = [MP3(path).info.length for path in outputs]
+    assert lengths[0] == pytest.approx((100 * SAMPLES_PER_FRAME - 576) / SAMPLE_RATE)
+    assert lengths[2] == pytest.approx((80 * SAMPLES_PER_FRAME - 1000) / SAMPLE_RATE)
+    assert chapters[-1].end_ms == pytest.approx(MP3(output).info.length * 1000, abs=14)  # within a CUE frame
+
+
+def test_cut_points_are_frame_boundaries(book):
+    output, counts = book
+    source = mp3join.scan_part(output)
+    chapters = mp3split.chapters_from_tags(ID3(output))
+    points = mp3split.cut_points(source, chapters)
+    assert [frame for frame, _ in points] == [0, 100, 157, 237]
+    for frame, offset in points:
+        assert offset == source.audio_start + sum(source.frame_sizes[:frame])
+
+
+def test_chapter_too_short_for_a_frame(book, tmp_path):
+    output, _ = book
+    chapters = [mp3split.Chapter(1, 'One', 0), mp3split.Chapter(2, 'Blink', 1000), mp3split.Chapter(3, 'Rest', 1001)]
+    with pytest.raises(ValueError):
+        mp3split.split(mp3join.scan_part(output), chapters, [str(tmp_path / f'{i}.mp3') for i in range(3)])
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import struct
+
+import pytest
+from mutagen.mp4 import MP4, MP4Cover
+
+from chaptermaker import mp4chapters
+from chaptermaker.covers import Cover
+from chaptermaker.id3chapters import REWRITTEN, UNCHANGED, UPDATED
+from chaptermaker.mp4atoms import atom
+from chaptermaker.timeline import CueTrack, FRAMES_PER_SECOND
+
+TIMESCALE = 44100
+SAMPLE_SIZE = 200
+SAMPLES_PER_CHUNK = 43
+CHUNKS = 20
+JPEG = b'\xff\xd8\xff\xe0' + bytes(60)
+
+
+def full_atom(kind: bytes, payload: bytes, flags: int = 0) -> bytes:
+    return atom(kind, struct.pack('>I', flags) + payload)
+
+
+def build_moov(data_start: int, co64: bool) -> bytes:
+    # one AAC track of CHUNKS chunks laid out back to back from data_start
+    samples = SAMPLES_PER_CHUNK * CHUNKS
+    offsets = [data_start + i * SAMPLE_SIZE * SAMPLES_PER_CHUNK for i in range(CHUNKS)]
+    entry = '>Q' if co64 else '>I'
+    chunk_offsets = full_atom(b'co64' if co64 else b'stco',
+                              struct.pack('>I', CHUNKS) + b''.join(struct.pack(entry, o) for o in offsets))
+    esds = full_atom(b'esds', bytes.fromhex('03190000000411401500000000000000000000000502121006800102'))
+    mp4a = atom(b'mp4a', bytes(6) + struct.pack('>H', 1) + bytes(8) + struct.pack('>HHHHI', 2, 16, 0, 0, TIMESCALE << 16) + esds)
+    stbl = atom(b'stbl', full_atom(b'stsd', struct.pack('>I', 1) + mp4a)
+                + full_atom(b'stts', struct.pack('>III', 1, samples, 1024))
+                + full_atom(b'stsc', struct.pack('>IIII', 1, 1, SAMPLES_PER_CHUNK, 1))
+                + full_atom(b'stsz', struct.pack('>II', SAMPLE_SIZE, samples))
+                + chunk_offsets)
+    dinf = atom(b'dinf', full_atom(b'dref', struct.pack('>I', 1) + full_atom(b'url ', b'', 1)))
+    minf = atom(b'minf', full_atom(b'smhd', bytes(4)) + dinf + stbl)
+    mdia = atom(b'mdia', full_atom(b'mdhd', struct.pack('>IIIIHH', 0, 0, TIMESCALE, samples * 1024, 0x55c4, 0))
+                + full_atom(b'hdlr', bytes(4) + b'soun' + bytes(12) + b'Sound\0') + minf)
+    duration_ms = samples * 1024 * 1000 // TIMESCALE
+    tkhd = full_atom(b'tkhd', struct.pack('>IIIII', 0, 0, 1, 0, duration_ms) + bytes(60))
+    mvhd = full_atom(b'mvhd', struct.pack('>IIII', 0, 0, 1000, duration_ms) + struct.pack('>IH', 0x10000, 0x100)
+                     + bytes(70) + struct.pack('>I', 2))
+    return atom(b'moov', mvhd + atom(b'trak', tkhd + mdia))
+
+
+@pytest.fixture
+def make_m4b(tmp_path):
+    # a minimal M4B: ftyp, then moov (with free bytes after it) and mdat in either order; every
+    # chunk's samples hold a different byte, so audio read through moved offsets can't match by luck
+    def make(name: str = 'book.m4b', moov_last: bool = False, free: int = 0, co64: bool = False) -> str:
+        ftyp = atom(b'ftyp', b'M4B ' + bytes(4) + b'M4B mp42isom')
+        mdat = atom(b'mdat', b''.join(bytes([i + 1]) * SAMPLE_SIZE * SAMPLES_PER_CHUNK for i in range(CHUNKS)))
+        pad = mp4chapters.free_atom(free) if free else b''
+        if moov_last:
+            data = ftyp + mdat + build_moov(len(ftyp) + 8, co64) + pad
+        else:
+            data_start = len(ftyp) + len(build_moov(0, co64)) + len(pad) + 8
+            data = ftyp + build_moov(data_start, co64) + pad + mdat
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return make
+
+
+def chunk_offsets(data: bytes, start: int = 0, end: int = None) -> list:
+    offsets = []
+    for kind, _, payload, atom_end in mp4chapters.iter_atoms(data, start, end):
+        if kind in mp4chapters.CONTAINER_ATOMS:
+            offsets.extend(chunk_offsets(data, payload, atom_end))
+        elif kind in (b'stco', b'co64'):
+            count = struct.unpack_from('>I', data, payload + 4)[0]
+            entry = '>I' if kind == b'stco' else '>Q'
+            offsets.extend(struct.unpack_from(f'>{count}{entry[1]}', data, payload + 8))
+    return offsets
+
+
+def audio_hash(path: str) -> str:
+    # the audio as the player finds it: every chunk, read where the offset tables say it is
+    with open(path, 'rb') as f:
+        data = f.read()
+    chunk = SAMPLE_SIZE * SAMPLES_PER_CHUNK
+    offsets = chunk_offsets(data)
+    assert len(offsets) == CHUNKS
+    return hashlib.sha256(b''.join(data[offset:offset + chunk] for offset in offsets)).hexdigest()
+
+
+def top_level(path: str) -> list:
+    with open(path, 'rb') as f:
+        return [kind for kind, _, _, _ in mp4chapters.iter_atoms(f.read())]
+
+
+def tracks(count: int = 3) -> list:
+    return [CueTrack(number, f'Chapter {number}', (number - 1) * 3 * FRAMES_PER_SECOND) for number in range(1, count + 1)]
+
+
+@pytest.mark.parametrize('layout, expected', [
+    (dict(), REWRITTEN),
+    (dict(co64=True), REWRITTEN),
+    (dict(free=4096), UPDATED),
+    (dict(moov_last=True), UPDATED),
+])
+def test_write_chapters_round_trip(make_m4b, layout, expected):
+    path = make_m4b(**layout)
+    audio = audio_hash(path)
+    cover = Cover('image/jpeg', JPEG)
+    assert mp4chapters.write_chapters(path, 'Book', 'Author', tracks(), cover) == expected
+    assert audio_hash(path) == audio
+
+    tags = MP4(path)
+    assert tags['\xa9nam'] == ['Book']
+    assert tags['\xa9alb'] == ['Book']
+    assert tags['\xa9ART'] == ['Author']
+    assert tags['aART'] == ['Author']
+    assert tags['\xa9gen'] == ['Audiobook']
+    assert tags['stik'] == [mp4chapters.AUDIOBOOK_MEDIA_TYPE]
+    assert tags['covr'] == [JPEG]
+    assert tags['covr'][0].imageformat == MP4Cover.FORMAT_JPEG
+    assert [(chapter.title, chapter.start) for chapter in tags.chapters] == [
+        ('Chapter 1', 0.0), ('Chapter 2', 3.0), ('Chapter 3', 6.0)]
+
+    with open(path, 'rb') as f:
+        written = f.read()
+    assert mp4chapters.write_chapters(path, 'Book', 'Author', tracks(), cover) == UNCHANGED
+    with open(path, 'rb') as f:
+        assert f.read() == written
+
+
+def test_rewrite_leaves_room_for_the_next_update(make_m4b):
+    path = make_m4b()
+    assert mp4chapters.write_chapters(path, 'Book', 'Author', tracks(), reserve=4096) == REWRITTEN
+    assert top_level(path) == [b'ftyp', b'moov', b'free', b'mdat']
+    audio = audio_hash(path)
+    size = os.path.getsize(path)
+    assert mp4chapters.write_chapters(path, 'A longer title', 'Author', tracks(5)) == UPDATED
+    assert audio_hash(path) == audio
+    assert os.path.getsize(path) == size
+    assert [chapter.title for chapter in MP4(path).chapters] == [f'Chapter {n}' for n in range(1, 6)]
+
+
+def test_moov_last_grows_in_place(make_m4b):
+    path = make_m4b(moov_last=True)
+    with open(path, 'rb') as f:
+        before = f.read()
+    mdat_end = before.index(b'moov') - 4
+    assert mp4chapters.write_chapters(path, 'Book', 'Author', tracks(40)) == UPDATED
+    with open(path, 'rb') as f:
+        after = f.read()
+    assert after[:mdat_end] == before[:mdat_end]  # the audio was not touched
+    assert top_level(path) == [b'ftyp', b'mdat', b'moov']
+
+
+def test_force_writes_an_unchanged_book(make_m4b):
+    path = make_m4b(free=4096)
+    mp4chapters.write_chapters(path, 'Book', 'Author', tracks())
+    assert mp4chapters.write_chapters(path, 'Book', 'Author', tracks(), force=True) == UPDATED
+
+
+def test_other_items_are_kept(make_m4b):
+    path = make_m4b(free=4096)
+    tags = MP4(path)
+    tags.add_tags()
+    tags['\xa9cmt'] = ['A comment']
+    tags['\xa9day'] = ['1999']
+    tags['\xa9nam'] = ['Old title']
+    tags['covr'] = [MP4Cover(JPEG + b'old', MP4Cover.FORMAT_JPEG)]
+    tags.save()
+
+    mp4chapters.write_chapters(path, 'Book', 'Author', tracks())
+    tags = MP4(path)
+    assert tags['\xa9cmt'] == ['A comment']
+    assert tags['\xa9day'] == ['1999']
+    assert tags['\xa9nam'] == ['Book']
+    assert tags['covr'] == [JPEG + b'old']  # no cover given, so the old one stays
+
+    mp4chapters.write_chapters(path, 'Book', 'Author', tracks(), Cover('image/jpeg', JPEG))
+    assert MP4(path)['covr'] == [JPEG]
+
+
+def test_too_many_chapters(make_m4b):
+    path = make_m4b()
+    with open(path, 'rb') as f:
+        before = f.read()
+    with pytest.raises(ValueError):
+        mp4chapters.write_chapters(path, 'Book', 'Author', tracks(256))
+    with open(path, 'rb') as f:
+        assert f.read() == before
@@ -0,0 +1,69 @@
+import math
+import struct
+import sys
+import wave
+
+import pytest
+
+from chaptermaker import cuetools, silence_to_cue
+from chaptermaker.timeline import CueHeader
+
+silence = pytest.importorskip('chaptermaker.silence')
+
+RATE = 8000
+
+
+def write_book(path, pieces):
+    # pieces are (seconds, tone?) runs of a 440 Hz tone or digital silence, as 16-bit mono
+    samples = []
+    for seconds, tone in pieces:
+        count = int(seconds * RATE)
+        samples.extend(int(8000 * math.sin(2 * math.pi * 440 * i / RATE)) if tone else 0 for i in range(count))
+    with wave.open(str(path), 'wb') as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(RATE)
+        output.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / 'book.wav'
+    write_book(path, [(20, True), (3, False), (20, True), (3.1, False), (20, True)])
+    return path
+
+
+def test_generated_sheet_survives_snapping(book, tmp_path):
+    # silence-to-cue then snap-to-silence: the marks are already in the silences, so nothing moves
+    with silence.PCMSource(str(book)) as source:
+        tracks = silence.detect_chapters(source, -45.0, 2.0, 10.0)
+    assert len(tracks) == 3
+    cue = tmp_path / 'book.cue'
+    cuetools.save_cue(str(cue), CueHeader(title='Book', file='book.wav', out_format='WAVE'), tracks)
+    _, read_back = cuetools.process_cuefile(str(cue))
+    assert [track.start for track in read_back] == [track.start for track in tracks]
+    for _ in range(3):
+        with silence.PCMSource(str(book)) as source:
+            assert silence.snap_to_silence(source, read_back, 2.0, 10) == 0
+    assert [track.start for track in read_back] == [track.start for track in tracks]
+
+
+def test_marks_near_a_silence_move_into_it(book):
+    with silence.PCMSource(str(book)) as source:
+        tracks = silence.detect_chapters(source, -45.0, 2.0, 10.0)
+        tracks[1].start -= 3 * 75  # 1.5 s before the first silence starts
+        assert silence.snap_to_silence(source, tracks, 2.0, 10) == 1
+    assert 20 * 75 <= tracks[1].start <= 23 * 75
+
+
+@pytest.mark.parametrize('name, contents', [('missing.wav', None), ('book.mp3', b'ID3' + bytes(200))])
+def test_silence_to_cue_reports_unreadable_input(tmp_path, monkeypatch, capsys, name, contents):
+    path = tmp_path / name
+    if contents is not None:
+        path.write_bytes(contents)
+    monkeypatch.setattr(sys, 'argv', ['silence-to-cue', str(path), str(tmp_path / 'book.cue')])
+    with pytest.raises(SystemExit) as raised:
+        silence_to_cue.main()
+    assert raised.value.code == 1
+    assert capsys.readouterr().out.startswith(f'Could not read {path}: ')
+    assert not (tmp_path / 'book.cue').exists()
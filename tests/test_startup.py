@@ -0,0 +1,43 @@
+# every console script must answer --help without loading the heavy optional dependencies. the
+# measurement is benchmarks/bench.py's own startup child, so the suite and the benchmark agree on
+# which modules count as heavy; the wall-clock budget is left to the benchmark, which can repeat
+# runs on a quiet machine
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.join(REPO, 'benchmarks', 'bench.py')
+sys.path.insert(0, os.path.dirname(BENCH))
+import bench  # noqa: E402
+
+
+def scripts_section() -> str:
+    with open(os.path.join(REPO, 'pyproject.toml'), encoding='utf-8') as fileobj:
+        return fileobj.read().split('[project.scripts]', 1)[1].split('\n[', 1)[0]
+
+
+def console_scripts():
+    return re.findall(r'^([\w-]+) = "chaptermaker\.(\w+):main"$', scripts_section(), re.MULTILINE)
+
+
+def run_startup(tool: str, workdir: str) -> dict:
+    result = subprocess.run([sys.executable, BENCH, '--child', 'startup', '--workdir', workdir,
+                             '--params', json.dumps({'tool': tool})], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_bench_times_every_script():
+    # every line of [project.scripts] is parsed, and the benchmark's startup list is the same set
+    assert len(console_scripts()) == len([line for line in scripts_section().splitlines() if '=' in line])
+    assert sorted(tool for _, tool in console_scripts()) == sorted(bench.STARTUP_TOOLS)
+
+
+@pytest.mark.parametrize('script, tool', console_scripts())
+def test_help_is_light(script, tool, tmp_path):
+    result = run_startup(tool, str(tmp_path))  # 'heavy' lists whichever of bench.HEAVY_MODULES got loaded
+    assert result['heavy'] == [], f'{script} imported at startup: {", ".join(result["heavy"])}'
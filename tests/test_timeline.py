@@ -0,0 +1,55 @@
+import random
+from array import array
+
+import pytest
+
+from chaptermaker.cuetools import get_track_before_time
+from chaptermaker.timeline import ChapterIndex, CueTrack, TrackTable, frames_to_seconds
+
+
+def tracks_at(starts):
+    return [CueTrack(order, f'Track {order}', start) for order, start in enumerate(starts, 1)]
+
+
+def linear_track_before_time(tracks: list, time_in_secs: int) -> CueTrack:
+    # the old list-scanning lookup, which removed each track it returned
+    for track in reversed(tracks):
+        if frames_to_seconds(track.start) <= time_in_secs:
+            tracks.remove(track)
+            return track
+    return CueTrack()
+
+
+def test_track_before_time_matches_linear_scan():
+    rng = random.Random(7)
+    for _ in range(200):
+        tracks = tracks_at(sorted(rng.randrange(0, 75 * 600) for _ in range(rng.randrange(0, 30))))
+        index = ChapterIndex(tracks)
+        remaining = list(tracks)
+        for _ in range(40):
+            time = rng.randrange(-5, 620)
+            assert get_track_before_time(index, time).order == linear_track_before_time(remaining, time).order
+
+
+def test_track_before_time_includes_first_track():
+    index = ChapterIndex(tracks_at([0, 750]))
+    assert get_track_before_time(index, 5).title == 'Track 1'
+    assert get_track_before_time(index, 5).title == ''  # each heading is used once
+    assert get_track_before_time(index, 10).title == 'Track 2'
+
+
+def test_index_queries():
+    index = ChapterIndex(tracks_at([0, 100, 100, 300]))
+    assert index.at(99).order == 1
+    assert index.at(100).order == 3
+    assert [track.order for track in index.in_range(100, 300)] == [2, 3]
+    assert [track and track.order for track in index.at_many([-1, 0, 150, 300, 999])] == [None, 1, 3, 4, 4]
+
+
+def test_track_table_from_columns():
+    table = TrackTable.from_columns(['One', 'Two'], array('q', [0, 750]), color='cyan')
+    assert [(track.order, track.title, track.start, track.duration, track.offset, track.color) for track in table] == [
+        (1, 'One', 0, 0, '', 'cyan'), (2, 'Two', 750, 0, '', 'cyan')]
+    assert TrackTable.from_columns(['One'], [5], [10])[0].duration == 10
+    with pytest.raises(ValueError):
+        TrackTable.from_columns(['One'], [0, 5])